@@ -0,0 +1,69 @@
+"""Benchmark of the bytes read from Mongo per endpoint, with the whole content against the chapter or verse only.
+
+The manuscripts are synthetic (24 chapters of 40 verses, and an incipit), and the
+size of the documents returned is their BSON size once projected as Mongo does.
+
+Run with `python benchmarks/bench_bytes.py [n_manuscripts]`.
+"""
+import sys
+import bson
+import numpy as np
+from manuscript_clusterer.api.database.db_manipulator import content_field
+
+
+CHAPTER, VERSE = "10", "3"
+
+
+def make_manuscripts(n_manuscripts: int = 200, n_chapters: int = 24, n_verses: int = 40, seed: int = 0):
+    """Generate manuscripts with random Greek verses.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("αβγδεζηθικλμνξοπρστυφχψω     "))
+
+    def verse():
+        return "".join(rng.choice(letters, size=100))
+    return [{"id": f"2{i:04d}",
+             "content": {"incipit": verse(),
+                         **{str(chapter): {str(number): verse() for number in range(1, n_verses + 1)}
+                            for chapter in range(1, n_chapters + 1)}}}
+            for i in range(n_manuscripts)]
+
+
+def project(document: dict, fields: list[str]):
+    """Project a document on (dotted) fields, keeping their nesting.
+    """
+    projected = {}
+    for field in fields:
+        source, target, path = document, projected, field.split(".")
+        for key in path[:-1]:
+            if key not in source:
+                break
+            source, target = source[key], target.setdefault(key, {})
+        else:
+            if path[-1] in source:
+                target[path[-1]] = source[path[-1]]
+    return projected
+
+
+# Endpoints: number of manuscripts read, fields read before and after the projection on the chapter or verse
+ENDPOINTS = {
+    "/manuscript/{id}/content/{chapter}/{verse}": (1, ["content"], [content_field(CHAPTER, VERSE)]),
+    "/manuscript/{id}/verses": (1, ["content"], [content_field(CHAPTER)]),
+    "/manuscripts/collation/": (2, ["content"], [content_field(CHAPTER, VERSE)]),
+    "/manuscripts/transform/versedistances/": (2, ["content"], [content_field(CHAPTER)]),
+    "/manuscripts/transform/versedistances/batch/": (10, ["id", "content"], ["id", content_field(CHAPTER)]),
+    "/manuscripts/transform/content/": (None, ["id", "content"], ["id", content_field(CHAPTER)]),
+    "/manuscripts/transform/projections/ (content)": (None, ["id", "content"], ["id", content_field(CHAPTER)]),
+    "/manuscripts/transform/distances/ (build)": (None, ["id", "content"], ["id", content_field(CHAPTER)]),
+}
+
+
+if __name__ == "__main__":
+    n_manuscripts = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    manuscripts = make_manuscripts(n_manuscripts)
+    print(f"{'endpoint':<48} {'before':>12} {'after':>12} {'ratio':>7}")
+    for endpoint, (n_read, before, after) in ENDPOINTS.items():
+        read = manuscripts[:n_read]
+        bytes_before = sum(len(bson.encode(project(document, before))) for document in read)
+        bytes_after = sum(len(bson.encode(project(document, after))) for document in read)
+        print(f"{endpoint:<48} {bytes_before:>12,} {bytes_after:>12,} {bytes_before / bytes_after:>6.0f}x")
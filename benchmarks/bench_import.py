@@ -0,0 +1,38 @@
+"""Benchmark of the import time of the API, in fresh interpreters.
+
+Run with `python benchmarks/bench_import.py [repeats]`.
+"""
+import json
+import subprocess
+import sys
+
+
+MODULES = ("manuscript_clusterer.api.app",
+           "manuscript_clusterer.api.database.db_manipulator",
+           "manuscript_clusterer.engine.get_profiles")
+
+# Heavy dependencies, only to be imported on use
+HEAVY_MODULES = ("umap", "pynndescent", "numba", "sklearn", "prince", "collatex", "bs4", "pymongo")
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [name for name in {heavy!r} if name in sys.modules]]))
+"""
+
+
+def time_import(module: str):
+    """Import a module in a fresh interpreter, returning the time taken and the heavy modules loaded.
+    """
+    output = subprocess.run([sys.executable, "-c", SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for module in MODULES:
+        runs = [time_import(module) for _ in range(repeats)]
+        print(f"{module:>50}: {min(elapsed for elapsed, _ in runs):6.3f} s, heavy modules loaded: {runs[0][1]}")
@@ -0,0 +1,35 @@
+"""Benchmark of the projection backends, on synthetic profiles and distance matrices.
+
+Run with `python benchmarks/bench_projection.py [n_manuscripts]`.
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import pdist, squareform
+from manuscript_clusterer.engine.project import PROJECTION_BACKENDS, make_projection
+
+
+def make_profiles(n_manuscripts: int = 3000, n_readings: int = 500, n_groups: int = 5, seed: int = 0):
+    """Generate binary profiles drawn around a few group profiles.
+    """
+    rng = np.random.default_rng(seed)
+    groups = rng.integers(0, 2, size=(n_groups, n_readings))
+    values = groups[rng.integers(0, n_groups, size=n_manuscripts)]
+    flips = rng.random(values.shape) < 0.1
+    return pd.DataFrame(np.where(flips, 1 - values, values),
+                        index=[f"m{i}" for i in range(n_manuscripts)],
+                        columns=[f"10:{i}:1" for i in range(n_readings)])
+
+
+if __name__ == "__main__":
+    n_manuscripts = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    profiles = make_profiles(n_manuscripts)
+    distances = squareform(pdist(profiles.to_numpy(), metric="hamming")) * profiles.shape[1]
+    for source, data in (("profiles", profiles), ("content", distances)):
+        for method, backend in PROJECTION_BACKENDS.items():
+            if source not in backend.sources:
+                continue
+            start = time.perf_counter()
+            make_projection(method, source).fit_transform(data)
+            print(f"{source:>8} {method:>5}: {time.perf_counter() - start:8.3f} s for {n_manuscripts} manuscripts")
@@ -1,11 +1,33 @@
 """Main Fast API module.
 """
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from threading import Thread
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+from manuscript_clusterer.api.routers import db_manipulator, manuscript, settings, transform_manuscripts, manuscripts
+from manuscript_clusterer.engine.executor import EngineTimeoutError
+from manuscript_clusterer.engine.project import warm_up_projections
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect to the database on startup, and close the connection on shutdown.
+    The heavy modules are imported by the first computation, so that the API starts without them.
+    The UMAP projections are optionally compiled in the background, while the API serves requests
+    (by the workers of the engine, if any).
+    """
+    db_manipulator.connect()
+    if settings.warmup_projections and not settings.engine_workers:
+        # Through the engine, which imports the heavy modules one thread at a time
+        Thread(target=db_manipulator.manuscript_db.engine.run, args=(warm_up_projections,), daemon=True).start()
+    yield
+    await db_manipulator.close()
 
-from manuscript_clusterer.api.routers import manuscript, transform_manuscripts, manuscripts
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -19,6 +41,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(EngineTimeoutError)
+async def engine_timeout_handler(request: Request, exc: EngineTimeoutError):
+    """Answer the computations exceeding their timeout with a gateway timeout.
+    """
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
 app.include_router(manuscript.router)
 app.include_router(transform_manuscripts.router)
-app.include_router(manuscripts.router)
\ No newline at end of file
+app.include_router(manuscripts.router)
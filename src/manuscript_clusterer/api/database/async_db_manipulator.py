@@ -0,0 +1,307 @@
+"""Asynchronous access to the Mongo database, for the async endpoints.
+
+The documents are read through the asynchronous driver of pymongo
+(`AsyncMongoClient`), over a pool of connections, so that a request waiting
+for the database does not block the event loop. The computations (distances,
+clusterings, projections) and the writes to the manuscripts, which maintain the
+caches of the synchronous `ManuscriptDB`, are run by that database in a pool
+of worker threads. The engine calls they make belong to the scope of the
+request, cancelled with it.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any
+from pymongo import AsyncMongoClient
+
+from manuscript_clusterer.api.database.db_manipulator import MANUSCRIPT_INFO_FIELDS, ManuscriptDB, content_field
+from manuscript_clusterer.api.database.loader import ManuscriptLoader
+from manuscript_clusterer.api.database.verse_store import VERSE_PROJECTION, assemble_content, verse_query
+from manuscript_clusterer.engine.executor import CallScope, run_in_scope
+
+
+# Methods of the synchronous database run in the worker threads
+OFFLOADED_METHODS = (
+    "get_profile_matrix",
+    "get_manuscript_neighbors",
+    "get_manuscripts_projected",
+    "get_content_projected",
+    "get_projection",
+    "get_incremental_projection",
+    "get_profile_clustered",
+    "get_readings_clustered",
+    "get_content_clustered",
+    "get_content_distances",
+    "get_reading_distances",
+    "get_profile_distance",
+    "get_verse_distance_content",
+    "get_verse_distances_content",
+    "get_verse_distance_profiles",
+    "collate_verses",
+    "measure_cluster_quality",
+)
+
+
+class AsyncMongoDB:
+    """Class for the asynchronous manipulation of the manuscript data.
+    """
+
+    def __init__(self,
+                 host: str = "localhost",
+                 port: int = 27017,
+                 db_name: str = "manuscriptsDB",
+                 client=None,
+                 client_options: dict[str, Any] = None):
+        """Initialize the pool of connections with the database.
+        `client` replaces the asynchronous client (e.g. by an in-memory stand-in for the tests),
+        `client_options` are given to the client (pool size, timeouts).
+        """
+        self.client = client if client is not None else AsyncMongoClient(host, port, **(client_options or {}))
+        self.db = self.client[db_name]
+
+    async def check_connection(self):
+        """Check the connection with the database.
+        """
+        try:
+            await self.client.admin.command("ping")
+            return True
+        except Exception:  # pylint: disable=broad-except
+            print("Server not available")
+            return False
+
+    async def close(self):
+        """Close the connections with the database.
+        """
+        await self.client.close()
+
+    async def insert_document(self,
+                              collection_name: str,
+                              document: dict[str, Any]):
+        """Insert a document into a collection.
+        """
+        result = await self.db[collection_name].insert_one(document)
+        return result.inserted_id
+
+    async def find_document(self,
+                            collection_name: str,
+                            query: dict[str, Any],
+                            projection: dict[str, Any] = None):
+        """Find a document in a collection.
+        """
+        return await self.db[collection_name].find_one(query, projection)
+
+    async def find_all_documents(self,
+                                 collection_name: str,
+                                 query: dict[str, Any],
+                                 projection: dict[str, Any] = None):
+        """Find all documents in a collection.
+        """
+        return await self.db[collection_name].find(query, projection).to_list()
+
+    async def update_document(self,
+                              collection_name: str,
+                              query: dict[str, Any],
+                              update: dict[str, Any]):
+        """Update a document in a collection.
+        """
+        result = await self.db[collection_name].update_one(query, {"$set": update})
+        return result.modified_count
+
+    async def delete_document(self,
+                              collection_name: str,
+                              query: dict[str, Any]):
+        """Delete a document from a collection.
+        """
+        result = await self.db[collection_name].delete_one(query)
+        return result.deleted_count
+
+
+class AsyncManuscriptDB(AsyncMongoDB):
+    """Class for the asynchronous manipulation of the manuscript data.
+    """
+
+    def __init__(self,
+                 manuscript_db: ManuscriptDB,
+                 host: str = "localhost",
+                 port: int = 27017,
+                 db_name: str = "manuscriptsDB",
+                 client=None,
+                 client_options: dict[str, Any] = None,
+                 compute_threads: int = 4):
+        """Initialize the connection with the database, on top of the synchronous database
+        running the computations in `compute_threads` worker threads.
+        """
+        super().__init__(host, port, db_name, client=client, client_options=client_options)
+        self.manuscript_db = manuscript_db
+        self.executor = ThreadPoolExecutor(max_workers=compute_threads, thread_name_prefix="compute")
+
+    async def run(self, function, *args, **kwargs):
+        """Run a blocking function in a worker thread.
+        If the caller is cancelled, the engine calls made by the function are cancelled too.
+        """
+        scope = CallScope()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, partial(run_in_scope, scope, function, *args, **kwargs))
+        except asyncio.CancelledError:
+            scope.cancel()
+            raise
+
+    def __getattr__(self, name: str):
+        """Expose the computations of the synchronous database as coroutines.
+        """
+        if name not in OFFLOADED_METHODS:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        method = getattr(self.manuscript_db, name)
+
+        async def offloaded(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        return offloaded
+
+    @property
+    def verse_store(self):
+        """Store of the verses of the synchronous database, in the "verses" storage layout.
+        """
+        return getattr(self.manuscript_db, "verse_store", None)
+
+    async def read_verses(self,
+                          manuscripts_list: list[str] = None,
+                          chapter: str = None,
+                          verse: str = None):
+        """Return the content of some manuscripts (all if not given) from the verses, by id.
+        """
+        return assemble_content(await self.find_all_documents(self.verse_store.collection.name,
+                                                              verse_query(manuscripts_list, chapter, verse),
+                                                              VERSE_PROJECTION))
+
+    def loader(self):
+        """Return a loader sharing the reads of the manuscripts between the computations of a request.
+        """
+        return ManuscriptLoader(self.manuscript_db)
+
+    async def close(self):
+        """Close the connections with the database and stop the worker threads.
+        """
+        await super().close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def insert_document(self,
+                              collection_name: str,
+                              document: dict[str, Any]):
+        """Insert a document into a collection.
+        The manuscripts are inserted by the synchronous database, maintaining its caches.
+        """
+        if collection_name == "manuscripts":
+            return await self.run(self.manuscript_db.insert_document, collection_name, document)
+        return await super().insert_document(collection_name, document)
+
+    async def update_document(self,
+                              collection_name: str,
+                              query: dict[str, Any],
+                              update: dict[str, Any]):
+        """Update a document in a collection.
+        The manuscripts are updated by the synchronous database, maintaining its caches.
+        """
+        if collection_name == "manuscripts":
+            return await self.run(self.manuscript_db.update_document, collection_name, query, update)
+        return await super().update_document(collection_name, query, update)
+
+    async def delete_document(self,
+                              collection_name: str,
+                              query: dict[str, Any]):
+        """Delete a document from a collection.
+        The manuscripts are deleted by the synchronous database, maintaining its caches.
+        """
+        if collection_name == "manuscripts":
+            return await self.run(self.manuscript_db.delete_document, collection_name, query)
+        return await super().delete_document(collection_name, query)
+
+    async def get_manuscripts(self):
+        """Get all manuscripts from the database.
+        """
+        return await self.find_all_documents("manuscripts", {}, {"_id": 0, "id": 1})
+
+    async def get_manuscript(self, manuscript_id: str):
+        """Get a manuscript from the database.
+        """
+        document = await self.find_document("manuscripts", {"id": manuscript_id}, {"_id": 0})
+        if document is not None and self.verse_store is not None:
+            document["content"] = (await self.read_verses([manuscript_id])).get(manuscript_id, {})
+        return document
+
+    async def get_manuscript_content(self,
+                                     manuscript_id: str,
+                                     chapter: str = None,
+                                     verse: str = None):
+        """Get the content of a manuscript from the database.
+        With a chapter (and a verse), only this chapter (verse) is read, under the same keys.
+        """
+        if self.verse_store is not None:
+            content = (await self.read_verses([manuscript_id], chapter, verse)).get(manuscript_id)
+            if content is None and not await self.find_document("manuscripts", {"id": manuscript_id}, {"_id": 1}):
+                return None
+            return {"content": content or {}}
+        return await self.find_document("manuscripts",
+                                        {"id": manuscript_id},
+                                        {"_id": 0, content_field(chapter, verse): 1})
+
+    async def get_manuscript_profile(self, manuscript_id: str):
+        """Get the profile of a manuscript from the database.
+        """
+        return await self.find_document("manuscripts", {"id": manuscript_id}, {"_id": 0, "profile": 1})
+
+    async def get_manuscripts_profiles(self, manuscripts_list: list[str]):
+        """Given a list of manuscripts, return their profiles.
+        """
+        return await self.find_all_documents("manuscripts",
+                                             {"id": {"$in": manuscripts_list}},
+                                             {"_id": 0, "profile": 1, "id": 1})
+
+    async def get_all_manuscripts_profiles(self):
+        """Return all manuscripts profiles.
+        """
+        return await self.find_all_documents("manuscripts", {}, {"_id": 0, "profile": 1, "id": 1})
+
+    async def get_all_manuscripts_readings(self):
+        """Return all manuscripts readings.
+        """
+        return await self.find_all_documents("manuscripts", {}, {"_id": 0, "readings": 1, "id": 1})
+
+    async def get_manuscripts_content(self, manuscripts_list: list[str], chapter: str = None):
+        """Given a list of manuscripts, return their content (only a chapter of it, if given).
+        """
+        if self.verse_store is not None:
+            return [{"id": manuscript_id, "content": content}
+                    for manuscript_id, content in (await self.read_verses(manuscripts_list, chapter)).items()]
+        return await self.find_all_documents("manuscripts",
+                                             {"id": {"$in": manuscripts_list}},
+                                             {"_id": 0, content_field(chapter): 1, "id": 1})
+
+    async def get_all_manuscripts_content(self, chapter: str = None):
+        """Return all manuscripts content (only a chapter of it, if given).
+        """
+        if self.verse_store is not None:
+            return [{"id": manuscript_id, "content": content}
+                    for manuscript_id, content in (await self.read_verses(chapter=chapter)).items()]
+        return await self.find_all_documents("manuscripts", {}, {"_id": 0, content_field(chapter): 1, "id": 1})
+
+    async def get_manuscript_info(self, manuscript_id: str):
+        """Get the catalogue information of a manuscript from the database.
+        """
+        return await self.find_all_documents("manuscripts",
+                                             {"id": manuscript_id},
+                                             {"_id": 0, **dict.fromkeys(MANUSCRIPT_INFO_FIELDS, 1)})
+
+    async def get_manuscripts_info(self, manuscripts_list: list[str]):
+        """Get the catalogue information of manuscripts in a single query, by id.
+        """
+        documents = await self.find_all_documents("manuscripts",
+                                                  {"id": {"$in": list(manuscripts_list)}},
+                                                  {"_id": 0, "id": 1, **dict.fromkeys(MANUSCRIPT_INFO_FIELDS, 1)})
+        return {document.pop("id"): document for document in documents}
+
+    async def get_manuscript_verses(self, manuscript_id: str, chapter: str, verse: str):
+        """Get a verse of a manuscript.
+        """
+        manuscript_content = await self.get_manuscript_content(manuscript_id, chapter, verse)
+        return manuscript_content["content"][chapter][verse]
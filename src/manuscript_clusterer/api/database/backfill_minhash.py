@@ -0,0 +1,48 @@
+"""Compute the MinHash signatures missing from the stored manuscripts.
+
+The signatures of a manuscript are computed when it is written. The job fills
+those of the manuscripts written before, which the LSH indexes of the nearest
+manuscript queries skip otherwise, and writes them back with bulk updates.
+"""
+from loguru import logger
+from pymongo import UpdateOne
+
+from manuscript_clusterer.api.database.db_manipulator import ManuscriptDB
+from manuscript_clusterer.api.models.settings import Settings
+from manuscript_clusterer.engine.minhash import compute_minhash_signatures
+
+
+def backfill_minhash(db: ManuscriptDB, batch_size: int = 500):
+    """Compute and store the signatures of the chapters missing them.
+    Returns the number of updated manuscripts.
+    """
+    collection = db.db["manuscripts"]
+    projection = {"_id": 0, "id": 1, "minhash": 1}
+    if db.verse_store is None:
+        projection["content"] = 1
+    updated = 0
+    requests = []
+    for document in collection.find({}, projection):
+        if db.verse_store is not None:
+            document["content"] = db.verse_store.read([document["id"]]).get(document["id"], {})
+        missing = {chapter: verses for chapter, verses in document.get("content", {}).items()
+                   if chapter not in document.get("minhash", {})}
+        if not missing:
+            continue
+        requests.append(UpdateOne({"id": document["id"]},
+                                  {"$set": {f"minhash.{chapter}": signature
+                                            for chapter, signature in compute_minhash_signatures(missing).items()}}))
+        updated += 1
+        if len(requests) >= batch_size:
+            collection.bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    if updated:
+        db.bump_data_version()
+    logger.info(f"Computed the MinHash signatures of {updated} manuscripts")
+    return updated
+
+
+if __name__ == "__main__":
+    backfill_minhash(ManuscriptDB(**Settings().manuscript_db_options))
@@ -1,12 +1,43 @@
 """Set of utils for manipulating the Mongo database.
 """
+from hashlib import sha1
+from threading import Lock
 from typing import Any
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-from sklearn.cluster import DBSCAN, KMeans, AgglomerativeClustering
-from sklearn.metrics import adjusted_rand_score
-from manuscript_clusterer.engine.project import perform_projection_profiles, perform_projection_content
-from manuscript_clusterer.engine.cluster import cluster_profiles, cluster_texts, compute_distance_matrix_text, compute_distance_matrix_profiles, compute_distance_matrix_verse_text
+import numpy as np
+from loguru import logger
+from pymongo import ASCENDING, MongoClient, ReturnDocument
+from pymongo.errors import ConnectionFailure, DuplicateKeyError
+from manuscript_clusterer.engine.project import (PROJECTION_PARAMS, check_projection, fit_projection_file,
+                                                 perform_projection_profiles, perform_projection_content,
+                                                 perform_projection_content_knn, transform_projection_file)
+from manuscript_clusterer.engine.cluster import (cluster_profiles, cluster_texts, cluster_texts_knn,
+                                                 compute_distance_matrix_profiles, compute_distance_matrix_verse_text)
+from manuscript_clusterer.engine.knn import CONTENT_MODES
+from manuscript_clusterer.engine.collation import collate_verses
+from manuscript_clusterer.engine.distances import compute_verse_distance_tensor, encode_verses, jaccard_distance_block
+from manuscript_clusterer.engine.executor import EngineExecutor
+from manuscript_clusterer.engine.minhash import MinHashLSH, compute_minhash_signatures
+from manuscript_clusterer.engine.profile_matrix import ProfileMatrix
+from manuscript_clusterer.api.database.distance_store import DistanceStore
+from manuscript_clusterer.api.database.loader import ManuscriptLoader
+from manuscript_clusterer.api.database.projection_cache import ProjectionCache, projection_key
+from manuscript_clusterer.api.database.projection_models import ProjectionModelStore, hash_rows
+from manuscript_clusterer.api.database.verse_store import STORAGE_LAYOUTS, VerseStore
+
+
+# Sources of the projections: Wisse profiles or textual content of a chapter
+PROJECTION_SOURCES = ("profiles", "content")
+
+# Catalogue information of the manuscripts
+MANUSCRIPT_INFO_FIELDS = ("fullname", "wisse", "von-soden", "text-type", "aland-cat", "date")
+
+
+def content_field(chapter: str = None, verse: str = None):
+    """Path of the content of a manuscript, or of a chapter or verse of it, to project the reads on.
+    """
+    if verse is not None and chapter is None:
+        raise ValueError("A verse is read within a chapter")
+    return ".".join(["content"] + [key for key in (chapter, verse) if key is not None])
 
 
 class MongoDB:
@@ -16,10 +47,12 @@ class MongoDB:
     def __init__(self,
                  host: str = "localhost",
                  port: int = 27017,
-                 db_name: str = "manuscriptsDB"):
+                 db_name: str = "manuscriptsDB",
+                 client_options: dict[str, Any] = None):
         """Initialize the connection with the database.
+        `client_options` are given to the client (pool size, timeouts).
         """
-        self.client = MongoClient(host, port)
+        self.client = MongoClient(host, port, **(client_options or {}))
         self.db = self.client[db_name]
         self.check_connection()
 
@@ -87,10 +120,269 @@ class ManuscriptDB(MongoDB):
     def __init__(self,
                  host: str = "localhost",
                  port: int = 27017,
-                 db_name: str = "manuscriptsDB"):
+                 db_name: str = "manuscriptsDB",
+                 distance_workers: int = 1,
+                 distance_tile_size: int = 256,
+                 distance_dir: str = None,
+                 projection_cache_size: int = 32,
+                 projection_model_dir: str = None,
+                 projection_drift: float = 0.2,
+                 client_options: dict[str, Any] = None,
+                 engine: EngineExecutor = None,
+                 storage_layout: str = "document"):
         """Initialize the connection with the database.
+
+        With more than one distance worker (or a distance directory), the
+        distance matrices are computed by the tiled multi-process scheduler.
+        `projection_cache_size` is the number of projections kept in memory.
+        The fitted projection models are persisted in `projection_model_dir`, when given,
+        and refitted past a share `projection_drift` of manuscripts placed or removed since the fit.
+        `client_options` are given to the client (pool size, timeouts).
+        The engine computations are run by `engine`, inline by default.
+        The text of the manuscripts is stored within their documents, or one document per verse
+        with the "verses" `storage_layout` (see `VerseStore`). The layout must be the one of the
+        stored manuscripts, recorded in the metadata.
+        """
+        if storage_layout not in STORAGE_LAYOUTS:
+            raise ValueError(f"Unknown storage layout {storage_layout}")
+        super().__init__(host, port, db_name, client_options=client_options)
+        self.engine = engine if engine is not None else EngineExecutor()
+        self.verse_store = VerseStore(self.db) if storage_layout == "verses" else None
+        self.check_storage_layout(storage_layout)
+        self.distance_store = DistanceStore(self.db,
+                                            n_workers=distance_workers,
+                                            tile_size=distance_tile_size,
+                                            output_dir=distance_dir,
+                                            verse_store=self.verse_store,
+                                            engine=self.engine)
+        self._profile_matrix = None
+        self._profile_matrix_version = None
+        self._profile_matrix_lock = Lock()
+        self._neighbor_indexes = {}
+        self._neighbor_indexes_lock = Lock()
+        self.projection_cache = ProjectionCache(self.db, memory_size=projection_cache_size)
+        self.projection_models = ProjectionModelStore(projection_model_dir, drift_threshold=projection_drift)
+        self._projection_models_lock = Lock()
+
+    def ensure_indexes(self):
+        """Create the indexes of the queries, if absent.
+        The `id` of the manuscripts is unique, unless the stored manuscripts already repeat one.
+        """
+        manuscripts = self.db["manuscripts"]
+        if not any(index["key"] == [("id", ASCENDING)] for index in manuscripts.index_information().values()):
+            try:
+                manuscripts.create_index([("id", ASCENDING)], unique=True)
+            except DuplicateKeyError as e:
+                logger.warning(f"Duplicate manuscript ids, the index on the id is not unique: {e}")
+                manuscripts.create_index([("id", ASCENDING)])
+        self.distance_store.ensure_indexes()
+        self.projection_cache.ensure_indexes()
+        if self.verse_store is not None:
+            self.verse_store.ensure_indexes()
+
+    def stored_storage_layout(self):
+        """Return the layout of the stored manuscripts, None for an empty database.
+        The databases predating the record are in the layout of their manuscripts.
+        """
+        if not self.db["manuscripts"].find_one({}, {"_id": 1}):
+            return None
+        document = self.db["metadata"].find_one({"_id": "storage_layout"}, {"layout": 1})
+        if document is not None:
+            return document["layout"]
+        if self.db["manuscripts"].find_one({"content": {"$exists": True}}, {"_id": 1}):
+            return "document"
+        if (self.verse_store or VerseStore(self.db)).collection.find_one({}, {"_id": 1}):
+            return "verses"
+        return None
+
+    def record_storage_layout(self, storage_layout: str):
+        """Record the layout of the stored manuscripts.
+        """
+        self.db["metadata"].update_one({"_id": "storage_layout"},
+                                       {"$set": {"layout": storage_layout}},
+                                       upsert=True)
+
+    def check_storage_layout(self, storage_layout: str):
+        """Check that the stored manuscripts are in a layout, recorded if not already.
+        An empty database takes the layout.
+        """
+        stored = self.stored_storage_layout()
+        if stored is not None and stored != storage_layout:
+            raise ValueError(f"The manuscripts are stored in the {stored} layout, not {storage_layout}")
+        if stored is None or not self.db["metadata"].find_one({"_id": "storage_layout"}, {"_id": 1}):
+            self.record_storage_layout(storage_layout)
+
+    def _with_content(self, document: dict[str, Any] | None):
+        """Add the content of a manuscript stored by verse to its document.
+        """
+        if document is not None and self.verse_store is not None:
+            document["content"] = self.verse_store.read([document["id"]]).get(document["id"], {})
+        return document
+
+    def insert_document(self,
+                        collection_name: str,
+                        document: dict[str, Any]):
+        """Insert a document into a collection.
+        Inserting a manuscript adds its distances to the distance store, and its MinHash signatures.
+        In the "verses" layout, its content is stored by verse.
+        """
+        if collection_name == "manuscripts" and "content" in document and "minhash" not in document:
+            document = {**document, "minhash": compute_minhash_signatures(document["content"])}
+        if collection_name == "manuscripts" and self.verse_store is not None:
+            inserted_id = super().insert_document(collection_name,
+                                                  {key: value for key, value in document.items() if key != "content"})
+            self.verse_store.write(document["id"], document.get("content", {}))
+        else:
+            inserted_id = super().insert_document(collection_name, document)
+        if collection_name == "manuscripts":
+            data_version = self.bump_data_version()
+            self.refresh_profile_matrix()
+            self.refresh_neighbor_indexes()
+            self.distance_store.add_manuscript(document, data_version=data_version)
+        return inserted_id
+
+    def update_document(self,
+                        collection_name: str,
+                        query: dict[str, Any],
+                        update: dict[str, Any]):
+        """Update a document in a collection.
+        Updating the content or profile of a manuscript recomputes its distances,
+        and the content its MinHash signatures.
+        In the "verses" layout, the content replaces the verses of the manuscript.
+        """
+        if collection_name == "manuscripts" and "content" in update and "minhash" not in update:
+            update = {**update, "minhash": compute_minhash_signatures(update["content"])}
+        updated_fields = set(update)
+        if collection_name == "manuscripts" and self.verse_store is not None and "content" in update:
+            document = self.find_document("manuscripts", query, {"_id": 0, "id": 1})
+            if document:
+                self.verse_store.write(document["id"], update["content"])
+            update = {key: value for key, value in update.items() if key != "content"}
+            modified_count = super().update_document(collection_name, query, update) if update else 0
+            modified_count = max(modified_count, int(document is not None))
+        else:
+            modified_count = super().update_document(collection_name, query, update)
+        if collection_name == "manuscripts":
+            data_version = self.bump_data_version()
+            self.refresh_profile_matrix()
+            self.refresh_neighbor_indexes()
+        if collection_name == "manuscripts" and ({"content", "profile"} & updated_fields):
+            document = self._with_content(self.find_document("manuscripts", query, {"_id": 0}))
+            if document:
+                self.distance_store.remove_manuscript(document["id"], data_version=data_version)
+                self.distance_store.add_manuscript(document, data_version=data_version)
+        return modified_count
+
+    def delete_document(self,
+                        collection_name: str,
+                        query: dict[str, Any]):
+        """Delete a document from a collection.
+        Deleting a manuscript drops its distances from the distance store.
+        """
+        document = None
+        if collection_name == "manuscripts":
+            document = self.find_document("manuscripts", query, {"_id": 0, "id": 1})
+        deleted_count = super().delete_document(collection_name, query)
+        if collection_name == "manuscripts":
+            data_version = self.bump_data_version()
+            self.refresh_profile_matrix()
+            self.refresh_neighbor_indexes()
+        if deleted_count and document:
+            self.distance_store.remove_manuscript(document["id"], data_version=data_version)
+            if self.verse_store is not None:
+                self.verse_store.delete(document["id"])
+        return deleted_count
+
+    def get_profile_matrix(self, manuscripts_list: list[str] = None):
+        """Return the profiles as a columnar matrix, optionally restricted to a list of manuscripts.
+        The matrix of the whole corpus is built once per version of the manuscripts, so that
+        the changes made by other processes (scripts, other API workers) are seen too.
+        """
+        data_version = self.data_version()
+        with self._profile_matrix_lock:
+            if self._profile_matrix is None or self._profile_matrix_version != data_version:
+                profiles = self.get_all_manuscripts_profiles()
+                self._profile_matrix = ProfileMatrix.from_profiles(
+                    {profile["id"]: profile["profile"] for profile in profiles if "profile" in profile})
+                self._profile_matrix_version = data_version
+            profile_matrix = self._profile_matrix
+        if manuscripts_list is None:
+            return profile_matrix
+        return profile_matrix.subset(manuscripts_list)
+
+    def refresh_profile_matrix(self):
+        """Drop the profile matrix, it is rebuilt on its next use.
         """
-        super().__init__(host, port, db_name)
+        with self._profile_matrix_lock:
+            self._profile_matrix = None
+
+    def data_version(self):
+        """Return the version of the manuscripts, incremented on every change.
+        """
+        document = self.db["metadata"].find_one({"_id": "data_version"}, {"version": 1})
+        return document["version"] if document else 0
+
+    def bump_data_version(self):
+        """Increment the version of the manuscripts and drop the stale projections.
+        Returns the new version.
+        """
+        document = self.db["metadata"].find_one_and_update({"_id": "data_version"},
+                                                           {"$inc": {"version": 1}},
+                                                           upsert=True,
+                                                           return_document=ReturnDocument.AFTER)
+        self.projection_cache.drop_stale(document["version"])
+        return document["version"]
+
+    def get_neighbor_index(self, chapter: str):
+        """Return the LSH index of the MinHash signatures of a chapter.
+        The index is built from the stored signatures once per version of the manuscripts,
+        so that the changes made by other processes are seen too. The signatures are
+        computed when the manuscripts are written (see `backfill_minhash` for older documents).
+        """
+        data_version = self.data_version()
+        with self._neighbor_indexes_lock:
+            version, index = self._neighbor_indexes.get(chapter, (None, None))
+            if index is None or version != data_version:
+                index = MinHashLSH()
+                for document in self.db["manuscripts"].find({f"minhash.{chapter}": {"$exists": True}},
+                                                            {"_id": 0, "id": 1, f"minhash.{chapter}": 1}):
+                    index.insert(document["id"], document["minhash"][chapter])
+                self._neighbor_indexes[chapter] = (data_version, index)
+            return index
+
+    def refresh_neighbor_indexes(self):
+        """Drop the LSH indexes, they are rebuilt on their next use.
+        """
+        with self._neighbor_indexes_lock:
+            self._neighbor_indexes = {}
+
+    def get_manuscript_neighbors(self,
+                                 manuscript_id: str,
+                                 chapter: str,
+                                 k: int = 20,
+                                 rerank: bool = False):
+        """Get the manuscripts closest to a manuscript on a chapter, using the LSH index.
+        Returns None if the manuscript does not contain the chapter.
+        With rerank, the candidates are sorted by their exact textual distance
+        to the manuscript, otherwise by their estimated similarity.
+        """
+        index = self.get_neighbor_index(chapter)
+        if manuscript_id not in index:
+            return None
+        if not rerank:
+            return [{"id": other_id, "similarity": similarity}
+                    for other_id, similarity in index.query(manuscript_id, k=k)]
+        similarities = dict(index.query(manuscript_id))
+        content = {text["id"]: text["content"].get(chapter, {})
+                   for text in self.get_manuscripts_content([manuscript_id] + list(similarities), chapter)}
+        manuscript_keys, encoded = encode_verses(content)
+        distances = jaccard_distance_block(encoded,
+                                           np.array([manuscript_keys.index(manuscript_id)]),
+                                           np.arange(len(manuscript_keys)))[0]
+        neighbors = sorted((distance.item(), other_id)
+                           for other_id, distance in zip(manuscript_keys, distances) if other_id != manuscript_id)
+        return [{"id": other_id, "similarity": similarities[other_id], "distance": distance}
+                for distance, other_id in neighbors[:k]]
 
     def get_manuscripts(self):
         """Get all manuscripts from the database.
@@ -100,18 +392,27 @@ class ManuscriptDB(MongoDB):
     def get_manuscript(self, manuscript_id: str):
         """Get a manuscript from the database.
         """
-        return self.find_document("manuscripts",
-                                  {"id": manuscript_id},
-                                  {"_id": 0})
-
-    def get_manuscript_content(self, manuscript_id: str):
+        return self._with_content(self.find_document("manuscripts",
+                                                     {"id": manuscript_id},
+                                                     {"_id": 0}))
+
+    def get_manuscript_content(self,
+                               manuscript_id: str,
+                               chapter: str = None,
+                               verse: str = None):
         """Get the content of a manuscript from the database.
+        With a chapter (and a verse), only this chapter (verse) is read, under the same keys.
         """
+        if self.verse_store is not None:
+            content = self.verse_store.read([manuscript_id], chapter, verse).get(manuscript_id)
+            if content is None and not self.find_document("manuscripts", {"id": manuscript_id}, {"_id": 1}):
+                return None
+            return {"content": content or {}}
         return self.find_document("manuscripts",
                                   {"id": manuscript_id,
                                    },
                                   {"_id": 0,
-                                   "content": 1})
+                                   content_field(chapter, verse): 1})
 
     def get_manuscript_profile(self, manuscript_id: str):
         """Get the profile of a manuscript from the database.
@@ -148,22 +449,28 @@ class ManuscriptDB(MongoDB):
                                         "readings": 1,
                                         "id": 1})
 
-    def get_manuscripts_content(self, manuscripts_list: list[str]):
-        """Given a list of manuscripts, return their content.
+    def get_manuscripts_content(self, manuscripts_list: list[str], chapter: str = None):
+        """Given a list of manuscripts, return their content (only a chapter of it, if given).
         """
+        if self.verse_store is not None:
+            return [{"id": manuscript_id, "content": content}
+                    for manuscript_id, content in self.verse_store.read(manuscripts_list, chapter).items()]
         return self.find_all_documents("manuscripts",
                                        {"id": {"$in": manuscripts_list}},
                                        {"_id": 0,
-                                        "content": 1,
+                                        content_field(chapter): 1,
                                         "id": 1})
 
-    def get_all_manuscripts_content(self):
-        """Return all manuscripts profiles.
+    def get_all_manuscripts_content(self, chapter: str = None):
+        """Return all manuscripts content (only a chapter of it, if given).
         """
+        if self.verse_store is not None:
+            return [{"id": manuscript_id, "content": content}
+                    for manuscript_id, content in self.verse_store.read(chapter=chapter).items()]
         return self.find_all_documents("manuscripts",
                                        {},
                                        {"_id": 0,
-                                        "content": 1,
+                                        content_field(chapter): 1,
                                         "id": 1})
 
     def get_manuscript_info(self, manuscript_id: str):
@@ -173,84 +480,206 @@ class ManuscriptDB(MongoDB):
             "manuscripts",
             {"id": manuscript_id},
             {"_id": 0,
-             "fullname": 1,
-                "wisse": 1,
-                "von-soden": 1,
-                "text-type": 1,
-                "aland-cat": 1,
-                "date": 1}
+             **dict.fromkeys(MANUSCRIPT_INFO_FIELDS, 1)}
         )
 
+    def get_manuscripts_info(self, manuscripts_list: list[str]):
+        """Get the catalogue information of manuscripts in a single query, by id.
+        """
+        documents = self.find_all_documents("manuscripts",
+                                            {"id": {"$in": list(manuscripts_list)}},
+                                            {"_id": 0,
+                                             "id": 1,
+                                             **dict.fromkeys(MANUSCRIPT_INFO_FIELDS, 1)})
+        return {document.pop("id"): document for document in documents}
+
     def get_manuscript_verses(self, manuscript_id: str, chapter: str, verse: str):
         """Get the list of the verses within a manuscript.
         """
-        manuscript_content = self.find_document("manuscripts",
-                                                {"id": manuscript_id},
-                                                {"_id": 0,
-                                                    "content": 1})
+        manuscript_content = self.get_manuscript_content(manuscript_id, chapter, verse)
         return manuscript_content["content"][chapter][verse]
 
     def get_manuscripts_projected(self,
                                   manuscripts_list: list[str] = None,
-                                  all_manuscripts: bool = False):
+                                  all_manuscripts: bool = False,
+                                  method: str = "umap"):
         """Given a list of manuscript, return their profiles.
         If all is enabled, all manuscripts are returned.
         Either one of the two must be enabled.
+        The method ("umap", "mca" or "pca") selects the projection backend.
         """
         if not all_manuscripts:
             if not manuscripts_list:
                 raise ValueError(
                     "Either all_manuscripts or manuscripts_list must be enabled")
-        if not all_manuscripts:
-            profiles = self.get_manuscripts_profiles(manuscripts_list)
-        else:
-            profiles = self.get_all_manuscripts_profiles()
-        profiles = {profile["id"]: profile["profile"] for profile in profiles}
-        return perform_projection_profiles(profiles)
+        profiles = self.get_profile_matrix(None if all_manuscripts else manuscripts_list)
+        return self.engine.run(perform_projection_profiles, profiles.to_dataframe(), method=method)
 
     def get_content_projected(self,
                               chapter: str,
                               manuscripts_list: list[str] = None,
-                              all_manuscripts: bool = False):
+                              all_manuscripts: bool = False,
+                              mode: str = "dense",
+                              method: str = "umap",
+                              loader: ManuscriptLoader = None):
         """Given a list of manuscript, return their profiles.
         If all is enabled, all manuscripts are returned.
         Either one of the two must be enabled.
+        The "knn" mode projects the sparse k-nearest-neighbours graph instead of the full distance matrix,
+        with UMAP only. The method ("umap" or "mds") selects the backend of the dense mode.
+        The content is read through the loader of the request, if given.
         """
         if not all_manuscripts:
             if not manuscripts_list:
                 raise ValueError(
                     "Either all_manuscripts or manuscripts_list must be enabled")
+        if mode not in CONTENT_MODES:
+            raise ValueError(f"Unknown content mode {mode}")
+        if mode == "knn" and method != "umap":
+            raise ValueError("The knn mode is only projected by UMAP")
+        reader = self if loader is None else loader
         if not all_manuscripts:
-            content = self.get_all_manuscripts_content(manuscripts_list)
+            content = reader.get_manuscripts_content(manuscripts_list, chapter)
         else:
-            content = self.get_all_manuscripts_content()
+            content = reader.get_all_manuscripts_content(chapter)
         content = {text["id"]: text["content"][chapter] for text in content}
-        return perform_projection_content(content)
+        if mode == "knn":
+            return self.engine.run(perform_projection_content_knn, content)
+        return self.engine.run(perform_projection_content, content, method=method)
+
+    def get_projection(self,
+                       source: str,
+                       manuscripts_list: list[str] = None,
+                       all_manuscripts: bool = False,
+                       chapter: str = None,
+                       mode: str = "dense",
+                       method: str = "umap",
+                       refit: bool = False,
+                       loader: ManuscriptLoader = None):
+        """Return the coordinates of the projection of the manuscripts, through the projection cache.
+        The source is either the "profiles" of the manuscripts or their "content" on a chapter,
+        and the method the projection backend (see `PROJECTION_BACKENDS`).
+        The projections of all the manuscripts (but the "knn" mode) are incremental,
+        `refit` forces a refit of their model.
+        The manuscripts are read through the loader of the request, if given.
+        """
+        if source not in PROJECTION_SOURCES:
+            raise ValueError(f"Unknown projection source {source}")
+        if not all_manuscripts and not manuscripts_list:
+            raise ValueError(
+                "Either all_manuscripts or manuscripts_list must be enabled")
+        check_projection(method, source, mode=mode)
+        data_version = self.data_version()
+        params = dict(PROJECTION_PARAMS)
+        if source == "content":
+            params.update(chapter=chapter, mode=mode)
+        key = projection_key(source,
+                             None if all_manuscripts else sorted(manuscripts_list),
+                             data_version,
+                             method,
+                             params)
+
+        def compute():
+            if all_manuscripts and (source == "profiles" or mode == "dense"):
+                return self.get_incremental_projection(source, chapter=chapter, method=method, refit=refit,
+                                                       loader=loader)
+            if source == "profiles":
+                return self.get_manuscripts_projected(manuscripts_list, all_manuscripts, method=method)[1]
+            return self.get_content_projected(chapter, manuscripts_list, all_manuscripts,
+                                              mode=mode, method=method, loader=loader)[1]
+        if refit:
+            embedding = compute()
+            self.projection_cache.put(key, embedding, data_version)
+            return embedding
+        return self.projection_cache.get_or_compute(key, compute, data_version)
+
+    def get_incremental_projection(self,
+                                   source: str,
+                                   chapter: str = None,
+                                   method: str = "umap",
+                                   refit: bool = False,
+                                   loader: ManuscriptLoader = None):
+        """Return the coordinates of the projection of all the manuscripts.
+        The new and changed manuscripts are placed onto the fitted model without moving the others,
+        the model is fitted on first use, on request or past the drift threshold.
+        The fitted model is only handled by the engine, through its file.
+        """
+        if source == "profiles":
+            profile_matrix = self.get_profile_matrix()
+            data = profile_matrix.to_dataframe()
+            hashes = {manuscript_id: sha1(row.tobytes()).hexdigest()
+                      for manuscript_id, row in zip(profile_matrix.manuscript_ids, profile_matrix.values)}
+            features = profile_matrix.reading_keys
+            name = f"profiles-{method}"
+        else:
+            data = {text["id"]: text["content"][chapter]
+                    for text in (self if loader is None else loader).get_all_manuscripts_content(chapter)
+                    if chapter in text["content"]}
+            hashes = hash_rows(data)
+            features = None
+            name = f"content-{chapter}-{method}"
+        with self._projection_models_lock:
+            record = None if refit else self.projection_models.load(name)
+            plan = self.projection_models.plan(record, hashes, features)
+            if plan is None:
+                model_file = self.projection_models.new_model_file(name)
+                embedding = self.engine.run(fit_projection_file,
+                                            self.projection_models.model_path(model_file),
+                                            source,
+                                            data,
+                                            method=method)
+                record = {"model_file": model_file,
+                          "features": features,
+                          "fit_hashes": hashes,
+                          "hashes": hashes,
+                          "embedding": embedding}
+            else:
+                to_place, to_drop = plan
+                if not to_place and not to_drop:
+                    return record["embedding"]
+                discarded = set(to_place) | set(to_drop)
+                embedding = {manuscript_id: coordinates for manuscript_id, coordinates in record["embedding"].items()
+                             if manuscript_id not in discarded}
+                if to_place:
+                    placed = data.loc[to_place] if source == "profiles" else \
+                        {manuscript_id: data[manuscript_id] for manuscript_id in to_place}
+                    embedding.update(self.engine.run(transform_projection_file,
+                                                     self.projection_models.model_path(record["model_file"]),
+                                                     placed))
+                record = {**record, "hashes": hashes, "embedding": embedding}
+            self.projection_models.save(name, record)
+        return record["embedding"]
 
     def get_profile_clustered(self,
                               manuscripts_list: list[str] = None,
-                              all_manuscripts: bool = False):
+                              all_manuscripts: bool = False,
+                              silhouette: str = "auto"):
         """Given a list of manuscript, return their profiles.
         If all is enabled, all manuscripts are returned.
         Either one of the two must be enabled.
+        The silhouette mode ("exact", "approximate" or "auto") selects the number of clusters.
         """
         if not all_manuscripts:
             if not manuscripts_list:
                 raise ValueError(
                     "Either all_manuscripts or manuscripts_list must be enabled")
-        if not all_manuscripts:
-            profiles = self.get_manuscripts_profiles(manuscripts_list)
-        else:
-            profiles = self.get_all_manuscripts_profiles()
-        profiles = {profile["id"]: profile["profile"] for profile in profiles}
-        return cluster_profiles(profiles, clusterer_class=AgglomerativeClustering)
+        self.engine.load_modules()
+        from sklearn.cluster import AgglomerativeClustering
+        profiles = self.get_profile_matrix(None if all_manuscripts else manuscripts_list)
+        return self.engine.run(cluster_profiles,
+                               profiles.to_dataframe(),
+                               clusterer_class=AgglomerativeClustering,
+                               silhouette=silhouette)
 
     def get_readings_clustered(self,
                                manuscripts_list: list[str] = None,
-                               all_manuscripts: bool = False):
+                               all_manuscripts: bool = False,
+                               return_score: bool = False):
         """Given a list of manuscript, return their profiles.
         If all is enabled, all manuscripts are returned.
         Either one of the two must be enabled.
+        With `return_score`, the silhouette score of the clustering and its confidence interval
+        are returned too.
         """
         if not all_manuscripts:
             if not manuscripts_list:
@@ -261,28 +690,51 @@ class ManuscriptDB(MongoDB):
         else:
             readings = self.get_all_manuscripts_readings()
         readings = {reading["id"]: reading["readings"] for reading in readings}
-        return cluster_texts(readings,  clusterer_class=AgglomerativeClustering)
+        self.engine.load_modules()
+        from sklearn.cluster import AgglomerativeClustering
+        return self.engine.run(cluster_texts, readings, clusterer_class=AgglomerativeClustering,
+                               return_score=return_score)
 
     def get_content_clustered(self,
                               chapter: str,
                               manuscripts_list: list[str] = None,
-                              all_manuscripts: bool = False):
+                              all_manuscripts: bool = False,
+                              silhouette: str = "auto",
+                              mode: str = "dense",
+                              loader: ManuscriptLoader = None,
+                              return_score: bool = False):
         """Given a list of manuscript, return their profiles.
         If all is enabled, all manuscripts are returned.
         Either one of the two must be enabled.
+        The silhouette mode ("exact", "approximate" or "auto") selects the number of clusters.
+        The "knn" mode clusters the sparse k-nearest-neighbours graph instead of the full distance matrix.
+        The content is read through the loader of the request, if given.
+        With `return_score`, the silhouette score of the clustering and its confidence interval
+        are returned too (None in "knn" mode, which does not select a number of clusters).
         """
         if not all_manuscripts:
             if not manuscripts_list:
                 raise ValueError(
                     "Either all_manuscripts or manuscripts_list must be enabled")
+        if mode not in CONTENT_MODES:
+            raise ValueError(f"Unknown content mode {mode}")
+        reader = self if loader is None else loader
         if not all_manuscripts:
-            content = self.get_all_manuscripts_content(manuscripts_list)
+            content = reader.get_manuscripts_content(manuscripts_list, chapter)
         else:
-            content = self.get_all_manuscripts_content()
+            content = reader.get_all_manuscripts_content(chapter)
         content = {text["id"]: text["content"][chapter] for text in content}
-        return cluster_texts(content,
-                              clusterer_class=AgglomerativeClustering,
-                              linkage="complete")
+        if mode == "knn":
+            clusters = self.engine.run(cluster_texts_knn, content)
+            return (clusters, None) if return_score else clusters
+        self.engine.load_modules()
+        from sklearn.cluster import AgglomerativeClustering
+        return self.engine.run(cluster_texts,
+                               content,
+                               clusterer_class=AgglomerativeClustering,
+                               silhouette=silhouette,
+                               return_score=return_score,
+                               linkage="complete")
 
     def get_content_distances(self,
                               chapter: str,
@@ -294,12 +746,9 @@ class ManuscriptDB(MongoDB):
             if not manuscripts_list:
                 raise ValueError(
                     "Either all_manuscripts or manuscripts_list must be enabled")
-        if not all_manuscripts:
-            content = self.get_manuscripts_content(manuscripts_list)
-        else:
-            content = self.get_all_manuscripts_content()
-        content = {text["id"]: text["content"][chapter] for text in content}
-        return compute_distance_matrix_text(content)
+        return self.distance_store.get(chapter,
+                                       "all",
+                                       manuscripts_list=None if all_manuscripts else manuscripts_list)
 
     def get_reading_distances(self,
                               manuscripts_list: list[str] = None,
@@ -311,19 +760,24 @@ class ManuscriptDB(MongoDB):
     def get_profile_distance(self,
                              chapter: str,
                              manuscripts_list: list[str] = None,
-                             all_manuscripts: bool = False):
+                             all_manuscripts: bool = False,
+                             missing: str = "strict"):
         """Get the distance between the profiles.
+        Returns the manuscript keys and the Hamming distance matrix between them,
+        computed on the whole profiles (the chapter does not restrict them).
+        The default "strict" policy for missing readings is read from the distance
+        store, other policies are computed on the packed profiles.
         """
         if not all_manuscripts:
             if not manuscripts_list:
                 raise ValueError(
                     "Either all_manuscripts or manuscripts_list must be enabled")
-        if not all_manuscripts:
-            profiles = self.get_manuscripts_profiles(manuscripts_list)
-        else:
-            profiles = self.get_all_manuscripts_profiles()
-        profiles = {profile["id"]: profile["profile"] for profile in profiles}
-        return compute_distance_matrix_profiles(profiles)
+        if missing == "strict":
+            return self.distance_store.get(chapter,
+                                           "wisse",
+                                           manuscripts_list=None if all_manuscripts else manuscripts_list)
+        profiles = self.get_profile_matrix(None if all_manuscripts else manuscripts_list)
+        return profiles.manuscript_ids, profiles.distance_matrix(missing=missing)
 
     def get_verse_distance_content(self,
                                    manuscript_1: str,
@@ -331,13 +785,29 @@ class ManuscriptDB(MongoDB):
                                    chapter: str):
         """Get the distance between the verses.
         """
-        manuscript_1_content = self.get_manuscript_content(manuscript_1)[
+        manuscript_1_content = self.get_manuscript_content(manuscript_1, chapter)[
             "content"][chapter]
-        manuscript_2_content = self.get_manuscript_content(manuscript_2)[
+        manuscript_2_content = self.get_manuscript_content(manuscript_2, chapter)[
             "content"][chapter]
-        return compute_distance_matrix_verse_text(
-            {manuscript_1: manuscript_1_content,
-             manuscript_2: manuscript_2_content})
+        return self.engine.run(compute_distance_matrix_verse_text,
+                               {manuscript_1: manuscript_1_content,
+                                manuscript_2: manuscript_2_content})
+
+    def get_verse_distances_content(self,
+                                    manuscripts_list: list[str],
+                                    chapter: str,
+                                    reference: str = None):
+        """Get the distance between the verses of a group of manuscripts.
+        Without reference, returns the (manuscripts x manuscripts x verses) distances,
+        otherwise the (manuscripts x verses) distances to the reference manuscript.
+        """
+        requested = list(dict.fromkeys(manuscripts_list + ([reference] if reference else [])))
+        content = {text["id"]: text["content"].get(chapter, {})
+                   for text in self.get_manuscripts_content(requested, chapter)}
+        if reference is not None and reference not in content:
+            raise ValueError(f"Reference manuscript {reference} not found")
+        verses = {manuscript_id: content[manuscript_id] for manuscript_id in requested if manuscript_id in content}
+        return self.engine.run(compute_verse_distance_tensor, verses, reference=reference)
 
     def get_verse_distance_profiles(self,
                                     manuscript_1: str,
@@ -346,12 +816,20 @@ class ManuscriptDB(MongoDB):
         """
         manuscript_1_profile = self.get_manuscript_profile(manuscript_1)
         manuscript_2_profile = self.get_manuscript_profile(manuscript_2)
-        return compute_distance_matrix_profiles({manuscript_1: manuscript_1_profile,
-                                                 manuscript_2: manuscript_2_profile})
+        return self.engine.run(compute_distance_matrix_profiles,
+                               {manuscript_1: manuscript_1_profile,
+                                manuscript_2: manuscript_2_profile})
+
+    def collate_verses(self, witnesses: dict[str, str]):
+        """Collate the texts of a verse, given by manuscript, as an HTML table.
+        """
+        return self.engine.run(collate_verses, witnesses)
 
     def measure_cluster_quality(self,
                                 clusters: list[str],
                                 ground_truth: list[str]):
         """Measure distance between clusterings.
         """
+        self.engine.load_modules()
+        from sklearn.metrics import adjusted_rand_score
         return round(adjusted_rand_score(clusters, ground_truth), 2)
\ No newline at end of file
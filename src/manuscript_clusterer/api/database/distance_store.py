@@ -0,0 +1,262 @@
+"""Persisted distance matrices, maintained incrementally.
+
+The store keeps one document per (chapter, scheme, manuscript) in the
+`distances` collection, holding the distances from the manuscript to every
+other manuscript having the chapter. The Wisse distance is computed on the
+whole profile, as a single matrix for all the chapters. A store is built in
+full the first time it is read, afterwards inserting a manuscript only
+computes its row and deleting one only drops its row and column. The rows
+are unique by (chapter, scheme, manuscript) and written as upserts, and the
+concurrent first reads of a store wait for a single build.
+
+The full matrices are computed by the engine, out of the API process when it
+has workers. To compute the row of a manuscript, the data of each store is
+kept encoded in memory along with the version of the manuscripts it reflects:
+a write of the next version only encodes the manuscript written, and the data
+is read again when other processes wrote in between. The row is computed in
+the process, against the encoded data (a few vectorized operations per verse,
+cheaper than sending that data to a worker), as are the reads of the stored
+matrices.
+"""
+from threading import Lock
+from typing import Any
+import numpy as np
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+from manuscript_clusterer.engine.distances import ProfileRows, VerseCounts
+from manuscript_clusterer.engine.executor import EngineExecutor
+from manuscript_clusterer.engine.tiling import compute_distance_matrix
+
+
+# Textual distance on the content ("all") and Hamming distance on the Wisse profile ("wisse")
+DISTANCE_SCHEMES = ("all", "wisse")
+
+# Chapter under which the distances of the whole profiles are stored
+WHOLE_PROFILE = "*"
+
+
+class DistanceStore:
+    """Persisted distance matrices per (chapter, scheme).
+    """
+
+    def __init__(self,
+                 db,
+                 collection_name: str = "distances",
+                 n_workers: int = 1,
+                 tile_size: int = 256,
+                 output_dir: str = None,
+                 verse_store=None,
+                 engine: EngineExecutor = None):
+        """Initialize the store on top of a Mongo database.
+        The content is read from `verse_store`, when the manuscripts are stored by verse.
+        The full matrices are computed by `engine`, inline by default.
+        """
+        self.db = db
+        self.engine = engine if engine is not None else EngineExecutor()
+        self.verse_store = verse_store
+        self.collection = db[collection_name]
+        self.n_workers = n_workers
+        self.tile_size = tile_size
+        self.output_dir = output_dir
+        self._encodings = {}
+        self._encodings_lock = Lock()
+        self._lock = Lock()
+        self._build_locks = {}
+
+    def ensure_indexes(self):
+        """Create the indexes of the rows, unique by matrix and manuscript, and by manuscript.
+        """
+        # Drop the Wisse distances stored by chapter by earlier versions
+        self.collection.delete_many({"scheme": "wisse", "chapter": {"$ne": WHOLE_PROFILE}})
+        # Earlier versions used a non unique index, under which concurrent writes could duplicate rows:
+        # the matrices having duplicates are dropped, to be built again on their next read
+        index = self.collection.index_information().get("chapter_1_scheme_1_id_1")
+        if index is not None and not index.get("unique"):
+            self.collection.drop_index("chapter_1_scheme_1_id_1")
+            for group in self.collection.aggregate([
+                {"$group": {"_id": {"chapter": "$chapter", "scheme": "$scheme", "id": "$id"},
+                            "count": {"$sum": 1}}},
+                {"$match": {"count": {"$gt": 1}}}
+            ]):
+                self.collection.delete_many({"chapter": group["_id"]["chapter"],
+                                             "scheme": group["_id"]["scheme"]})
+        self.collection.create_index([("chapter", ASCENDING), ("scheme", ASCENDING), ("id", ASCENDING)],
+                                     unique=True)
+        self.collection.create_index([("id", ASCENDING)])
+
+    @staticmethod
+    def _check_scheme(scheme: str):
+        """Check that the distance scheme is supported.
+        """
+        if scheme not in DISTANCE_SCHEMES:
+            raise ValueError(f"Unknown distance scheme {scheme}")
+
+    @staticmethod
+    def _store_chapter(chapter: str, scheme: str):
+        """Return the chapter under which the distances of the scheme are stored.
+        """
+        return WHOLE_PROFILE if scheme == "wisse" else chapter
+
+    def _extract(self, document: dict[str, Any], chapter: str, scheme: str):
+        """Extract the data of the scheme from a manuscript document.
+        Returns None if the manuscript does not contain the chapter, or has no profile.
+        """
+        if scheme == "all":
+            return document.get("content", {}).get(chapter)
+        return document.get("profile") or None
+
+    def _load_data(self, chapter: str, scheme: str):
+        """Load the data of every manuscript containing the chapter.
+        Only the chapter of the content is read, and the whole profiles.
+        """
+        if scheme == "all" and self.verse_store is not None:
+            return {manuscript_id: content[chapter]
+                    for manuscript_id, content in self.verse_store.read(chapter=chapter).items()}
+        if scheme == "all":
+            query, field = {f"content.{chapter}": {"$exists": True}}, f"content.{chapter}"
+        else:
+            query, field = {}, "profile"
+        data = {}
+        for document in self.db["manuscripts"].find(query, {"_id": 0, "id": 1, field: 1}):
+            value = self._extract(document, chapter, scheme)
+            if value is not None:
+                data[document["id"]] = value
+        return data
+
+    def _compute_matrix(self, data: dict[str, Any], scheme: str):
+        """Compute the full distance matrix of the scheme, by the engine.
+        The tiles are computed by workers started like those of the engine.
+        """
+        return self.engine.run(compute_distance_matrix,
+                               data,
+                               kind="text" if scheme == "all" else "profiles",
+                               n_workers=self.n_workers,
+                               tile_size=self.tile_size,
+                               output_dir=self.output_dir,
+                               start_method=self.engine.start_method)
+
+    def _encoding(self, chapter: str, scheme: str, data_version: int = None):
+        """Return the encoded data of a store at `data_version`.
+        The encoded data kept for the version is reused, otherwise the data is read again.
+        Must be called under the encodings lock.
+        """
+        version, encoding = self._encodings.get((chapter, scheme), (None, None))
+        if encoding is None or data_version is None or version != data_version:
+            data = self._load_data(chapter, scheme)
+            encoding = VerseCounts(data) if scheme == "all" else ProfileRows(data)
+        if data_version is None:
+            self._encodings.pop((chapter, scheme), None)
+        else:
+            self._encodings[(chapter, scheme)] = (data_version, encoding)
+        return encoding
+
+    def _remove_encoded(self, manuscript_id: str, data_version: int = None):
+        """Remove a manuscript from the encoded data kept for the previous version (or the same one),
+        which then reflects `data_version`, and forget the encoded data of older versions.
+        Must be called under the encodings lock.
+        """
+        for key, (version, encoding) in list(self._encodings.items()):
+            if data_version is not None and version in (data_version - 1, data_version):
+                encoding.remove(manuscript_id)
+                self._encodings[key] = (data_version, encoding)
+            else:
+                del self._encodings[key]
+
+    def stores(self):
+        """List the (chapter, scheme) pairs currently stored.
+        """
+        return [(group["_id"]["chapter"], group["_id"]["scheme"])
+                for group in self.collection.aggregate([
+                    {"$group": {"_id": {"chapter": "$chapter", "scheme": "$scheme"}}}
+                ])]
+
+    def build(self, chapter: str, scheme: str):
+        """Compute the full distance matrix of a chapter and persist it.
+        """
+        self._check_scheme(scheme)
+        chapter = self._store_chapter(chapter, scheme)
+        self.drop(chapter, scheme)
+        manuscript_keys, distances = self._compute_matrix(self._load_data(chapter, scheme), scheme)
+        if manuscript_keys:
+            self.collection.bulk_write([
+                ReplaceOne({"chapter": chapter, "scheme": scheme, "id": manuscript_id},
+                           {"chapter": chapter,
+                            "scheme": scheme,
+                            "id": manuscript_id,
+                            "distances": dict(zip(manuscript_keys, np.asarray(distances[i]).tolist()))},
+                           upsert=True)
+                for i, manuscript_id in enumerate(manuscript_keys)
+            ])
+
+    def drop(self, chapter: str, scheme: str):
+        """Drop a stored distance matrix.
+        """
+        self.collection.delete_many({"chapter": self._store_chapter(chapter, scheme), "scheme": scheme})
+
+    def get(self,
+            chapter: str,
+            scheme: str,
+            manuscripts_list: list[str] = None):
+        """Return the manuscript keys and the distance matrix between them.
+        The matrix is built on the first read of a (chapter, scheme).
+        Concurrent first reads wait for a single build.
+        """
+        self._check_scheme(scheme)
+        chapter = self._store_chapter(chapter, scheme)
+        if not self.collection.find_one({"chapter": chapter, "scheme": scheme}, {"_id": 1}):
+            with self._lock:
+                build_lock = self._build_locks.setdefault((chapter, scheme), Lock())
+            try:
+                with build_lock:
+                    if not self.collection.find_one({"chapter": chapter, "scheme": scheme}, {"_id": 1}):
+                        self.build(chapter, scheme)
+            finally:
+                with self._lock:
+                    self._build_locks.pop((chapter, scheme), None)
+        query = {"chapter": chapter, "scheme": scheme}
+        if manuscripts_list is not None:
+            query["id"] = {"$in": manuscripts_list}
+        rows = {row["id"]: row["distances"]
+                for row in self.collection.find(query, {"_id": 0, "id": 1, "distances": 1})}
+        if manuscripts_list is not None:
+            manuscript_keys = [manuscript_id for manuscript_id in manuscripts_list if manuscript_id in rows]
+        else:
+            manuscript_keys = list(rows.keys())
+        distance_matrix = np.array([[rows[id1][id2] for id2 in manuscript_keys]
+                                    for id1 in manuscript_keys])
+        return manuscript_keys, distance_matrix.reshape(len(manuscript_keys), len(manuscript_keys))
+
+    def add_manuscript(self, document: dict[str, Any], data_version: int = None):
+        """Add the row and column of a new manuscript to every existing store.
+        `data_version` is the version of the manuscripts once the manuscript is written.
+        """
+        manuscript_id = document["id"]
+        with self._encodings_lock:
+            self._remove_encoded(manuscript_id, data_version)
+        for chapter, scheme in self.stores():
+            value = self._extract(document, chapter, scheme)
+            if value is None:
+                continue
+            with self._encodings_lock:
+                encoding = self._encoding(chapter, scheme, data_version)
+                encoding.add(manuscript_id, value)
+                distances = encoding.distances(manuscript_id)
+                row = {key: distances[i].item() for i, key in enumerate(encoding.manuscript_keys)}
+            self.collection.bulk_write([
+                UpdateOne({"chapter": chapter, "scheme": scheme, "id": other_id},
+                          {"$set": {f"distances.{manuscript_id}": distance}})
+                for other_id, distance in row.items() if other_id != manuscript_id
+            ] + [
+                UpdateOne({"chapter": chapter, "scheme": scheme, "id": manuscript_id},
+                          {"$set": {"distances": row}},
+                          upsert=True)
+            ])
+
+    def remove_manuscript(self, manuscript_id: str, data_version: int = None):
+        """Drop the row and column of a manuscript from every store.
+        `data_version` is the version of the manuscripts once the manuscript is deleted.
+        """
+        with self._encodings_lock:
+            self._remove_encoded(manuscript_id, data_version)
+        self.collection.delete_many({"id": manuscript_id})
+        self.collection.update_many({f"distances.{manuscript_id}": {"$exists": True}},
+                                    {"$unset": {f"distances.{manuscript_id}": ""}})
@@ -1,15 +1,16 @@
 """Download the data from the NTVMR and fill the Mongo Database with it.
 """
 
-import unicodedata
 from xml.etree import ElementTree
 import httpx
 import time
 from loguru import logger
 
 from manuscript_clusterer.api.database.db_manipulator import ManuscriptDB
-from manuscript_clusterer.engine.get_profiles import evaluate_manuscript_profile, evaluate_manuscript_readings
-from manuscript_clusterer.engine.utils import expand_nomina_sacra
+from manuscript_clusterer.api.models.settings import Settings
+from manuscript_clusterer.engine.get_profiles import PROFILE_RULESET, evaluate_manuscript
+from manuscript_clusterer.engine.minhash import compute_minhash_signatures
+from manuscript_clusterer.engine import normalize
 
 
 def parse_chapter(chap_str: str):
@@ -94,7 +95,8 @@ def parse_manuscript(response_str: str,
                                                     flat_text[chapter][verse] += subsubsubsubelem.text + " "
                                 flat_text[chapter][verse] += " "
     # Expand nomina sacra for all content
-    flat_text = {chapter: {verse: expand_nomina_sacra(flat_text[chapter][verse]) for verse in flat_text[chapter]} for chapter in flat_text}
+    flat_text = {chapter: dict(zip(flat_text[chapter], normalize.VERSE_NORMALIZER.normalize_many(flat_text[chapter].values())))
+                 for chapter in flat_text}
     return title, flat_text
 
 
@@ -102,7 +104,7 @@ def remove_control_characters(s: str):
     """
     Remove control characters from a string.
     """
-    return "".join(ch for ch in s if unicodedata.category(ch)[0] != "C")
+    return normalize.remove_control_characters(s)
 
 
 def get_manuscripts_id(uncials_range=(1, 326),
@@ -189,7 +191,7 @@ def get_manuscripts(tradition_name: str,
 if __name__ == "__main__":
     import pandas as pd
 
-    db = ManuscriptDB()
+    db = ManuscriptDB(**Settings().manuscript_db_options)
 
     # Setup wanted chapter of luke
     chapter = "10"
@@ -265,6 +267,7 @@ if __name__ == "__main__":
         for manuscript in manuscript_content:
             title, flat_text = parse_manuscript(manuscript, book_id="B03")
             if flat_text.get(chapter):
+                profile, readings, positions = evaluate_manuscript(flat_text, [int(chapter)], PROFILE_RULESET)
                 db.insert_document(
                     collection_name="manuscripts",
                     document={
@@ -272,8 +275,12 @@ if __name__ == "__main__":
                         "type": manuscript_type,
                         "name": title,
                         "content": flat_text,
-                        "profile": evaluate_manuscript_profile(flat_text, [int(chapter)]),
-                        "readings": evaluate_manuscript_readings(flat_text, [int(chapter)]),
+                        "profile": profile,
+                        "readings": readings,
+                        "reading_positions": positions,
+                        "rules_fingerprint": PROFILE_RULESET.fingerprint,
+                        "rule_fingerprints": PROFILE_RULESET.key_fingerprints([int(chapter)]),
+                        "minhash": compute_minhash_signatures(flat_text),
                         **info_data[title]
                     },
                 )
@@ -293,6 +300,7 @@ if __name__ == "__main__":
             elif id.startswith("3"):
                 manuscript_type = "miniscules"
             if flat_text.get(chapter):
+                profile, readings, positions = evaluate_manuscript(flat_text, [int(chapter)], PROFILE_RULESET)
                 db.insert_document(
                     collection_name="manuscripts",
                     document={
@@ -300,8 +308,12 @@ if __name__ == "__main__":
                         "type": manuscript_type,
                         "name": title,
                         "content": flat_text,
-                        "profile": evaluate_manuscript_profile(flat_text,  [int(chapter)]),
-                        "readings": evaluate_manuscript_readings(flat_text,  [int(chapter)]),
+                        "profile": profile,
+                        "readings": readings,
+                        "reading_positions": positions,
+                        "rules_fingerprint": PROFILE_RULESET.fingerprint,
+                        "rule_fingerprints": PROFILE_RULESET.key_fingerprints([int(chapter)]),
+                        "minhash": compute_minhash_signatures(flat_text),
                         **info_data[id]
                     },
                 )
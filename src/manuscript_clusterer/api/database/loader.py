@@ -0,0 +1,53 @@
+"""Reads of the manuscripts shared by the computations of a request.
+
+A request computing, say, a projection and two clusterings of the same
+manuscripts reads their content once: the computations are given the loader
+of the request, which forwards each read to the database the first time and
+returns the same documents afterwards. Concurrent computations wait for the
+read in progress. The documents are shared, and must not be modified.
+"""
+from threading import Lock
+
+
+class ManuscriptLoader:
+    """Memoized reads of the manuscripts, for the lifetime of a request.
+    """
+
+    def __init__(self, db):
+        """Initialize the loader on top of a `ManuscriptDB`.
+        """
+        self.db = db
+        self._results = {}
+        self._locks = {}
+        self._lock = Lock()
+
+    def _load(self, method: str, *args):
+        """Call a read method of the database once per arguments.
+        """
+        key = (method,) + tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args)
+        with self._lock:
+            key_lock = self._locks.setdefault(key, Lock())
+        with key_lock:
+            if key not in self._results:
+                self._results[key] = getattr(self.db, method)(*args)
+            return self._results[key]
+
+    def get_manuscripts_content(self, manuscripts_list: list[str], chapter: str = None):
+        """Given a list of manuscripts, return their content (only a chapter of it, if given).
+        """
+        return self._load("get_manuscripts_content", manuscripts_list, chapter)
+
+    def get_all_manuscripts_content(self, chapter: str = None):
+        """Return all manuscripts content (only a chapter of it, if given).
+        """
+        return self._load("get_all_manuscripts_content", chapter)
+
+    def get_all_manuscripts_readings(self):
+        """Return all manuscripts readings.
+        """
+        return self._load("get_all_manuscripts_readings")
+
+    def get_manuscripts_info(self, manuscripts_list: list[str]):
+        """Get the catalogue information of manuscripts, by id.
+        """
+        return self._load("get_manuscripts_info", manuscripts_list)
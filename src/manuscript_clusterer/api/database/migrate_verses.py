@@ -0,0 +1,40 @@
+"""Migrate the text of the manuscripts to the "verses" storage layout.
+
+The content of each manuscript document is split into the documents of its
+verses, written to the `verses` collection, then removed from the manuscript
+document. Profiles, readings and the other fields stay in place. Once all the
+manuscripts are migrated, the "verses" layout is recorded in the metadata, and
+the database is then only opened in this layout (`STORAGE_LAYOUT=verses`).
+An interrupted migration can be run again: the verses of a manuscript are
+replaced, and the manuscripts already migrated no longer have a content.
+"""
+from loguru import logger
+
+from manuscript_clusterer.api.database.db_manipulator import ManuscriptDB
+from manuscript_clusterer.api.database.verse_store import VerseStore
+from manuscript_clusterer.api.models.settings import Settings
+
+
+def migrate_to_verses(db: ManuscriptDB, drop_content: bool = True):
+    """Write the content of the manuscripts as verses, and drop it from their documents.
+    The "verses" layout is recorded once the content is dropped.
+    Returns the number of migrated manuscripts.
+    """
+    verse_store = db.verse_store or VerseStore(db.db)
+    verse_store.ensure_indexes()
+    collection = db.db["manuscripts"]
+    migrated = 0
+    for document in collection.find({"content": {"$exists": True}}, {"_id": 0, "id": 1, "content": 1}):
+        verse_store.write(document["id"], document["content"])
+        if drop_content:
+            collection.update_one({"id": document["id"]}, {"$unset": {"content": ""}})
+        migrated += 1
+    if drop_content:
+        db.record_storage_layout("verses")
+    logger.info(f"Migrated the content of {migrated} manuscripts to verses")
+    return migrated
+
+
+if __name__ == "__main__":
+    # The database is opened in the layout it is migrated from
+    migrate_to_verses(ManuscriptDB(**{**Settings().manuscript_db_options, "storage_layout": "document"}))
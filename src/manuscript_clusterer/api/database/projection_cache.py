@@ -0,0 +1,149 @@
+"""Cache of the projections of the manuscripts.
+
+A projection is identified by a hash of its source, the manuscripts projected,
+the version of the data, the projection method and its parameters. The
+embeddings are kept in an in-memory LRU tier, and persisted in the
+`projections` collection so that they survive restarts and are shared between
+the workers. The version of the data is incremented on every change of the
+manuscripts, so that a stale projection is never served.
+"""
+from collections import OrderedDict
+from datetime import datetime, timezone
+from hashlib import sha1
+import json
+from threading import Lock
+from pymongo import ASCENDING
+
+
+def projection_key(source: str,
+                   manuscripts_list: list[str] | None,
+                   data_version: int,
+                   method: str,
+                   params: dict[str, any]):
+    """Hash the inputs of a projection.
+    A missing list of manuscripts stands for all the manuscripts.
+    """
+    canonical = json.dumps({"source": source,
+                            "manuscripts": manuscripts_list,
+                            "data_version": data_version,
+                            "method": method,
+                            "params": params},
+                           sort_keys=True, separators=(",", ":"))
+    return sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class ProjectionCache:
+    """Two-tier (memory and Mongo) cache of the projections.
+    """
+
+    def __init__(self,
+                 db=None,
+                 collection_name: str = "projections",
+                 memory_size: int = 32):
+        """Initialize the cache, only in memory without a database.
+        """
+        self.collection = db[collection_name] if db is not None else None
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = Lock()
+        self._key_locks = {}
+
+    def ensure_indexes(self):
+        """Create the index of the versions of the data, by which the stale projections are dropped.
+        """
+        if self.collection is not None:
+            self.collection.create_index([("data_version", ASCENDING)])
+
+    @staticmethod
+    def _to_document(embedding: dict[str, dict[int, float]]):
+        """Convert an embedding to lists of ids and coordinates.
+        """
+        return {"ids": list(embedding),
+                "coordinates": [[float(value) for value in coordinates.values()]
+                                for coordinates in embedding.values()]}
+
+    @staticmethod
+    def _from_document(document: dict[str, any]):
+        """Convert lists of ids and coordinates back to an embedding.
+        """
+        return {manuscript_id: dict(enumerate(coordinates))
+                for manuscript_id, coordinates in zip(document["ids"], document["coordinates"])}
+
+    def _remember(self, key: str, embedding: dict[str, dict[int, float]]):
+        """Store an embedding in memory, evicting the least recently used.
+        """
+        with self._lock:
+            self._memory[key] = embedding
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        """Return the cached embedding of a projection, None if absent.
+        """
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                return embedding
+        if self.collection is None:
+            return None
+        document = self.collection.find_one({"_id": key}, {"_id": 0, "ids": 1, "coordinates": 1})
+        if document is None:
+            return None
+        embedding = self._from_document(document)
+        self._remember(key, embedding)
+        return embedding
+
+    def put(self,
+            key: str,
+            embedding: dict[str, dict[int, float]],
+            data_version: int = None):
+        """Store the embedding of a projection in both tiers.
+        """
+        self._remember(key, embedding)
+        if self.collection is not None:
+            self.collection.replace_one({"_id": key},
+                                        {**self._to_document(embedding),
+                                         "data_version": data_version,
+                                         "created": datetime.now(timezone.utc)},
+                                        upsert=True)
+
+    def get_or_compute(self,
+                       key: str,
+                       compute,
+                       data_version: int = None):
+        """Return the cached embedding of a projection, computing and storing it if absent.
+        Concurrent requests of the same projection wait for a single computation.
+        """
+        embedding = self.get(key)
+        if embedding is not None:
+            return embedding
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, Lock())
+        try:
+            with key_lock:
+                embedding = self.get(key)
+                if embedding is None:
+                    embedding = compute()
+                    self.put(key, embedding, data_version)
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+        return embedding
+
+    def drop_stale(self, data_version: int):
+        """Drop the projections of the versions of the data older than the given one.
+        """
+        with self._lock:
+            self._memory.clear()
+        if self.collection is not None:
+            self.collection.delete_many({"data_version": {"$lt": data_version}})
+
+    def clear(self):
+        """Empty both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+        if self.collection is not None:
+            self.collection.delete_many({})
@@ -0,0 +1,139 @@
+"""Fitted projection models, placing new manuscripts without a refit.
+
+A model is kept per projection of the whole corpus, along with the
+coordinates of the manuscripts and a hash of the data of each manuscript, both
+when the model was fitted and when the manuscript was placed. A new or changed
+manuscript is placed onto the fitted embedding with the `transform` of the
+model, so that the other manuscripts do not move. The model is refitted on
+request, or when the share of manuscripts placed or removed since the fit
+exceeds the drift threshold.
+
+The fitted backends are stored in files of the model directory (a temporary
+directory if not given), written and read by the engine only: the records
+kept by the store hold the name of their file. The records are persisted with
+joblib in the model directory, when given.
+"""
+from hashlib import sha1
+import json
+import os
+from pathlib import Path
+import tempfile
+from threading import Lock
+from uuid import uuid4
+import joblib
+from loguru import logger
+
+
+def hash_rows(data: dict[str, any]):
+    """Hash the data of each manuscript.
+    """
+    return {manuscript_id: sha1(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+            for manuscript_id, value in data.items()}
+
+
+class ProjectionModelStore:
+    """Fitted projection models, in memory and optionally on disk.
+    """
+
+    def __init__(self,
+                 model_dir: str = None,
+                 drift_threshold: float = 0.2):
+        """Initialize the store.
+        `drift_threshold` is the share of the fitted manuscripts that can be placed or removed before a refit.
+        """
+        self.model_dir = Path(model_dir) if model_dir is not None else None
+        self.drift_threshold = drift_threshold
+        self._models = {}
+        self._lock = Lock()
+        if self.model_dir is not None:
+            self.model_dir.mkdir(parents=True, exist_ok=True)
+            self._temporary_dir = None
+            self.files_dir = self.model_dir
+        else:
+            self._temporary_dir = tempfile.TemporaryDirectory(prefix="projection-models-")
+            self.files_dir = Path(self._temporary_dir.name)
+
+    def new_model_file(self, name: str):
+        """Name of the file of a new fit of a model.
+        """
+        return f"{name}-{uuid4().hex}.model.joblib"
+
+    def model_path(self, model_file: str):
+        """Path of the file of a fitted backend.
+        """
+        return str(self.files_dir / model_file)
+
+    def _drop_model_file(self, record: dict[str, any] | None, kept: dict[str, any] = None):
+        """Delete the file of the fitted backend of a record, unless kept by another record.
+        """
+        model_file = (record or {}).get("model_file")
+        if model_file is not None and model_file != (kept or {}).get("model_file"):
+            Path(self.model_path(model_file)).unlink(missing_ok=True)
+
+    def _path(self, name: str):
+        """Path of the file of a model.
+        """
+        return self.model_dir / f"{name}.joblib"
+
+    def load(self, name: str):
+        """Return the record of a model, None if absent.
+        A model updated on disk (by another worker) is read again.
+        """
+        with self._lock:
+            mtime, record = self._models.get(name, (None, None))
+            if self.model_dir is None or not self._path(name).exists():
+                return record
+            disk_mtime = self._path(name).stat().st_mtime_ns
+            if disk_mtime != mtime:
+                record = joblib.load(self._path(name))
+                self._models[name] = (disk_mtime, record)
+            return record
+
+    def save(self, name: str, record: dict[str, any]):
+        """Store the record of a model, replacing the file atomically.
+        The file of the previous fitted backend is deleted.
+        """
+        with self._lock:
+            _, previous = self._models.get(name, (None, None))
+            if previous is None and self.model_dir is not None and self._path(name).exists():
+                previous = joblib.load(self._path(name))
+            mtime = None
+            if self.model_dir is not None:
+                temporary = self._path(name).with_suffix(".tmp")
+                joblib.dump(record, temporary)
+                os.replace(temporary, self._path(name))
+                mtime = self._path(name).stat().st_mtime_ns
+            self._models[name] = (mtime, record)
+            self._drop_model_file(previous, kept=record)
+
+    def drop(self, name: str):
+        """Drop a model.
+        """
+        with self._lock:
+            _, record = self._models.pop(name, (None, None))
+            if record is None and self.model_dir is not None and self._path(name).exists():
+                record = joblib.load(self._path(name))
+            self._drop_model_file(record)
+            if self.model_dir is not None:
+                self._path(name).unlink(missing_ok=True)
+
+    def plan(self,
+             record: dict[str, any] | None,
+             hashes: dict[str, str],
+             features: list[str] = None):
+        """Compare a model with the current data of the manuscripts.
+        Returns the manuscripts to place and to drop, or None if the model must be refitted.
+        """
+        if record is None or "model_file" not in record or record["features"] != features:
+            return None
+        fit_hashes = record["fit_hashes"]
+        drifted = sum(fit_hashes.get(manuscript_id) != row_hash for manuscript_id, row_hash in hashes.items()) + \
+            sum(manuscript_id not in hashes for manuscript_id in fit_hashes)
+        drift = drifted / max(len(fit_hashes), 1)
+        if drift > self.drift_threshold:
+            logger.info(f"Drift of {drift:.0%} since the fit of the projection, refitting")
+            return None
+        to_place = [manuscript_id for manuscript_id, row_hash in hashes.items()
+                    if record["hashes"].get(manuscript_id) != row_hash]
+        to_drop = [manuscript_id for manuscript_id in record["hashes"] if manuscript_id not in hashes]
+        return to_place, to_drop
@@ -0,0 +1,115 @@
+"""Re-evaluate the stored profiles after an edit of the profile rules.
+
+Each manuscript records the fingerprint of the rule behind each of its
+profile keys (`rule_fingerprints`). The job compares them with the current
+rules, re-evaluates only the added and changed keys on the stored content,
+drops the removed keys, and writes the results back with bulk updates.
+"""
+from loguru import logger
+from pymongo import UpdateOne
+
+from manuscript_clusterer.api.database.db_manipulator import ManuscriptDB
+from manuscript_clusterer.api.database.distance_store import WHOLE_PROFILE
+from manuscript_clusterer.api.models.settings import Settings
+from manuscript_clusterer.engine.get_profiles import PROFILE_RULESET, evaluate_manuscript
+from manuscript_clusterer.engine.rules import RuleSet
+
+
+def diff_rule_fingerprints(recorded: dict[str, str], expected: dict[str, str]):
+    """Compare the fingerprints recorded on a manuscript with the current ones.
+    Returns the added, changed and removed profile keys.
+    """
+    added = {key for key in expected if key not in recorded}
+    changed = {key for key in expected if key in recorded and recorded[key] != expected[key]}
+    removed = {key for key in recorded if key not in expected}
+    return added, changed, removed
+
+
+def _chapters(profile_keys):
+    """Extract the chapters of profile keys.
+    """
+    return sorted({int(key.split(":")[0]) for key in profile_keys if key.split(":")[0].isdigit()})
+
+
+def reprofile_manuscript(document: dict[str, any], ruleset: RuleSet = PROFILE_RULESET):
+    """Compute the update bringing the profile of a manuscript up to date with the rules.
+    Returns the update, None if the profile is up to date, and the added, changed and removed keys.
+
+    The chapters evaluated are the chapters of the keys of the stored profile.
+    A manuscript without recorded fingerprints has all of its keys re-evaluated.
+    """
+    recorded = document.get("rule_fingerprints", {})
+    chapters = _chapters(recorded or document.get("profile", {}))
+    expected = ruleset.key_fingerprints(chapters)
+    if recorded:
+        added, changed, removed = diff_rule_fingerprints(recorded, expected)
+    else:
+        # Without fingerprints, the stored values cannot be trusted
+        added, changed, removed = set(), set(expected), set(document.get("profile", {})) - set(expected)
+    update = {}
+    if added or changed:
+        subset = ruleset.subset(added | changed)
+        profile, readings, positions = evaluate_manuscript(document.get("content", {}), chapters, subset)
+        update["$set"] = {
+            **{f"profile.{key}": value for key, value in profile.items()},
+            **{f"readings.{key}": value for key, value in readings.items()},
+            **{f"reading_positions.{key}": value for key, value in positions.items()},
+            **{f"rule_fingerprints.{key}": expected[key] for key in profile}
+        }
+    if removed:
+        kept_readings = {rule.readings_key for rule in ruleset.for_chapters(chapters)}
+        removed_readings = {":".join([key.split(":")[0], key.split(":")[-1]]) for key in removed} - kept_readings
+        update["$unset"] = {
+            **{f"profile.{key}": "" for key in removed},
+            **{f"reading_positions.{key}": "" for key in removed},
+            **{f"rule_fingerprints.{key}": "" for key in removed},
+            **{f"readings.{key}": "" for key in removed_readings}
+        }
+    if update or document.get("rules_fingerprint") != ruleset.fingerprint:
+        update.setdefault("$set", {})["rules_fingerprint"] = ruleset.fingerprint
+    return update or None, added, changed, removed
+
+
+def reprofile_manuscripts(db: ManuscriptDB,
+                          ruleset: RuleSet = PROFILE_RULESET,
+                          batch_size: int = 500):
+    """Bring the stored profiles of every manuscript up to date with the rules.
+    The stale Wisse distances, the profile matrix and the cached projections are dropped afterwards.
+    Returns the number of updated manuscripts and of added, changed and removed keys.
+    """
+    collection = db.db["manuscripts"]
+    summary = {"manuscripts": 0, "added": 0, "changed": 0, "removed": 0}
+    stale_chapters = set()
+    requests = []
+    for document in collection.find({"rules_fingerprint": {"$ne": ruleset.fingerprint}},
+                                    {"_id": 0, "id": 1, "content": 1, "profile": 1,
+                                     "rule_fingerprints": 1, "rules_fingerprint": 1}):
+        if db.verse_store is not None:
+            document["content"] = db.verse_store.read([document["id"]]).get(document["id"], {})
+        update, added, changed, removed = reprofile_manuscript(document, ruleset)
+        if update is None:
+            continue
+        requests.append(UpdateOne({"id": document["id"]}, update))
+        if added or changed or removed:
+            summary["manuscripts"] += 1
+            stale_chapters.update(key.split(":")[0] for key in added | changed | removed)
+        summary["added"] += len(added)
+        summary["changed"] += len(changed)
+        summary["removed"] += len(removed)
+        if len(requests) >= batch_size:
+            collection.bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    if stale_chapters:
+        db.distance_store.drop(WHOLE_PROFILE, "wisse")
+    if summary["manuscripts"]:
+        db.bump_data_version()
+    db.refresh_profile_matrix()
+    logger.info(f"Re-profiled {summary['manuscripts']} manuscripts: {summary['added']} added, "
+                f"{summary['changed']} changed and {summary['removed']} removed keys")
+    return summary
+
+
+if __name__ == "__main__":
+    reprofile_manuscripts(ManuscriptDB(**Settings().manuscript_db_options))
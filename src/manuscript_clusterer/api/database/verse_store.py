@@ -0,0 +1,98 @@
+"""Verse-granular storage of the text of the manuscripts.
+
+In the "verses" storage layout, the text of the manuscripts is kept out of
+their documents, in the `verses` collection holding one document per
+(manuscript, chapter, verse): `{"id", "chapter", "verse", "position", "text"}`.
+The position is the rank of the verse in the content of the manuscript, so
+that the chapters and verses are read back in their order. Reading a chapter
+or a verse of some manuscripts is an indexed scan of these verses only, and
+the documents of the manuscripts no longer grow with their text.
+
+The reads return the content in the nested shape of the "document" layout,
+`{chapter: {verse: text}}`.
+"""
+from pymongo import ASCENDING
+
+
+# Layouts of the text of the manuscripts: within their documents, or one document per verse
+STORAGE_LAYOUTS = ("document", "verses")
+
+VERSE_PROJECTION = {"_id": 0, "id": 1, "chapter": 1, "verse": 1, "position": 1, "text": 1}
+
+
+def verse_documents(manuscript_id: str, content: dict[str, dict[str, str]]):
+    """Split the content of a manuscript into the documents of its verses.
+    """
+    return [{"id": manuscript_id, "chapter": chapter, "verse": verse, "position": position, "text": text}
+            for position, (chapter, verse, text) in enumerate((chapter, verse, text)
+                                                              for chapter, verses in content.items()
+                                                              for verse, text in verses.items())]
+
+
+def verse_query(manuscripts_list: list[str] = None,
+                chapter: str = None,
+                verse: str = None):
+    """Query of the verses of some manuscripts (all if not given), on a chapter or a verse.
+    """
+    if verse is not None and chapter is None:
+        raise ValueError("A verse is read within a chapter")
+    query = {}
+    if manuscripts_list is not None:
+        query["id"] = manuscripts_list[0] if len(manuscripts_list) == 1 else {"$in": list(manuscripts_list)}
+    if chapter is not None:
+        query["chapter"] = chapter
+    if verse is not None:
+        query["verse"] = verse
+    return query
+
+
+def assemble_content(documents: list[dict[str, any]]):
+    """Assemble the documents of verses into the content of each manuscript, in the order of the verses.
+    """
+    contents = {}
+    for document in sorted(documents, key=lambda document: document["position"]):
+        contents.setdefault(document["id"], {}).setdefault(document["chapter"], {})[document["verse"]] = \
+            document["text"]
+    return contents
+
+
+class VerseStore:
+    """Text of the manuscripts, one document per verse.
+    """
+
+    def __init__(self,
+                 db,
+                 collection_name: str = "verses"):
+        """Initialize the store on top of a Mongo database.
+        """
+        self.collection = db[collection_name]
+
+    def ensure_indexes(self):
+        """Create the indexes of the verses: by manuscript (unique), and by chapter.
+        """
+        self.collection.create_index([("id", ASCENDING), ("chapter", ASCENDING), ("verse", ASCENDING)],
+                                     unique=True)
+        self.collection.create_index([("chapter", ASCENDING), ("id", ASCENDING)])
+
+    def write(self, manuscript_id: str, content: dict[str, dict[str, str]]):
+        """Store the content of a manuscript, replacing its previous verses.
+        """
+        self.delete(manuscript_id)
+        documents = verse_documents(manuscript_id, content)
+        if documents:
+            self.collection.insert_many(documents, ordered=False)
+
+    def delete(self, manuscript_id: str):
+        """Delete the verses of a manuscript.
+        """
+        self.collection.delete_many({"id": manuscript_id})
+
+    def read(self,
+             manuscripts_list: list[str] = None,
+             chapter: str = None,
+             verse: str = None):
+        """Return the content of some manuscripts (all if not given), or only a chapter or verse of it, by id.
+        The manuscripts without this chapter or verse are absent.
+        """
+        return assemble_content(self.collection.find(verse_query(manuscripts_list, chapter, verse),
+                                                     VERSE_PROJECTION))
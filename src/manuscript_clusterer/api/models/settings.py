@@ -1,6 +1,7 @@
 """Settings file for the API.
 """
 
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
@@ -9,4 +10,55 @@ class Settings(BaseSettings):
     """
     db_host: str = "localhost"
     db_port: int = 27017
-    db_name: str = "manuscriptsDB"
\ No newline at end of file
+    db_name: str = "manuscriptsDB"
+    # Pool of connections of each Mongo client
+    db_max_pool_size: int = 100
+    db_min_pool_size: int = 0
+    db_max_idle_time_ms: Optional[int] = None
+    db_server_selection_timeout_ms: int = 30000
+    # Text of the manuscripts within their documents ("document") or one document per verse ("verses")
+    storage_layout: str = "document"
+    # Worker threads running the computations of the async endpoints
+    compute_threads: int = 4
+    # Worker processes running the engine computations (inline without workers), and their timeout in seconds
+    engine_workers: int = 0
+    engine_timeout: Optional[float] = None
+    engine_start_method: str = "spawn"
+    # Distance matrices computation
+    distance_workers: int = 1
+    distance_tile_size: int = 256
+    distance_dir: Optional[str] = None
+    # Number of projections kept in memory (all are persisted in the database)
+    projection_cache_size: int = 32
+    # Fitted projection models, persisted when a directory is given, and refitted past the drift
+    projection_model_dir: Optional[str] = None
+    projection_drift: float = 0.2
+    # Compile the UMAP projections in the background once the API is started
+    warmup_projections: bool = False
+
+    @property
+    def db_client_options(self):
+        """Options of the pool of connections of the Mongo clients.
+        """
+        options = {"maxPoolSize": self.db_max_pool_size,
+                   "minPoolSize": self.db_min_pool_size,
+                   "serverSelectionTimeoutMS": self.db_server_selection_timeout_ms}
+        if self.db_max_idle_time_ms is not None:
+            options["maxIdleTimeMS"] = self.db_max_idle_time_ms
+        return options
+
+    @property
+    def manuscript_db_options(self):
+        """Options of the database of the manuscripts, shared by the API and the scripts.
+        """
+        return {"host": self.db_host,
+                "port": self.db_port,
+                "db_name": self.db_name,
+                "distance_workers": self.distance_workers,
+                "distance_tile_size": self.distance_tile_size,
+                "distance_dir": self.distance_dir,
+                "projection_cache_size": self.projection_cache_size,
+                "projection_model_dir": self.projection_model_dir,
+                "projection_drift": self.projection_drift,
+                "client_options": self.db_client_options,
+                "storage_layout": self.storage_layout}
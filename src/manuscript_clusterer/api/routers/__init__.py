@@ -1,7 +1,10 @@
 """Initializes the database for use across the different endpoints.
+
+The connection is opened at the startup of the application (see the lifespan
+of `app`), or on first use otherwise, rather than when importing the routers.
 """
+from threading import Lock
 
-from manuscript_clusterer.api.database.db_manipulator import ManuscriptDB
 from manuscript_clusterer.api.models.settings import Settings
 
 STUDIED_CHAPTER = "10"
@@ -10,6 +13,52 @@ STUDIED_CHAPTER = "10"
 
 settings = Settings()
 
-db_manipulator = ManuscriptDB(host=settings.db_host,
-                              port=settings.db_port,
-                              db_name=settings.db_name)
\ No newline at end of file
+
+class DatabaseProxy:
+    """Stand-in for the asynchronous database of the endpoints, forwarding to the connected database.
+    """
+
+    def __init__(self):
+        self._db = None
+        self._lock = Lock()
+
+    def connect(self):
+        """Open the connections with the database, if not already opened,
+        create its indexes and start the workers of the engine.
+        The heavy modules are only imported by the first computation.
+        """
+        with self._lock:
+            if self._db is None:
+                from manuscript_clusterer.api.database.async_db_manipulator import AsyncManuscriptDB
+                from manuscript_clusterer.api.database.db_manipulator import ManuscriptDB
+                from manuscript_clusterer.engine.executor import EngineExecutor
+                engine = EngineExecutor(workers=settings.engine_workers,
+                                        timeout=settings.engine_timeout,
+                                        start_method=settings.engine_start_method,
+                                        warm_up=settings.warmup_projections)
+                engine.start()
+                manuscript_db = ManuscriptDB(**settings.manuscript_db_options, engine=engine)
+                manuscript_db.ensure_indexes()
+                self._db = AsyncManuscriptDB(manuscript_db,
+                                             host=settings.db_host,
+                                             port=settings.db_port,
+                                             db_name=settings.db_name,
+                                             client_options=settings.db_client_options,
+                                             compute_threads=settings.compute_threads)
+            return self._db
+
+    async def close(self):
+        """Close the connections with the database.
+        """
+        with self._lock:
+            db, self._db = self._db, None
+        if db is not None:
+            await db.close()
+            db.manuscript_db.client.close()
+            db.manuscript_db.engine.shutdown()
+
+    def __getattr__(self, name: str):
+        return getattr(self._db if self._db is not None else self.connect(), name)
+
+
+db_manipulator = DatabaseProxy()
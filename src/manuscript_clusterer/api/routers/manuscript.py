@@ -1,6 +1,7 @@
 """Router for the API endpoints to get manuscript related data.
 """
-from fastapi import APIRouter, HTTPException
+from typing import Annotated
+from fastapi import APIRouter, HTTPException, Query
 from manuscript_clusterer.api.routers import db_manipulator
 from . import STUDIED_CHAPTER
 
@@ -11,7 +12,7 @@ router = APIRouter(prefix="/manuscript", tags=["manuscript"])
 async def get_manuscripts():
     """Get all manuscripts from the database.
     """
-    manuscripts = db_manipulator.get_manuscripts()
+    manuscripts = await db_manipulator.get_manuscripts()
     if not manuscripts:
         raise HTTPException(status_code=404, detail="No manuscripts found")
     return manuscripts
@@ -21,7 +22,7 @@ async def get_manuscripts():
 async def get_manuscript(manuscript_id: str):
     """Get a manuscript from the database.
     """
-    manuscript = db_manipulator.get_manuscript(manuscript_id=manuscript_id)
+    manuscript = await db_manipulator.get_manuscript(manuscript_id=manuscript_id)
     if not manuscript:
         raise HTTPException(status_code=404, detail="Manuscript not found")
     return manuscript
@@ -31,7 +32,7 @@ async def get_manuscript(manuscript_id: str):
 async def get_manuscript_content(manuscript_id: str):
     """Get the content of a manuscript from the database.
     """
-    manuscript_content = db_manipulator.get_manuscript_content(
+    manuscript_content = await db_manipulator.get_manuscript_content(
         manuscript_id=manuscript_id)
     if not manuscript_content:
         raise HTTPException(
@@ -42,8 +43,8 @@ async def get_manuscript_content(manuscript_id: str):
 async def get_manuscript_verse(manuscript_id: str, verse: str, chapter: str = STUDIED_CHAPTER):
     """Get the content of a verse of a manuscript from the database.
     """
-    manuscript_content = db_manipulator.get_manuscript_content(
-        manuscript_id=manuscript_id)
+    manuscript_content = await db_manipulator.get_manuscript_content(
+        manuscript_id=manuscript_id, chapter=chapter, verse=verse)
     if not manuscript_content:
         raise HTTPException(
             status_code=404, detail="Manuscript content not found")
@@ -54,7 +55,7 @@ async def get_manuscript_verse(manuscript_id: str, verse: str, chapter: str = ST
 async def get_manuscript_profile(manuscript_id: str):
     """Get the profile of a manuscript from the database.
     """
-    manuscript_profile = db_manipulator.get_manuscript_profile(
+    manuscript_profile = await db_manipulator.get_manuscript_profile(
         manuscript_id=manuscript_id)
     if not manuscript_profile:
         raise HTTPException(
@@ -66,7 +67,7 @@ async def get_manuscript_profile(manuscript_id: str):
 async def get_manuscript_info(manuscript_id: str):
     """Get the profile and content of a manuscript from the database.
     """
-    manuscript_info = db_manipulator.get_manuscript_info(
+    manuscript_info = await db_manipulator.get_manuscript_info(
         manuscript_id=manuscript_id)
     if not manuscript_info:
         raise HTTPException(
@@ -79,9 +80,28 @@ async def get_manuscript_verses(manuscript_id: str,
                                 chapter: str = STUDIED_CHAPTER):
     """Get the list of available verses of a manuscript from the database.
     """
-    manuscript_verses = db_manipulator.get_manuscript_content(
-        manuscript_id=manuscript_id)["content"][chapter]
+    manuscript_verses = (await db_manipulator.get_manuscript_content(
+        manuscript_id=manuscript_id, chapter=chapter))["content"][chapter]
     if not manuscript_verses:
         raise HTTPException(
             status_code=404, detail="Manuscript verses not found")
-    return list(manuscript_verses.keys())
\ No newline at end of file
+    return list(manuscript_verses.keys())
+
+
+@router.get("/{manuscript_id}/neighbors")
+async def get_manuscript_neighbors(manuscript_id: str,
+                                   k: Annotated[int, Query(ge=1)] = 20,
+                                   chapter: str = STUDIED_CHAPTER,
+                                   rerank: bool = False):
+    """Get the manuscripts closest to a manuscript on a chapter.
+    The candidates come from the MinHash LSH index, and are optionally re-ranked
+    by their exact textual distance.
+    """
+    neighbors = await db_manipulator.get_manuscript_neighbors(manuscript_id=manuscript_id,
+                                                        chapter=chapter,
+                                                        k=k,
+                                                        rerank=rerank)
+    if neighbors is None:
+        raise HTTPException(
+            status_code=404, detail="Manuscript content not found")
+    return neighbors
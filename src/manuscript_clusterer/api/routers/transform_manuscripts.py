@@ -1,46 +1,83 @@
 """Router to get the transformed manuscripts.
 """
-from typing import Annotated
+from typing import Annotated, Literal
 
 from fastapi import APIRouter, HTTPException, Query
 
 
+from manuscript_clusterer import engine
+from manuscript_clusterer.engine.distances import MISSING_POLICIES
+from manuscript_clusterer.engine.knn import CONTENT_MODES
+from manuscript_clusterer.engine.project import PROJECTION_BACKENDS, check_projection
+from manuscript_clusterer.api.database.distance_store import DISTANCE_SCHEMES
 from manuscript_clusterer.api.routers import db_manipulator
-from manuscript_clusterer.engine import profile_readings
 from . import STUDIED_CHAPTER
 
 
 router = APIRouter(prefix="/manuscripts/transform",
                    tags=["manuscripts_transform"])
 
+ProjectionMethod = Literal[tuple(PROJECTION_BACKENDS)]
+ContentMode = Literal[CONTENT_MODES]
+DistanceScheme = Literal[DISTANCE_SCHEMES]
+MissingPolicy = Literal[MISSING_POLICIES]
+
+
+def format_clusters(clustered):
+    """Format clusters returned with their (score, (low, high)) silhouette score.
+    """
+    clusters, score = clustered
+    silhouette = None
+    if score is not None:
+        silhouette = {"score": score[0], "interval": list(score[1])}
+    return {"clusters": clusters, "silhouette": silhouette}
+
 
 @router.get("/projections/")
 async def get_projection_manuscripts(manuscript_lists: Annotated[list[str] | None, Query()] = None,
                                      all_manuscripts: Annotated[bool, Query(
                                      )] = False,
-                                     experimental: Annotated[bool, Query()] = False):
-    """Get the coordinates of the manuscripts using MCA applied to their profile.
+                                     experimental: Annotated[bool, Query()] = False,
+                                     mode: Annotated[ContentMode, Query()] = "dense",
+                                     method: Annotated[ProjectionMethod, Query()] = "umap",
+                                     refit: Annotated[bool, Query()] = False):
+    """Get the coordinates of the manuscripts projected from their profile (or content, if experimental).
+    The mode ("dense" or "knn") selects the pipeline of the content projection and clustering.
+    The method selects the projection: "umap" for both, the fast linear "mca" and "pca" for
+    the profiles, and "mds" for the content.
+    New manuscripts are placed onto the fitted projection, unless a refit is requested.
+    The projection and the clusterings read the manuscripts once, through the loader of the request.
+    A method unavailable for the source or the mode is rejected (422).
     """
     try:
-        if experimental:
-            _, manuscripts_projected = db_manipulator.get_content_projected(manuscripts_list=manuscript_lists,
-                                                                            all_manuscripts=all_manuscripts,
-                                                                            chapter=STUDIED_CHAPTER)
-        else:
-            _, manuscripts_projected = db_manipulator.get_manuscripts_projected(manuscripts_list=manuscript_lists,
-                                                                                all_manuscripts=all_manuscripts)
-        profiles_clustered = db_manipulator.get_profile_clustered(manuscripts_list=manuscript_lists,
+        check_projection(method, "content" if experimental else "profiles", mode=mode)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    try:
+        loader = db_manipulator.loader()
+        manuscripts_projected = await db_manipulator.get_projection("content" if experimental else "profiles",
+                                                              manuscripts_list=manuscript_lists,
+                                                              all_manuscripts=all_manuscripts,
+                                                              chapter=STUDIED_CHAPTER,
+                                                              mode=mode,
+                                                              method=method,
+                                                              refit=refit,
+                                                              loader=loader)
+        profiles_clustered = await db_manipulator.get_profile_clustered(manuscripts_list=manuscript_lists,
                                                                     all_manuscripts=all_manuscripts)
-        content_clustered = db_manipulator.get_content_clustered(manuscripts_list=manuscript_lists,
+        content_clustered = await db_manipulator.get_content_clustered(manuscripts_list=manuscript_lists,
                                                                     all_manuscripts=all_manuscripts,
-                                                                    chapter=STUDIED_CHAPTER)
+                                                                    chapter=STUDIED_CHAPTER,
+                                                                    mode=mode,
+                                                                    loader=loader)
+        manuscripts_info = await db_manipulator.get_manuscripts_info(list(manuscripts_projected))
         final_data = {}
         for manuscript_id in manuscripts_projected.keys():
             final_data[manuscript_id] = {
                 'coordinates': manuscripts_projected[manuscript_id],
                 'clustered_profile': profiles_clustered.get(manuscript_id, None),
                 'clustered_content': content_clustered.get(manuscript_id, None),
-                **db_manipulator.get_manuscript_info(manuscript_id)[0]
+                **manuscripts_info[manuscript_id]
             }
         final_values = list(final_data.values())
         return {
@@ -68,13 +105,12 @@ async def get_manuscripts_profiles(manuscript_1: Annotated[str, Query()],
     """Get the profile of two manuscripts.
     """
     try:
-        profiles = db_manipulator.get_manuscripts_profiles(manuscripts_list=[manuscript_1, manuscript_2])
-        profiles_dict = {profile["id"]: profile["profile"] for profile in profiles}
+        profile_matrix = await db_manipulator.get_profile_matrix(manuscripts_list=[manuscript_1, manuscript_2])
         if format_heatmap:
             return {
-                "z": [list(manuscript_profile.values()) for manuscript_profile in profiles_dict.values()],
-                "x": list(profiles_dict[manuscript_1].keys()),
-                "y": list(profiles_dict.keys())
+                "z": profile_matrix.values.tolist(),
+                "x": profile_matrix.reading_keys,
+                "y": profile_matrix.manuscript_ids
             }
     except ValueError as e:
         raise HTTPException(status_code=500,
@@ -83,12 +119,16 @@ async def get_manuscripts_profiles(manuscript_1: Annotated[str, Query()],
 
 @router.get("/readings/")
 async def get_manuscripts_clusters_readings(manuscript_lists: Annotated[list[str] | None, Query()] = None,
-                                            all_manuscripts: Annotated[bool, Query()] = False):
+                                            all_manuscripts: Annotated[bool, Query()] = False,
+                                            with_score: Annotated[bool, Query()] = False):
     """Cluster the profiles of the manuscripts.
+    With the score, the clusters are returned with the silhouette score of the clustering.
     """
     try:
-        return db_manipulator.get_readings_clustered(manuscripts_list=manuscript_lists,
-                                                     all_manuscripts=all_manuscripts)
+        clusters = await db_manipulator.get_readings_clustered(manuscripts_list=manuscript_lists,
+                                                               all_manuscripts=all_manuscripts,
+                                                               return_score=with_score)
+        return format_clusters(clusters) if with_score else clusters
     except ValueError as e:
         raise HTTPException(status_code=500,
                             detail="Unable to cluster the readings") from e
@@ -98,13 +138,20 @@ async def get_manuscripts_clusters_readings(manuscript_lists: Annotated[list[str
 async def get_manuscripts_clusters_content(manuscript_lists: Annotated[list[str] | None, Query()] = None,
                                            all_manuscripts: Annotated[bool, Query(
                                            )] = False,
-                                           chapter: Annotated[str, Query()] = STUDIED_CHAPTER):
+                                           chapter: Annotated[str, Query()] = STUDIED_CHAPTER,
+                                           mode: Annotated[ContentMode, Query()] = "dense",
+                                           with_score: Annotated[bool, Query()] = False):
     """Cluster the content of the manuscripts.
+    The mode ("dense" or "knn") selects the full distance matrix or the sparse kNN graph.
+    With the score, the clusters are returned with the silhouette score of the clustering.
     """
     try:
-        return db_manipulator.get_content_clustered(manuscripts_list=manuscript_lists,
-                                                    all_manuscripts=all_manuscripts,
-                                                    chapter=chapter)
+        clusters = await db_manipulator.get_content_clustered(manuscripts_list=manuscript_lists,
+                                                              all_manuscripts=all_manuscripts,
+                                                              chapter=chapter,
+                                                              mode=mode,
+                                                              return_score=with_score)
+        return format_clusters(clusters) if with_score else clusters
     except ValueError as e:
         raise HTTPException(status_code=500,
                             detail="Unable to cluster the content") from e
@@ -116,26 +163,30 @@ async def get_manuscripts_distances(manuscript_lists: Annotated[list[str] | None
                                     )] = False,
                                     chapter: Annotated[str,
                                                        Query()] = STUDIED_CHAPTER,
-                                    distance_scheme: Annotated[str, Query(
+                                    distance_scheme: Annotated[DistanceScheme, Query(
                                     )] = "wisse",
-                                    format_heatmap: Annotated[bool, Query()] = False):
+                                    format_heatmap: Annotated[bool, Query()] = False,
+                                    missing: Annotated[MissingPolicy, Query()] = "strict"):
     """Get the distances between the manuscripts using different schemes.
+    The missing policy ("strict", "ignore" or "mismatch") applies to the Wisse scheme.
     """
     try:
         if distance_scheme == "wisse":
-            distances = db_manipulator.get_profile_distance(manuscripts_list=manuscript_lists,
-                                                            all_manuscripts=all_manuscripts,
-                                                            chapter=chapter)
+            manuscript_keys, distances = await db_manipulator.get_profile_distance(manuscripts_list=manuscript_lists,
+                                                                             all_manuscripts=all_manuscripts,
+                                                                             chapter=chapter,
+                                                                             missing=missing)
             if format_heatmap:
                 return {
-                    "z": [list(distance_value.values()) for distance_value in distances.values()],
-                    "x": list(distances.keys()),
-                    "y": list(distances.keys())
+                    "z": distances.tolist(),
+                    "x": list(manuscript_keys),
+                    "y": list(manuscript_keys)
                 }
             else:
-                return distances
+                return {manuscript_id: dict(zip(manuscript_keys, row))
+                        for manuscript_id, row in zip(manuscript_keys, distances.tolist())}
         elif distance_scheme == "all":
-            manuscript_keys, distances = db_manipulator.get_content_distances(manuscripts_list=manuscript_lists,
+            manuscript_keys, distances = await db_manipulator.get_content_distances(manuscripts_list=manuscript_lists,
                                                              all_manuscripts=all_manuscripts,
                                                              chapter=chapter)
             if format_heatmap:
@@ -165,7 +216,7 @@ async def get_manuscripts_verse_distances(manuscript_1: Annotated[str, Query()],
     """Get the distances between the manuscripts using different schemes.
     """
     try:
-        verses, distances = db_manipulator.get_verse_distance_content(manuscript_1=manuscript_1,
+        verses, distances = await db_manipulator.get_verse_distance_content(manuscript_1=manuscript_1,
                                                        manuscript_2=manuscript_2,
                                                        chapter=chapter)
         if format_heatmap:
@@ -180,16 +231,62 @@ async def get_manuscripts_verse_distances(manuscript_1: Annotated[str, Query()],
     except ValueError as e:
         raise HTTPException(status_code=500,
                             detail="Unable to compute the distances") from e
-    
+
+
+@router.get("/versedistances/batch/")
+async def get_manuscripts_group_verse_distances(manuscript_lists: Annotated[list[str], Query()],
+                                                chapter: Annotated[str, Query(
+                                                )] = STUDIED_CHAPTER,
+                                                reference: Annotated[str | None, Query()] = None,
+                                                format_heatmap: Annotated[bool, Query()] = False):
+    """Get the distances between the verses of a group of manuscripts in a single request.
+    With a reference, the distances of each manuscript to the reference are returned,
+    otherwise the distances between every pair of manuscripts.
+    """
+    try:
+        manuscript_keys, verses, distances = await db_manipulator.get_verse_distances_content(
+            manuscripts_list=manuscript_lists,
+            chapter=chapter,
+            reference=reference)
+        if reference is not None:
+            if format_heatmap:
+                return {
+                    "z": distances.T.tolist(),
+                    "x": manuscript_keys,
+                    "y": verses
+                }
+            return {manuscript_id: dict(zip(verses, row))
+                    for manuscript_id, row in zip(manuscript_keys, distances.tolist())}
+        if format_heatmap:
+            return {
+                "z": distances.transpose(2, 0, 1).tolist(),
+                "x": manuscript_keys,
+                "y": manuscript_keys,
+                "verses": verses
+            }
+        return {
+            "manuscripts": manuscript_keys,
+            "verses": verses,
+            "distances": distances.tolist()
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=500,
+                            detail="Unable to compute the distances") from e
+
+
 @router.get("/homogeneity/")
 async def get_classification_homogeneity():
     """
     Get the homogeneity between the classifications.
+    The content is read through the loader of the request.
     """
     try:
-        profiles_clustered = db_manipulator.get_profile_clustered(all_manuscripts=True)
-        content_clustered = db_manipulator.get_content_clustered(all_manuscripts=True,
-                                                                    chapter=STUDIED_CHAPTER)
+        loader = db_manipulator.loader()
+        profiles_clustered = await db_manipulator.get_profile_clustered(all_manuscripts=True)
+        content_clustered = await db_manipulator.get_content_clustered(all_manuscripts=True,
+                                                                    chapter=STUDIED_CHAPTER,
+                                                                    loader=loader)
+        manuscripts_info = await db_manipulator.get_manuscripts_info(list(profiles_clustered))
 
         # Sort the data
         final_data = {}
@@ -197,7 +294,7 @@ async def get_classification_homogeneity():
             final_data[manuscript_id] = {
                 'clustered_profile': profiles_clustered.get(manuscript_id, None),
                 'clustered_content': content_clustered.get(manuscript_id, None),
-                **db_manipulator.get_manuscript_info(manuscript_id)[0]
+                **manuscripts_info[manuscript_id]
             }
         final_values = list(final_data.values())
         clustered_profile = [label["clustered_profile"] for label in final_values]
@@ -208,15 +305,15 @@ async def get_classification_homogeneity():
         von_soden_cat = [label["von-soden"] for label in final_values]
 
         return {
-            "Score profile-content": db_manipulator.measure_cluster_quality(clustered_profile, clustered_content),
-            "Score profile-aland": db_manipulator.measure_cluster_quality(clustered_profile, aland_cat),
-            "Score profile-wisse": db_manipulator.measure_cluster_quality(clustered_profile, wisse_cat),
-            "Score profile-VS": db_manipulator.measure_cluster_quality(clustered_profile, von_soden_cat),
-            "Score profile-type": db_manipulator.measure_cluster_quality(clustered_profile, text_type),
-            "Score content-aland": db_manipulator.measure_cluster_quality(clustered_content, aland_cat),
-            "Score content-type": db_manipulator.measure_cluster_quality(clustered_content, text_type),
-            "Score content-wisse": db_manipulator.measure_cluster_quality(clustered_content, wisse_cat),
-            "Score content-VS": db_manipulator.measure_cluster_quality(clustered_content, von_soden_cat)
+            "Score profile-content": await db_manipulator.measure_cluster_quality(clustered_profile, clustered_content),
+            "Score profile-aland": await db_manipulator.measure_cluster_quality(clustered_profile, aland_cat),
+            "Score profile-wisse": await db_manipulator.measure_cluster_quality(clustered_profile, wisse_cat),
+            "Score profile-VS": await db_manipulator.measure_cluster_quality(clustered_profile, von_soden_cat),
+            "Score profile-type": await db_manipulator.measure_cluster_quality(clustered_profile, text_type),
+            "Score content-aland": await db_manipulator.measure_cluster_quality(clustered_content, aland_cat),
+            "Score content-type": await db_manipulator.measure_cluster_quality(clustered_content, text_type),
+            "Score content-wisse": await db_manipulator.measure_cluster_quality(clustered_content, wisse_cat),
+            "Score content-VS": await db_manipulator.measure_cluster_quality(clustered_content, von_soden_cat)
         }
     except ValueError as e:
         raise HTTPException(status_code=500,
@@ -226,4 +323,5 @@ async def get_classification_homogeneity():
 def get_wisse_readings():
     """Output as HTML the dataset containing the Wisse readings.
     """
+    profile_readings = engine.profile_readings
     return profile_readings[profile_readings.chapter == int(STUDIED_CHAPTER)][["verse", "reading", "alternative_reading"]].to_html()
\ No newline at end of file
@@ -1,7 +1,13 @@
 """Import the profile as a pandas DataFrame.
+
+The rules of the profile are parsed once, by `get_profiles`, on first use.
 """
-from pathlib import Path
-import pandas as pd
 
 
-profile_readings = pd.read_csv(str(Path(__file__).absolute().parent) + "/data/profile_rules.csv", index_col=0)
+def __getattr__(name: str):
+    """Expose the rules of the profile as `profile_readings`, loaded on first use.
+    """
+    if name == "profile_readings":
+        from manuscript_clusterer.engine.get_profiles import PROFILE_RULES
+        return PROFILE_RULES
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
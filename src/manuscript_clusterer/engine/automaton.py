@@ -0,0 +1,54 @@
+"""Aho-Corasick automaton matching many literal readings in a single scan.
+"""
+from collections import deque
+
+
+class AhoCorasick:
+    """Automaton over a list of non-empty literal patterns.
+    """
+
+    def __init__(self, patterns: list[str]):
+        """Build the trie of the patterns and its failure links.
+        """
+        if not all(patterns):
+            raise ValueError("The patterns of the automaton must not be empty")
+        self.patterns = list(patterns)
+        self.lengths = [len(pattern) for pattern in self.patterns]
+        self.goto = [{}]
+        self.outputs = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.outputs.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.outputs[state].append(index)
+        # The failure link of a state is the longest proper suffix of its path present in the trie
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, target in self.goto[state].items():
+                queue.append(target)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[target] = self.goto[fallback].get(char, 0) if state else 0
+                self.outputs[target] = self.outputs[target] + self.outputs[self.fail[target]]
+
+    def first_matches(self, text: str):
+        """Scan the text once and return the span of the leftmost match of each pattern found.
+        """
+        goto, fail, outputs, lengths = self.goto, self.fail, self.outputs, self.lengths
+        matches = {}
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in outputs[state]:
+                if index not in matches:
+                    matches[index] = (position + 1 - lengths[index], position + 1)
+        return {self.patterns[index]: span for index, span in matches.items()}
@@ -1,32 +1,56 @@
 """Apply clustering to the manuscript data.
 """
-from sklearn.base import ClusterMixin
-from sklearn.metrics import silhouette_score
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from loguru import logger
 import numpy as np
 import pandas as pd
 from textdistance import jaccard
+from manuscript_clusterer.engine.distances import (compute_jaccard_distance_matrix, compute_verse_distance_tensor,
+                                                   hamming_distance_block, pack_profiles, profiles_to_array)
+from manuscript_clusterer.engine.knn import cluster_knn_graph, compute_knn_graph
+from manuscript_clusterer.engine.scoring import score_clustering
 
+if TYPE_CHECKING:
+    from sklearn.base import ClusterMixin
 
-def cluster_profiles(profiles: dict[str, dict[str, str]],
-                     clusterer_class: ClusterMixin,
+
+def cluster_profiles(profiles: dict[str, dict[str, str]] | pd.DataFrame,
+                     clusterer_class: "ClusterMixin",
+                     silhouette: str = "auto",
+                     return_score: bool = False,
                      **kwargs):
     """Cluster the manuscript according to their profile.
+    The profiles are either a dictionary or a DataFrame indexed by the manuscripts.
+    The silhouette mode is used to select the number of clusters.
+    With `return_score`, the silhouette score of the clustering and its confidence interval
+    are returned too.
     """
-    profile_df = pd.DataFrame(profiles).T
-    best_n_cluster = find_best_n_clusters(clusterer_class, profile_df, **kwargs)
+    profile_df = profiles if isinstance(profiles, pd.DataFrame) else pd.DataFrame(profiles).T
+    best_n_cluster, score = find_best_n_clusters(clusterer_class, profile_df, silhouette=silhouette,
+                                                 return_score=True, **kwargs)
     clusterer = clusterer_class(n_clusters=best_n_cluster, **kwargs)
     clusterer.fit(profile_df)
-    return {
+    clusters = {
         manuscript_id: str(cluster_id) for manuscript_id, cluster_id in
         zip(profile_df.index, clusterer.labels_)
     }
+    if return_score:
+        return clusters, score
+    return clusters
 
 
 def compute_distance_matrix_text(clustered_content: dict[str, dict[str, str]],
                                  distance_function: callable = jaccard):
     """
     Compute the distance matrix between manuscripts based on their variant readings.
+
+    The default Jaccard distance is computed by the vectorized sparse engine,
+    other distance functions fall back to the pairwise loop.
     """
+    if distance_function is jaccard:
+        return compute_jaccard_distance_matrix(clustered_content)
+
     # Get the manuscript keys
     manuscript_keys = list(clustered_content.keys())
     num_manuscripts = len(manuscript_keys)
@@ -73,7 +97,13 @@ def compute_distance_matrix_verse_text(verses: dict[str, dict[str, str]],
             "2": "text"
             }
     }
+
+    The default Jaccard distance is computed by the batched verse engine.
     """
+    if distance_function is jaccard:
+        _, verse_keys, distances = compute_verse_distance_tensor(verses, reference=list(verses.keys())[0])
+        return verse_keys, distances[1][:, None]
+
     # Get the verse keys and sort them in ascending order
     verse_keys = sorted(set(int(key) for ms in verses.values()
                         for key in ms.keys()))
@@ -101,84 +131,153 @@ def compute_distance_matrix_verse_text(verses: dict[str, dict[str, str]],
 
 
 def cluster_texts(clustered_content: dict[str, dict[str, str]],
-                  clusterer_class: ClusterMixin,
+                  clusterer_class: "ClusterMixin",
+                  silhouette: str = "auto",
+                  return_score: bool = False,
                   **kwargs):
     """
     Cluster the manuscripts according to their distance matrix.
     The selected method must be distance based.
+    The silhouette mode is used to select the number of clusters.
+    With `return_score`, the silhouette score of the clustering and its confidence interval
+    are returned too.
     """
     manuscript_keys, distance_matrix = compute_distance_matrix_text(
         clustered_content)
-    #TODO: remove hardcoding
-    best_n_cluster = find_best_n_clusters(clusterer_class, distance_matrix, metric="precomputed", **kwargs)
-    #####
-    best_n_cluster = 5
+    best_n_cluster, score = find_best_n_clusters(clusterer_class, distance_matrix, metric="precomputed",
+                                                 silhouette=silhouette, return_score=True, **kwargs)
     clusterer = clusterer_class(metric="precomputed", n_clusters=best_n_cluster, **kwargs)
     clusterer.fit(distance_matrix)
-    return {
+    clusters = {
         manuscript_id: str(cluster_id) for manuscript_id, cluster_id in zip(manuscript_keys, clusterer.labels_)
     }
+    if return_score:
+        return clusters, score
+    return clusters
+
+
+def cluster_texts_knn(clustered_content: dict[str, dict[str, str]],
+                      n_neighbors: int = 15,
+                      n_clusters: int = None):
+    """
+    Cluster the manuscripts according to their sparse k-nearest-neighbours graph.
+    The full distance matrix is never built, the number of clusters is selected
+    by the eigengap of the graph if not given.
+    """
+    manuscript_keys, knn_indices, knn_distances = compute_knn_graph(clustered_content,
+                                                                    n_neighbors=n_neighbors)
+    labels = cluster_knn_graph(knn_indices, knn_distances, n_clusters=n_clusters)
+    return {
+        manuscript_id: str(cluster_id) for manuscript_id, cluster_id in zip(manuscript_keys, labels)
+    }
 
 
 def compute_distance_matrix_profiles(profiles: dict[str, dict[str, str]]):
     """
     Compute the distance matrix between manuscripts based on their profiles.
     """
-    # Extract profile IDs and corresponding data
-    profile_ids = list(profiles.keys())
-    distance_matrix = {pid: {} for pid in profile_ids}
-
-    # Iterate through all pairs of profiles to calculate distances
-    for i, id1 in enumerate(profile_ids):
-        profile1 = profiles[id1]
-        for j, id2 in enumerate(profile_ids):
-            if j < i:
-                # Use symmetry to save computation
-                distance_matrix[id1][id2] = distance_matrix[id2][id1]
-            elif j == i:
-                # Distance to self is 0
-                distance_matrix[id1][id2] = 0
-            else:
-                # Compute Hamming distance
-                profile2 = profiles[id2]
-                if set(profile1.keys()) != set(profile2.keys()):
-                    raise ValueError(f"Profiles {id1} and {
-                                     id2} have different keys.")
-                distance_matrix[id1][id2] = sum(
-                    profile1[key] != profile2[key] for key in profile1
-                )
-    return distance_matrix
-
-
-def find_best_n_clusters(clustering_class, X, min_clusters=2, max_clusters=10, **kwargs):
+    profile_ids, _, values = profiles_to_array(profiles)
+    indexes = np.arange(len(profile_ids))
+    distances = hamming_distance_block(pack_profiles(values), indexes, indexes)
+    return {id1: {id2: int(distances[i, j]) for j, id2 in enumerate(profile_ids)}
+            for i, id1 in enumerate(profile_ids)}
+
+
+def sweep_tree_cuts(X,
+                    linkage: str = "ward",
+                    metric: str = "euclidean",
+                    min_clusters: int = 2,
+                    max_clusters: int = 50,
+                    n_jobs: int = None,
+                    silhouette: str = "auto"):
+    """
+    Build the hierarchical tree once and score each of its cuts by their silhouette.
+
+    Every cut is scored against the same distance matrix (given directly when
+    `metric` is "precomputed", computed once otherwise), and the candidate
+    numbers of clusters are scored in parallel.
+
+    Returns a dictionary mapping each number of clusters to its silhouette score
+    and confidence interval.
+    """
+    from scipy.cluster.hierarchy import fcluster, linkage as linkage_tree
+    from scipy.spatial.distance import pdist, squareform
+    if metric == "precomputed":
+        distance_matrix = np.asarray(X, dtype=np.float64)
+        condensed = squareform(distance_matrix, checks=False)
+    else:
+        condensed = pdist(np.asarray(X, dtype=np.float64), metric=metric)
+        distance_matrix = squareform(condensed)
+    tree = linkage_tree(condensed, method=linkage)
+    # The silhouette is only defined for 2 <= n_clusters <= n_samples - 1
+    candidates = range(max(min_clusters, 2), min(max_clusters, len(distance_matrix)))
+
+    def score_cut(n_clusters):
+        labels = fcluster(tree, n_clusters, criterion="maxclust")
+        if len(np.unique(labels)) < 2:
+            return None
+        return score_clustering(distance_matrix, labels, metric="precomputed", silhouette=silhouette)
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        scores = dict(zip(candidates, executor.map(score_cut, candidates)))
+    return {n_clusters: score for n_clusters, score in scores.items() if score is not None}
+
+
+def find_best_n_clusters(clustering_class, X, min_clusters=2, max_clusters=None, n_jobs=None,
+                         silhouette="auto", return_score=False, **kwargs):
     """
     Finds the optimal number of clusters for a given clustering class based on the silhouette score.
 
+    For an agglomerative clustering the hierarchical tree is built once and cut at
+    every candidate number of clusters (see `sweep_tree_cuts`), for other classes
+    the model is refitted for each candidate.
+
     Parameters:
     - clustering_class: The clustering class from scikit-learn (e.g., KMeans).
     - X: The data to be clustered.
     - min_clusters: Minimum number of clusters to consider (default is 2).
-    - max_clusters: Maximum number of clusters to consider (default is 10).
+    - max_clusters: Maximum number of clusters to consider, excluded (default is 50
+      for the tree sweep, 10 otherwise).
+    - n_jobs: Number of candidates scored in parallel by the tree sweep.
+    - silhouette: "exact", "approximate" (stratified sample and medoid silhouette)
+      or "auto", approximate above `APPROXIMATE_SILHOUETTE_THRESHOLD` manuscripts.
+      The score of each candidate is logged with its confidence interval.
+    - return_score: Also return the score of the best number of clusters.
 
     Returns:
     - best_n_clusters: The number of clusters with the highest silhouette score.
-    - sil_score_max: The maximum silhouette score achieved.
+    - score: The (score, (low, high)) silhouette score and confidence interval of the best
+      number of clusters, if return_score is enabled.
     """
+    # Imported on use, as scikit-learn is slow to import
+    from sklearn.cluster import AgglomerativeClustering
+    metric = kwargs.get("metric", "euclidean")
+    if clustering_class is AgglomerativeClustering:
+        scores = sweep_tree_cuts(X,
+                                 linkage=kwargs.get("linkage", "ward"),
+                                 metric=metric,
+                                 min_clusters=min_clusters,
+                                 max_clusters=max_clusters or 50,
+                                 n_jobs=n_jobs,
+                                 silhouette=silhouette)
+    else:
+        scores = {}
+        for n_clusters in range(min_clusters, max_clusters or 10):
+            model = clustering_class(n_clusters=n_clusters, **kwargs)
+            labels = model.fit_predict(X)
+            scores[n_clusters] = score_clustering(X, labels, metric=metric, silhouette=silhouette)
+    if not scores:
+        raise ValueError("Not enough manuscripts to select a number of clusters")
+
     sil_score_max = -1  # Minimum possible score
-    
-    for n_clusters in range(min_clusters, max_clusters):
-        model = clustering_class(n_clusters=n_clusters, **kwargs)
-        labels = model.fit_predict(X)
-        sil_score = silhouette_score(X, labels)
-        print(f"The average silhouette score for {n_clusters} clusters is {sil_score:.2f}")
-        
+    for n_clusters, (sil_score, interval) in scores.items():
+        logger.debug(f"The average silhouette score for {n_clusters} clusters is {sil_score:.2f} "
+                     f"[{interval[0]:.2f}, {interval[1]:.2f}]")
         if sil_score > sil_score_max:
             sil_score_max = sil_score
             best_n_clusters = n_clusters
 
+    if return_score:
+        sil_score, interval = scores[best_n_clusters]
+        return best_n_clusters, (float(sil_score), (float(interval[0]), float(interval[1])))
     return best_n_clusters
-
-
-
-
-
@@ -0,0 +1,21 @@
+"""Collation of the verses of the manuscripts with collatex.
+"""
+
+
+def collate_verses(witnesses: dict[str, str]):
+    """Collate the texts of a verse, given by manuscript.
+    Returns the alignment table as HTML, with borders and padding on its cells.
+    """
+    from bs4 import BeautifulSoup
+    from collatex import Collation, collate
+    from collatex.core_classes import create_table_visualization
+    collation = Collation()
+    for manuscript_id, text in witnesses.items():
+        collation.add_plain_witness(manuscript_id, text)
+    html_string = create_table_visualization(collate(collation, output="table", segmentation=True, near_match=False)).get_html_string(formatting=True)
+
+    # Format the HTML string to output borders and padding
+    soup = BeautifulSoup(html_string, "html.parser")
+    for cell in soup.find_all("td"):
+        cell.attrs.update({"style": "border: 1px solid black; padding: 5px;"})
+    return soup.prettify()
@@ -0,0 +1,305 @@
+"""Vectorized distance engines between manuscripts.
+
+The textual distance mirrors `textdistance.jaccard` (character multiset
+Jaccard, summed over the verses) but computes every pair at once. Each verse
+of each manuscript is encoded as a sparse incidence row over
+(character, occurrence) features, so that the size of the multiset
+intersection of two verses is the dot product of their rows.
+"""
+from collections import Counter
+import numpy as np
+from scipy import sparse
+
+
+def sort_verse_keys(content: dict[str, dict[str, str]]):
+    """Sort the verses found in the manuscripts, numerically when possible.
+    """
+    verse_keys = set(verse for text in content.values() for verse in text)
+    return sorted(verse_keys, key=lambda verse: (0, int(verse), "") if verse.isdigit() else (1, 0, verse))
+
+
+def encode_verses(content: dict[str, dict[str, str]],
+                  verse_keys: list[str] = None):
+    """Encode the verses of the manuscripts as sparse incidence matrices.
+
+    Returns the manuscript keys and, for every verse (all the verses found in
+    the manuscripts by default), a tuple holding the (manuscripts x features)
+    CSR incidence matrix and the length of each text.
+    A verse missing from a manuscript is encoded as an empty string.
+    """
+    manuscript_keys = list(content.keys())
+    if verse_keys is None:
+        verse_keys = sort_verse_keys(content)
+    encoded = []
+    for verse in verse_keys:
+        features = {}
+        rows, cols = [], []
+        lengths = np.zeros(len(manuscript_keys), dtype=np.float64)
+        for i, key in enumerate(manuscript_keys):
+            text = content[key].get(verse, "")
+            lengths[i] = len(text)
+            for char, count in Counter(text).items():
+                for occurrence in range(count):
+                    rows.append(i)
+                    cols.append(features.setdefault((char, occurrence), len(features)))
+        incidence = sparse.csr_matrix((np.ones(len(rows), dtype=np.float64), (rows, cols)),
+                                      shape=(len(manuscript_keys), len(features)))
+        encoded.append((incidence, lengths))
+    return manuscript_keys, encoded
+
+
+def _jaccard_similarity(incidence: sparse.csr_matrix,
+                        lengths: np.ndarray,
+                        rows: np.ndarray,
+                        cols: np.ndarray):
+    """Compute the Jaccard similarity of a verse between two sets of manuscripts.
+    """
+    intersection = (incidence[rows] @ incidence[cols].T).toarray()
+    union = lengths[rows][:, None] + lengths[cols][None, :] - intersection
+    # Two empty texts are identical
+    return np.divide(intersection, union,
+                     out=np.ones_like(intersection),
+                     where=union > 0)
+
+
+def jaccard_distance_block(encoded: list[tuple[sparse.csr_matrix, np.ndarray]],
+                           rows: np.ndarray,
+                           cols: np.ndarray):
+    """Compute the summed Jaccard distance between two sets of manuscripts.
+
+    `rows` and `cols` are indexes into the encoded manuscripts, the result is a
+    (len(rows) x len(cols)) matrix.
+    """
+    distance_block = np.zeros((len(rows), len(cols)))
+    for incidence, lengths in encoded:
+        distance_block += 1 - _jaccard_similarity(incidence, lengths, rows, cols)
+    return distance_block
+
+
+def compute_jaccard_distance_matrix(content: dict[str, dict[str, str]]):
+    """Compute the summed Jaccard distance matrix between all manuscripts.
+
+    Equivalent to `compute_distance_matrix_text` with the default
+    `textdistance.jaccard` distance.
+    """
+    manuscript_keys, encoded = encode_verses(content)
+    indexes = np.arange(len(manuscript_keys))
+    distance_matrix = jaccard_distance_block(encoded, indexes, indexes)
+    np.fill_diagonal(distance_matrix, 0)
+    return manuscript_keys, distance_matrix
+
+
+def compute_verse_distance_tensor(verses: dict[str, dict[str, str]],
+                                  reference: str = None):
+    """Compute the Jaccard distance between manuscripts verse by verse.
+
+    Without reference, the result is a (manuscripts x manuscripts x verses)
+    tensor of the distances between every pair of manuscripts. With a
+    reference manuscript, the result is the (manuscripts x verses) matrix of
+    the distances of every manuscript to the reference.
+    Returns the manuscript keys, the verse keys (sorted numerically) and the distances.
+    """
+    verse_keys = sort_verse_keys(verses)
+    manuscript_keys, encoded = encode_verses(verses, verse_keys=verse_keys)
+    indexes = np.arange(len(manuscript_keys))
+    if reference is None:
+        distances = np.zeros((len(manuscript_keys), len(manuscript_keys), len(verse_keys)))
+        for i, (incidence, lengths) in enumerate(encoded):
+            distances[:, :, i] = 1 - _jaccard_similarity(incidence, lengths, indexes, indexes)
+    else:
+        reference_index = np.array([manuscript_keys.index(reference)])
+        distances = np.zeros((len(manuscript_keys), len(verse_keys)))
+        for i, (incidence, lengths) in enumerate(encoded):
+            distances[:, i] = 1 - _jaccard_similarity(incidence, lengths, indexes, reference_index)[:, 0]
+    return manuscript_keys, verse_keys, distances
+
+
+def profiles_to_array(profiles: dict[str, dict[str, int]],
+                      strict_keys: bool = True):
+    """Stack the profiles into a dense (manuscripts x readings) int8 array.
+
+    With `strict_keys`, all profiles must share the same readings, otherwise
+    a reading absent from a profile is stored as missing (-1).
+    Returns the manuscript keys, the reading keys and the array.
+    """
+    manuscript_keys = list(profiles.keys())
+    reading_keys = list(dict.fromkeys(key for profile in profiles.values() for key in profile))
+    if strict_keys:
+        for manuscript_id in manuscript_keys:
+            if len(profiles[manuscript_id]) != len(reading_keys):
+                raise ValueError(f"Profiles {manuscript_keys[0]} and {manuscript_id} have different keys.")
+    values = np.array([[profiles[manuscript_id].get(key, -1) for key in reading_keys]
+                       for manuscript_id in manuscript_keys], dtype=np.int8)
+    return manuscript_keys, reading_keys, values.reshape(len(manuscript_keys), len(reading_keys))
+
+
+# Number of bits set in each byte
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+# Policies for the readings missing (-1) from a profile:
+# - "strict": a missing reading is a value of its own (same as comparing the raw values)
+# - "ignore": only the readings present in both profiles are compared
+# - "mismatch": a reading missing from either profile counts as a difference
+MISSING_POLICIES = ("strict", "ignore", "mismatch")
+
+
+def pack_profiles(values: np.ndarray):
+    """Pack tri-state profiles (1/0/-1) into two bitplanes.
+
+    Returns the "value" bitplane (reading is 1), the "present" bitplane
+    (reading is not -1), both as (manuscripts x bytes) uint8 arrays, and the
+    number of readings.
+    """
+    values = np.asarray(values)
+    return (np.packbits(values == 1, axis=1),
+            np.packbits(values != -1, axis=1),
+            values.shape[1])
+
+
+def hamming_distance_block(packed: tuple[np.ndarray, np.ndarray, int],
+                           rows: np.ndarray,
+                           cols: np.ndarray,
+                           missing: str = "strict",
+                           chunk_size: int = 64):
+    """Compute the Hamming distance between two sets of packed profiles.
+
+    The distance is the popcount of the XOR of the bitplanes, computed for
+    `chunk_size` rows at a time to bound the memory used.
+    """
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"Unknown missing readings policy {missing}")
+    value_bits, present_bits, n_readings = packed
+    valid_bits = np.packbits(np.ones(n_readings, dtype=bool))
+    col_values, col_present = value_bits[cols][None, :, :], present_bits[cols][None, :, :]
+    distance_block = np.zeros((len(rows), len(cols)), dtype=np.int64)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        row_values, row_present = value_bits[chunk][:, None, :], present_bits[chunk][:, None, :]
+        both_present = row_present & col_present
+        differences = (row_values ^ col_values) & both_present
+        if missing == "strict":
+            differences |= row_present ^ col_present
+        elif missing == "mismatch":
+            differences |= ~both_present & valid_bits
+        distance_block[start:start + chunk_size] = _POPCOUNT[differences].sum(axis=-1, dtype=np.int64)
+    return distance_block
+
+
+def compute_hamming_distance_matrix(profiles: dict[str, dict[str, int]],
+                                    missing: str = "strict"):
+    """Compute the Hamming distance matrix between all profiles.
+
+    A reading absent from a profile is treated as missing.
+    Returns the manuscript keys and the distance matrix.
+    """
+    manuscript_keys, _, values = profiles_to_array(profiles, strict_keys=False)
+    indexes = np.arange(len(manuscript_keys))
+    return manuscript_keys, hamming_distance_block(pack_profiles(values), indexes, indexes, missing=missing)
+
+
+class VerseCounts:
+    """Character counts of the verses of manuscripts, extended one manuscript at a time.
+
+    The counts of a verse are a dense (manuscripts x characters) array, the
+    size of the multiset intersection of two verses being the sum of the
+    minimum of their counts. Adding a manuscript only counts its own verses,
+    and its summed Jaccard distances to the others are the ones of
+    `compute_jaccard_distance_matrix`.
+    """
+
+    def __init__(self, content: dict[str, dict[str, str]] = None):
+        """Count the verses of the manuscripts of `content`.
+        """
+        self.manuscript_keys = []
+        self._characters = {}
+        self._counts = {}
+        for manuscript_id, verses in (content or {}).items():
+            self.add(manuscript_id, verses)
+
+    def add(self, manuscript_id: str, verses: dict[str, str]):
+        """Add the verses of a manuscript, replacing them if it is already counted.
+        """
+        self.remove(manuscript_id)
+        self.manuscript_keys.append(manuscript_id)
+        size = len(self.manuscript_keys)
+        for verse in list(self._counts) + [verse for verse in verses if verse not in self._counts]:
+            characters = self._characters.setdefault(verse, {})
+            text_counts = Counter(verses.get(verse, ""))
+            for char in text_counts:
+                characters.setdefault(char, len(characters))
+            counts = self._counts.get(verse, np.zeros((size - 1, 0), dtype=np.int32))
+            counts = np.pad(counts, ((0, 1), (0, len(characters) - counts.shape[1])))
+            for char, count in text_counts.items():
+                counts[size - 1, characters[char]] = count
+            self._counts[verse] = counts
+
+    def remove(self, manuscript_id: str):
+        """Remove the verses of a manuscript, if it is counted.
+        """
+        if manuscript_id not in self.manuscript_keys:
+            return
+        index = self.manuscript_keys.index(manuscript_id)
+        del self.manuscript_keys[index]
+        for verse, counts in self._counts.items():
+            self._counts[verse] = np.delete(counts, index, axis=0)
+
+    def distances(self, manuscript_id: str):
+        """Compute the summed Jaccard distance from a manuscript to every counted manuscript.
+        """
+        index = self.manuscript_keys.index(manuscript_id)
+        distances = np.zeros(len(self.manuscript_keys))
+        for counts in self._counts.values():
+            intersection = np.minimum(counts, counts[index]).sum(axis=1)
+            lengths = counts.sum(axis=1)
+            union = lengths + lengths[index] - intersection
+            # Two empty texts are identical
+            distances += 1 - np.divide(intersection, union,
+                                       out=np.ones(len(union)),
+                                       where=union > 0)
+        distances[index] = 0
+        return distances
+
+
+class ProfileRows:
+    """Tri-state profiles (1/0/-1) of manuscripts, extended one manuscript at a time.
+
+    A reading absent from a profile is missing (-1), and the distances are
+    the Hamming distances of the "strict" policy.
+    """
+
+    def __init__(self, profiles: dict[str, dict[str, int]] = None):
+        """Stack the profiles of the manuscripts of `profiles`.
+        """
+        self.manuscript_keys = []
+        self._readings = {}
+        self._values = np.zeros((0, 0), dtype=np.int8)
+        for manuscript_id, profile in (profiles or {}).items():
+            self.add(manuscript_id, profile)
+
+    def add(self, manuscript_id: str, profile: dict[str, int]):
+        """Add the profile of a manuscript, replacing it if it is already stacked.
+        """
+        self.remove(manuscript_id)
+        self.manuscript_keys.append(manuscript_id)
+        for key in profile:
+            self._readings.setdefault(key, len(self._readings))
+        self._values = np.pad(self._values,
+                              ((0, 1), (0, len(self._readings) - self._values.shape[1])),
+                              constant_values=-1)
+        for key, value in profile.items():
+            self._values[-1, self._readings[key]] = value
+
+    def remove(self, manuscript_id: str):
+        """Remove the profile of a manuscript, if it is stacked.
+        """
+        if manuscript_id not in self.manuscript_keys:
+            return
+        index = self.manuscript_keys.index(manuscript_id)
+        del self.manuscript_keys[index]
+        self._values = np.delete(self._values, index, axis=0)
+
+    def distances(self, manuscript_id: str):
+        """Compute the Hamming distance from a manuscript to every stacked manuscript.
+        """
+        index = self.manuscript_keys.index(manuscript_id)
+        return (self._values != self._values[index]).sum(axis=1)
@@ -0,0 +1,330 @@
+"""Process pool running the engine computations out of the API processes.
+
+The clusterings, projections, distances and collations hold the GIL for
+seconds, so the API sends them to a pool of worker processes and waits for
+their result. The workers import the heavy modules (UMAP, prince, sklearn,
+collatex) when they start, and optionally compile the UMAP projections, so
+that no request pays for them. Without workers the calls run inline, and
+the heavy modules are imported in the process of the API by its first call,
+so that the API starts without them. Importing them from several threads at
+once may deadlock, so the imports of the API process are made once, by
+`load_modules`, under a global lock that the other calls wait for.
+
+Every call has a timeout. The calls made on behalf of a request belong to a
+`CallScope`, cancelled when the request is: its queued calls are dropped. A
+call already running when it times out or is cancelled would keep its worker
+busy, so that worker, and only it, is stopped and replaced. Each worker runs
+one call at a time, sent through its own pipe, so that the other calls run on
+undisturbed (a `ProcessPoolExecutor` breaks with any of its workers).
+"""
+import atexit
+from concurrent.futures import CancelledError, Future
+from concurrent.futures.process import BrokenProcessPool
+from contextvars import ContextVar
+import importlib
+import multiprocessing
+from multiprocessing.connection import Connection
+from threading import Condition, Lock, RLock
+import time
+import weakref
+
+# Modules imported by the workers when they start
+WARM_MODULES = (
+    "umap",
+    "prince",
+    "sklearn.cluster",
+    "sklearn.metrics",
+    "scipy.spatial",
+    "collatex",
+    "bs4",
+    "manuscript_clusterer.engine.cluster",
+    "manuscript_clusterer.engine.collation",
+    "manuscript_clusterer.engine.project",
+)
+
+# Modules imported by the API process around the engine calls, when these run in workers
+HOST_MODULES = (
+    "sklearn.cluster",
+    "sklearn.metrics",
+)
+
+_IMPORT_LOCK = RLock()
+
+# Interval at which the calls waiting for a worker or a result check their scope, in seconds
+_POLL_INTERVAL = 0.05
+
+
+class EngineTimeoutError(TimeoutError):
+    """An engine call did not complete within its timeout.
+    """
+
+
+class CallScope:
+    """Engine calls made on behalf of a request, cancelled together.
+    """
+
+    def __init__(self):
+        self.cancelled = Future()
+        self._lock = Lock()
+
+    def cancel(self):
+        """Cancel the calls of the scope: the queued ones are dropped, the running ones stopped.
+        """
+        with self._lock:
+            if not self.cancelled.done():
+                self.cancelled.set_result(True)
+
+
+_CURRENT_SCOPE = ContextVar("engine_call_scope", default=None)
+
+
+def run_in_scope(scope: CallScope, function, *args, **kwargs):
+    """Run a function, attaching the engine calls it makes to the scope.
+    """
+    token = _CURRENT_SCOPE.set(scope)
+    try:
+        return function(*args, **kwargs)
+    finally:
+        _CURRENT_SCOPE.reset(token)
+
+
+def import_modules(modules: tuple[str]):
+    """Import modules, skipping the missing ones, one thread at a time.
+    """
+    with _IMPORT_LOCK:
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+
+
+def _init_worker(modules: tuple[str], warm_up: bool):
+    """Import the heavy modules in a new worker, and compile the projections if requested.
+    """
+    import_modules(modules)
+    if warm_up:
+        from manuscript_clusterer.engine.project import warm_up_projections
+        warm_up_projections()
+
+
+def _serve(connection: Connection, modules: tuple[str], warm_up: bool):
+    """Run the calls received on a connection one at a time, until it is closed.
+    """
+    _init_worker(modules, warm_up)
+    while True:
+        try:
+            call = connection.recv()
+        except EOFError:
+            return
+        if call is None:
+            return
+        function, args, kwargs = call
+        try:
+            outcome = (True, function(*args, **kwargs))
+        except Exception as e:  # pylint: disable=broad-except
+            outcome = (False, e)
+        try:
+            connection.send(outcome)
+        except Exception as e:  # pylint: disable=broad-except
+            # The result could not be pickled
+            connection.send((False, e))
+
+
+class _Worker:
+    """Worker process of the engine, running the calls sent through its pipe.
+    """
+
+    def __init__(self, context, modules: tuple[str], warm_up: bool):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(target=_serve,
+                                       args=(worker_connection, modules, warm_up),
+                                       name="engine-worker")
+        self.process.start()
+        worker_connection.close()
+
+    def stop(self, wait_call: bool = False):
+        """Stop the process, once its call is completed if `wait_call`.
+        """
+        if wait_call:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+_EXECUTORS = weakref.WeakSet()
+
+
+def _stop_executors():
+    """Stop the workers of the executors at exit.
+    Registered after the exit handler of multiprocessing (imported with its connections),
+    so run before it joins the workers.
+    """
+    for executor in list(_EXECUTORS):
+        executor.shutdown()
+
+
+atexit.register(_stop_executors)
+
+
+class EngineExecutor:
+    """Pool of worker processes running the engine functions.
+    """
+
+    def __init__(self,
+                 workers: int = 0,
+                 timeout: float = None,
+                 start_method: str = "spawn",
+                 warm_modules: tuple[str] = WARM_MODULES,
+                 warm_up: bool = False,
+                 host_modules: tuple[str] = HOST_MODULES):
+        """Configure the pool, started on first use (or by `start`).
+        Without workers, the functions are run inline.
+        `timeout` is the default timeout of the calls, in seconds (None to wait indefinitely),
+        `warm_up` compiles the UMAP projections in every worker.
+        The calling process imports the `warm_modules` without workers, the `host_modules` with them,
+        on its first call.
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.start_method = start_method
+        self.warm_modules = tuple(warm_modules)
+        self.warm_up = warm_up
+        self.host_modules = tuple(host_modules)
+        self._imported = False
+        self._workers = []
+        self._idle = []
+        self._condition = Condition()
+        _EXECUTORS.add(self)
+
+    def load_modules(self):
+        """Import the heavy modules used in this process, once.
+        The calls made meanwhile by other threads wait for the imports.
+        """
+        if self._imported:
+            return
+        with _IMPORT_LOCK:
+            if not self._imported:
+                import_modules(self.warm_modules if self.workers == 0 else self.host_modules)
+                self._imported = True
+
+    def _new_worker(self):
+        """Start a new worker process.
+        """
+        return _Worker(multiprocessing.get_context(self.start_method), self.warm_modules, self.warm_up)
+
+    def start(self):
+        """Start the workers, if not already started.
+        """
+        with self._condition:
+            if self.workers > 0 and not self._workers:
+                self._workers = [self._new_worker() for _ in range(self.workers)]
+                self._idle = list(self._workers)
+                self._condition.notify_all()
+
+    def shutdown(self, wait_workers: bool = False):
+        """Stop the workers, once their calls are completed if `wait_workers`.
+        The calls running otherwise fail with `BrokenProcessPool`.
+        """
+        with self._condition:
+            if wait_workers:
+                while len(self._idle) < len(self._workers):
+                    self._condition.wait()
+            workers, self._workers, self._idle = self._workers, [], []
+            self._condition.notify_all()
+        for worker in workers:
+            worker.stop(wait_call=wait_workers)
+
+    def run(self, function, *args, timeout: float = None, **kwargs):
+        """Run an engine function in a worker and return its result.
+        The function and its arguments must be picklable.
+        Raises `EngineTimeoutError` past the timeout (the default one if not given),
+        `CancelledError` if the scope of the call is cancelled, and `BrokenProcessPool`
+        if the worker stops during the call (e.g. out of memory).
+        """
+        self.load_modules()
+        if self.workers == 0:
+            return function(*args, **kwargs)
+        self.start()
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        scope = _CURRENT_SCOPE.get()
+        name = getattr(function, "__name__", function)
+        worker = self._acquire(scope, deadline, name, timeout)
+        try:
+            worker.connection.send((function, args, kwargs))
+            completed = self._wait(worker, scope, deadline)
+            if completed:
+                succeeded, result = worker.connection.recv()
+        except (EOFError, OSError) as e:
+            self._replace(worker)
+            raise BrokenProcessPool(f"The worker running {name} stopped") from e
+        except BaseException:
+            self._replace(worker)
+            raise
+        if not completed:
+            # The call is running, its worker is stopped
+            self._replace(worker)
+            if scope is not None and scope.cancelled.done():
+                raise CancelledError()
+            raise EngineTimeoutError(f"{name} did not complete within {timeout} s")
+        self._release(worker)
+        if not succeeded:
+            raise result
+        return result
+
+    def _acquire(self, scope: CallScope | None, deadline: float | None, name: str, timeout: float | None):
+        """Wait for an idle worker, and take it.
+        """
+        with self._condition:
+            while True:
+                if scope is not None and scope.cancelled.done():
+                    raise CancelledError()
+                if self._idle:
+                    return self._idle.pop()
+                if not self._workers:
+                    raise BrokenProcessPool("The engine is shut down")
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise EngineTimeoutError(f"{name} did not complete within {timeout} s")
+                self._condition.wait(_POLL_INTERVAL if remaining is None else min(remaining, _POLL_INTERVAL))
+
+    def _wait(self, worker: _Worker, scope: CallScope | None, deadline: float | None):
+        """Wait for the result of the call of a worker.
+        Returns False if the call timed out or its scope was cancelled.
+        """
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return worker.connection.poll(0)
+            if scope is None:
+                return worker.connection.poll(remaining)
+            if worker.connection.poll(_POLL_INTERVAL if remaining is None else min(remaining, _POLL_INTERVAL)):
+                return True
+            if scope.cancelled.done():
+                return False
+
+    def _release(self, worker: _Worker):
+        """Give a worker back, unless the workers were stopped meanwhile.
+        """
+        with self._condition:
+            if worker in self._workers:
+                self._idle.append(worker)
+                self._condition.notify()
+
+    def _replace(self, worker: _Worker):
+        """Stop a worker, replaced by a new one unless the workers were stopped meanwhile.
+        """
+        with self._condition:
+            if worker in self._workers:
+                replacement = self._new_worker()
+                self._workers[self._workers.index(worker)] = replacement
+                self._idle.append(replacement)
+                self._condition.notify()
+        worker.stop()
@@ -1,87 +1,147 @@
 """Perform Wisse method for profile classification.
 Additionally include the application of a PCA for silhouette reduction.
 """
-from pathlib import Path
-import re
+import numpy as np
 import pandas as pd
-from manuscript_clusterer.engine.utils import expand_nomina_sacra
+from manuscript_clusterer.engine.rules import PROFILE_RULES_PATH, RuleSet
+from manuscript_clusterer.engine.normalize import VERSE_NORMALIZER
 
 
-PROFILE_RULES = pd.read_csv(str(Path(__file__).absolute().parent) + "/data/profile_rules.csv")
+PROFILE_RULES = pd.read_csv(PROFILE_RULES_PATH, index_col=0)
+PROFILE_RULESET = RuleSet(PROFILE_RULES)
 
 
-def evaluate_manuscript_profile(manuscript: dict[str, any],
-                                chapters: list[int],
-                                rule: pd.DataFrame = PROFILE_RULES):
-    """Evaluate a given manuscript and compute its profile.
+def _as_ruleset(rule: pd.DataFrame | RuleSet):
+    """Compile the rules if given as a DataFrame.
+    """
+    return rule if isinstance(rule, RuleSet) else RuleSet(rule)
 
-    #TODO: this is set to 0 if the alternative is present, otherwise 1
+
+def _verse_searcher(manuscript: dict[str, any], searchers: dict[tuple[str, str], any], ruleset: RuleSet, rule):
+    """Return the expanded content of the verse of a rule and the search of the
+    readings of the verse, both built once per verse.
+    Raises a KeyError if the manuscript does not contain the verse.
+    """
+    key = (str(rule.chapter), rule.verse)
+    if key not in searchers:
+        content = VERSE_NORMALIZER(manuscript[key[0]][key[1]])
+        searchers[key] = content, ruleset.matcher(*key).searcher(content)
+    return searchers[key]
+
+
+def evaluate_manuscript(manuscript: dict[str, any],
+                        chapters: list[int],
+                        rule: pd.DataFrame | RuleSet = PROFILE_RULESET):
+    """Evaluate a given manuscript in a single pass over the rules.
+    The rules are either a compiled RuleSet or a DataFrame of rules.
+
+    Returns the profile (1 for the reading, 0 for the alternative, -1 for a
+    missing verse), the readings (the matched text) and the positions of the
+    matches, as [start, end] offsets in the verse with expanded nomina sacra
+    (None without a match).
     """
-    readings = {}
+    profile, readings, positions = {}, {}, {}
+    searchers = {}
+    ruleset = _as_ruleset(rule)
     # Extract the profile for the given chapter
-    subrule = rule[rule.chapter.isin(chapters)]
-    for profile in subrule.iterrows():
+    for reading_rule in ruleset.for_chapters(chapters):
         try:
-            content = expand_nomina_sacra(
-                manuscript[str(profile[1]["chapter"])][str(profile[1]["verse"])])
-            reading = expand_nomina_sacra(str(profile[1]["reading"]))
-            alternative_reading = expand_nomina_sacra(str(profile[1]["alternative_reading"]))
-            # Check which one is longer and start with the longer one
-            if len(reading) >= len(alternative_reading):
-                if re.search(reading, content):
-                    readings[f'{profile[1]["chapter"]}:{str(profile[1]["verse"])}:{profile[1]["reading_id"]}'] = 1
-                elif ("omit" in reading) and (not re.search(alternative_reading, content)):
-                    readings[f'{profile[1]["chapter"]}:{str(profile[1]["verse"])}:{profile[1]["reading_id"]}'] = 1
+            content, search = _verse_searcher(manuscript, searchers, ruleset, reading_rule)
+        except KeyError:
+            profile[reading_rule.profile_key] = -1
+            readings[reading_rule.readings_key] = -1
+            positions[reading_rule.profile_key] = None
+            continue
+        # Check which one is longer and start with the longer one
+        if reading_rule.reading_first:
+            span = search(reading_rule.reading_pattern)
+            if span:
+                value, reading = 1, reading_rule.reading
+            else:
+                span = search(reading_rule.alternative_pattern)
+                if reading_rule.omit and not span:
+                    value, reading = 1, ""
+                elif span:
+                    value, reading = 0, reading_rule.alternative_reading
                 else:
-                    readings[f'{profile[1]["chapter"]}:{str(profile[1]["verse"])}:{profile[1]["reading_id"]}'] = 0
+                    value, reading = 0, content
+        else:
+            span = search(reading_rule.alternative_pattern)
+            if span:
+                value, reading = 0, reading_rule.alternative_reading
+            elif reading_rule.omit:
+                value, reading = 1, ""
             else:
-                if re.search(alternative_reading, content):
-                    readings[f'{profile[1]["chapter"]}:{str(profile[1]["verse"])}:{profile[1]["reading_id"]}'] = 0
-                elif ("omit" in reading):
-                    readings[f'{profile[1]["chapter"]}:{str(profile[1]["verse"])}:{profile[1]["reading_id"]}'] = 1
-                elif re.search(reading, content):
-                    readings[f'{profile[1]["chapter"]}:{str(profile[1]["verse"])}:{profile[1]["reading_id"]}'] = 1
+                span = search(reading_rule.reading_pattern)
+                if span:
+                    value, reading = 1, reading_rule.reading
                 else:
-                    readings[f'{profile[1]["chapter"]}:{str(profile[1]["verse"])}:{profile[1]["reading_id"]}'] = 0
-        except KeyError:
-            readings[f'{profile[1]["chapter"]}:{str(profile[1]["verse"])}:{profile[1]["reading_id"]}'] = -1
-    return readings
+                    value, reading = 0, content
+        profile[reading_rule.profile_key] = value
+        readings[reading_rule.readings_key] = reading
+        positions[reading_rule.profile_key] = list(span) if span else None
+    return profile, readings, positions
+
+
+def evaluate_manuscript_profile(manuscript: dict[str, any],
+                                chapters: list[int],
+                                rule: pd.DataFrame | RuleSet = PROFILE_RULESET):
+    """Evaluate a given manuscript and compute its profile.
+    The rules are either a compiled RuleSet or a DataFrame of rules.
+
+    #TODO: this is set to 0 if the alternative is present, otherwise 1
+    """
+    return evaluate_manuscript(manuscript, chapters, rule)[0]
 
 
 def evaluate_manuscript_readings(manuscript: dict[str, any],
                                 chapters: list[int],
-                                rule: pd.DataFrame = PROFILE_RULES):
+                                rule: pd.DataFrame | RuleSet = PROFILE_RULESET):
     """Evaluate the readings value of a given manuscript.
+    The rules are either a compiled RuleSet or a DataFrame of rules.
     """
-    readings = {}
-    # Extract the profile for the given chapter
-    subrule = rule[rule.chapter.isin(chapters)]
-    for profile in subrule.iterrows():
-        try:
-            content = expand_nomina_sacra(
-                manuscript[str(profile[1]["chapter"])][str(profile[1]["verse"])])
-            reading = expand_nomina_sacra(str(profile[1]["reading"]))
-            alternative_reading = expand_nomina_sacra(str(profile[1]["alternative_reading"]))
-            # Check which one is longer and start with the longer one
-            if len(reading) >= len(alternative_reading):
-                if re.search(reading, content):
-                    readings[f'{profile[1]["chapter"]}:{profile[1]["reading_id"]}'] = reading
-                elif ("omit" in reading) and (not re.search(alternative_reading, content)):
-                    readings[f'{profile[1]["chapter"]}:{profile[1]["reading_id"]}'] = ""
-                elif re.search(alternative_reading, content):
-                    readings[f'{profile[1]["chapter"]}:{profile[1]["reading_id"]}'] = alternative_reading
-                else:
-                    readings[f'{profile[1]["chapter"]}:{profile[1]["reading_id"]}'] = content
-            else:
-                if re.search(alternative_reading, content):
-                    readings[f'{profile[1]["chapter"]}:{profile[1]["reading_id"]}'] = alternative_reading
-                elif ("omit" in reading):
-                    readings[f'{profile[1]["chapter"]}:{profile[1]["reading_id"]}'] = ""
-                elif re.search(reading, content):
-                    readings[f'{profile[1]["chapter"]}:{profile[1]["reading_id"]}'] = reading
-                else:
-                    readings[f'{profile[1]["chapter"]}:{profile[1]["reading_id"]}'] = content
-        except KeyError:
-            readings[f'{profile[1]["chapter"]}:{profile[1]["reading_id"]}'] = -1
+    return evaluate_manuscript(manuscript, chapters, rule)[1]
+
+
+def evaluate_corpus_profiles(manuscripts: dict[str, dict[str, any]],
+                             chapters: list[int],
+                             rule: pd.DataFrame | RuleSet = PROFILE_RULESET):
+    """Evaluate the profiles of many manuscripts at once.
+
+    The expanded texts of each (chapter, verse) form a column over the
+    manuscripts, and each rule is searched over its whole column in a single
+    string operation (a pattern is searched once per column).
+    Returns the (manuscripts x rules) int8 profile DataFrame, with the same
+    values and keys as `evaluate_manuscript_profile`.
+    """
+    manuscript_ids = list(manuscripts.keys())
+    columns = {}
+    searches = {}
+    profiles = {}
+
+    def search(key, pattern):
+        """Search a pattern over the column of a verse, once.
+        """
+        if (key, pattern.pattern) not in searches:
+            searches[key, pattern.pattern] = columns[key].str.contains(pattern, na=False).to_numpy()
+        return searches[key, pattern.pattern]
 
-    return readings
\ No newline at end of file
+    for reading_rule in _as_ruleset(rule).for_chapters(chapters):
+        key = (str(reading_rule.chapter), reading_rule.verse)
+        if key not in columns:
+            # Identical verses are only expanded once
+            codes, texts = pd.factorize(pd.Series([manuscripts[manuscript_id].get(key[0], {}).get(key[1])
+                                                   for manuscript_id in manuscript_ids], dtype=object))
+            # The code -1 of a missing verse selects the trailing None
+            expanded = np.array(VERSE_NORMALIZER.normalize_many(texts) + [None], dtype=object)
+            columns[key] = pd.Series(expanded[codes], dtype=object)
+        reading = search(key, reading_rule.reading_pattern)
+        # Check which one is longer and start with the longer one
+        if reading_rule.reading_first:
+            value = reading | (reading_rule.omit & ~search(key, reading_rule.alternative_pattern))
+        else:
+            value = ~search(key, reading_rule.alternative_pattern) & (reading_rule.omit | reading)
+        profile = value.astype(np.int8)
+        profile[columns[key].isna().to_numpy()] = -1
+        profiles[reading_rule.profile_key] = profile
+    return pd.DataFrame(profiles, index=manuscript_ids, dtype=np.int8)
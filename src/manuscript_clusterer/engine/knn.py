@@ -0,0 +1,121 @@
+"""Sparse k-nearest-neighbours graph of the manuscripts.
+
+The graph is built blockwise from the sparse Jaccard engine: the distances of
+a block of manuscripts to the whole corpus are computed, only the k closest
+are kept, and the block is discarded. The memory used is thus O(N.k) (plus one
+block), the N x N distance matrix is never materialized.
+"""
+import numpy as np
+from scipy import sparse
+from manuscript_clusterer.engine.distances import encode_verses, jaccard_distance_block
+
+
+# Pipelines of the content clustering and projection: full distance matrix or kNN graph
+CONTENT_MODES = ("dense", "knn")
+
+
+def compute_knn_graph(content: dict[str, dict[str, str]],
+                      n_neighbors: int = 15,
+                      block_size: int = 256):
+    """Compute the k nearest neighbours of every manuscript for the summed Jaccard distance.
+
+    Returns the manuscript keys, and the (manuscripts x k) indexes and distances
+    of the neighbours sorted by distance, each manuscript being its own first neighbour.
+    """
+    manuscript_keys, encoded = encode_verses(content)
+    n_manuscripts = len(manuscript_keys)
+    n_neighbors = min(n_neighbors, n_manuscripts)
+    indexes = np.arange(n_manuscripts)
+    knn_indices = np.zeros((n_manuscripts, n_neighbors), dtype=np.int64)
+    knn_distances = np.zeros((n_manuscripts, n_neighbors))
+    for start in range(0, n_manuscripts, block_size):
+        rows = indexes[start:start + block_size]
+        distance_block = jaccard_distance_block(encoded, rows, indexes)
+        # The manuscript itself comes first, even when tied with a duplicate
+        distance_block[np.arange(len(rows)), rows] = -1
+        nearest = np.argpartition(distance_block, n_neighbors - 1, axis=1)[:, :n_neighbors]
+        nearest_distances = np.take_along_axis(distance_block, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1, kind="stable")
+        knn_indices[rows] = np.take_along_axis(nearest, order, axis=1)
+        knn_distances[rows] = np.maximum(np.take_along_axis(nearest_distances, order, axis=1), 0)
+    return manuscript_keys, knn_indices, knn_distances
+
+
+def knn_distance_graph(knn_indices: np.ndarray, knn_distances: np.ndarray):
+    """Build the symmetric sparse distance graph of the neighbours.
+    """
+    n_manuscripts = len(knn_indices)
+    rows = np.repeat(np.arange(n_manuscripts), knn_indices.shape[1])
+    graph = sparse.csr_matrix((knn_distances.ravel(), (rows, knn_indices.ravel())),
+                              shape=(n_manuscripts, n_manuscripts))
+    graph = graph.maximum(graph.T).tocsr()
+    graph.setdiag(0)
+    graph.eliminate_zeros()
+    return graph
+
+
+def knn_affinity_graph(knn_indices: np.ndarray, knn_distances: np.ndarray):
+    """Build the symmetric sparse affinity graph of the neighbours.
+    The affinity is a Gaussian kernel scaled by the distance of each
+    manuscript to its farthest neighbour (self-tuning spectral clustering).
+    """
+    n_manuscripts = len(knn_indices)
+    scales = knn_distances[:, -1]
+    scales = np.where(scales > 0, scales, max(scales.max(), 1.0))
+    affinities = np.exp(-knn_distances ** 2 / (scales[:, None] * scales[knn_indices]))
+    rows = np.repeat(np.arange(n_manuscripts), knn_indices.shape[1])
+    affinity = sparse.csr_matrix((affinities.ravel(), (rows, knn_indices.ravel())),
+                                 shape=(n_manuscripts, n_manuscripts))
+    affinity = affinity.maximum(affinity.T).tocsr()
+    affinity.setdiag(0)
+    affinity.eliminate_zeros()
+    return affinity
+
+
+def eigengap_n_clusters(affinity: sparse.csr_matrix,
+                        min_clusters: int = 2,
+                        max_clusters: int = 10):
+    """Select the number of clusters by the largest relative gap between the
+    smallest eigenvalues of the normalized Laplacian of the affinity graph.
+    The gap is relative to the eigenvalue closing it, so that a graph made of
+    disconnected components selects the number of components.
+    """
+    n_manuscripts = affinity.shape[0]
+    from scipy.sparse.linalg import eigsh
+    n_eigenvalues = min(max_clusters + 1, n_manuscripts)
+    degrees = np.asarray(affinity.sum(axis=1)).ravel()
+    scaling = sparse.diags(1 / np.sqrt(np.where(degrees > 0, degrees, 1)))
+    normalized = scaling @ affinity @ scaling
+    if n_eigenvalues >= n_manuscripts - 1:
+        eigenvalues = np.linalg.eigvalsh(normalized.toarray())
+    else:
+        eigenvalues = eigsh(normalized, k=n_eigenvalues, which="LA", return_eigenvectors=False)
+    # Eigenvalues of the normalized Laplacian, in ascending order, rounding off the null ones
+    eigenvalues = np.sort(1 - eigenvalues)[:n_eigenvalues]
+    eigenvalues[eigenvalues < 1e-10] = 0
+    gaps = np.divide(np.diff(eigenvalues), eigenvalues[1:],
+                     out=np.zeros(len(eigenvalues) - 1),
+                     where=eigenvalues[1:] > 0)
+    candidates = np.arange(1, len(eigenvalues))
+    valid = candidates >= min_clusters
+    if not valid.any():
+        raise ValueError("Not enough manuscripts to select a number of clusters")
+    return int(candidates[valid][np.argmax(gaps[valid])])
+
+
+def cluster_knn_graph(knn_indices: np.ndarray,
+                      knn_distances: np.ndarray,
+                      n_clusters: int = None,
+                      max_clusters: int = 10):
+    """Cluster the manuscripts by spectral clustering of their kNN graph.
+    The number of clusters is selected by the eigengap heuristic if not given.
+    """
+    from sklearn.cluster import SpectralClustering
+    affinity = knn_affinity_graph(knn_indices, knn_distances)
+    if n_clusters is None:
+        n_clusters = eigengap_n_clusters(affinity, max_clusters=max_clusters)
+    clusterer = SpectralClustering(n_clusters=n_clusters,
+                                   affinity="precomputed",
+                                   assign_labels="cluster_qr",
+                                   random_state=42)
+    return clusterer.fit_predict(affinity)
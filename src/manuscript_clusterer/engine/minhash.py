@@ -0,0 +1,135 @@
+"""MinHash signatures and LSH index for nearest manuscript queries.
+
+A chapter of a manuscript is represented by the set of the character shingles
+of its verses (each shingle is prefixed by its verse, so that the same words
+in different verses do not match). Its MinHash signature estimates the Jaccard
+similarity between two such sets, and the LSH index splits the signatures into
+bands so that only the manuscripts sharing at least one band are compared.
+"""
+from zlib import crc32
+import numpy as np
+
+
+# Mersenne prime used by the universal hashing of the shingles
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Default signature length and number of LSH bands (bands of 4 rows)
+NUM_PERM = 128
+NUM_BANDS = 32
+
+
+def verse_shingles(verses: dict[str, str], size: int = 5):
+    """Hash the character shingles of the verses of a chapter.
+    The whitespace is normalized, and a verse shorter than a shingle is kept whole.
+    """
+    shingles = set()
+    for verse, text in verses.items():
+        text = " ".join(text.split())
+        for start in range(max(len(text) - size + 1, 1 if text else 0)):
+            shingles.add(crc32(f"{verse}:{text[start:start + size]}".encode("utf-8")))
+    return np.array(sorted(shingles), dtype=np.uint64)
+
+
+def _permutations(num_perm: int, seed: int):
+    """Draw the parameters of the hash functions, small enough not to overflow.
+    """
+    rng = np.random.RandomState(seed)
+    return (rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64),
+            rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64))
+
+
+def minhash_signature(shingles: np.ndarray,
+                      num_perm: int = NUM_PERM,
+                      seed: int = 1):
+    """Compute the MinHash signature of a set of hashed shingles.
+    An empty set has a signature made only of the maximal hash.
+    """
+    if not len(shingles):
+        return np.full(num_perm, _MAX_HASH, dtype=np.uint64)
+    a, b = _permutations(num_perm, seed)
+    hashes = (shingles[:, None] * a[None, :] + b[None, :]) % _MERSENNE_PRIME & _MAX_HASH
+    return hashes.min(axis=0)
+
+
+def compute_minhash_signatures(content: dict[str, dict[str, str]],
+                               num_perm: int = NUM_PERM):
+    """Compute the MinHash signature of every chapter of a manuscript content,
+    as lists of integers ready to be stored.
+    """
+    return {chapter: minhash_signature(verse_shingles(verses), num_perm=num_perm).tolist()
+            for chapter, verses in content.items()}
+
+
+def estimate_similarity(signature_1, signature_2):
+    """Estimate the Jaccard similarity between two signatures.
+    """
+    return float(np.mean(np.asarray(signature_1) == np.asarray(signature_2)))
+
+
+class MinHashLSH:
+    """Banded LSH index over MinHash signatures.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, num_bands: int = NUM_BANDS):
+        """Initialize an empty index.
+        """
+        if num_perm % num_bands:
+            raise ValueError("The number of permutations must be a multiple of the number of bands")
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.rows = num_perm // num_bands
+        self.buckets = [{} for _ in range(num_bands)]
+        self.signatures = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, key: str):
+        return key in self.signatures
+
+    def _bands(self, signature: np.ndarray):
+        """Split a signature into the hashable keys of its bands.
+        """
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes()
+                for band in range(self.num_bands)]
+
+    def insert(self, key: str, signature):
+        """Insert (or replace) the signature of a manuscript.
+        """
+        signature = np.asarray(signature, dtype=np.uint64)
+        if len(signature) != self.num_perm:
+            raise ValueError(f"Expected a signature of length {self.num_perm}, got {len(signature)}")
+        self.remove(key)
+        self.signatures[key] = signature
+        for buckets, band in zip(self.buckets, self._bands(signature)):
+            buckets.setdefault(band, set()).add(key)
+
+    def remove(self, key: str):
+        """Remove the signature of a manuscript, if indexed.
+        """
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for buckets, band in zip(self.buckets, self._bands(signature)):
+            buckets[band].discard(key)
+            if not buckets[band]:
+                del buckets[band]
+
+    def candidates(self, signature):
+        """Return the manuscripts sharing at least one band with the signature.
+        """
+        signature = np.asarray(signature, dtype=np.uint64)
+        candidates = set()
+        for buckets, band in zip(self.buckets, self._bands(signature)):
+            candidates |= buckets.get(band, set())
+        return candidates
+
+    def query(self, key: str, k: int = None):
+        """Return the (up to) k candidates most similar to an indexed manuscript,
+        as (key, estimated similarity) pairs by decreasing similarity.
+        """
+        signature = self.signatures[key]
+        neighbors = [(other, estimate_similarity(signature, self.signatures[other]))
+                     for other in self.candidates(signature) if other != key]
+        return sorted(neighbors, key=lambda neighbor: (-neighbor[1], neighbor[0]))[:k]
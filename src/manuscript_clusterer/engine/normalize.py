@@ -0,0 +1,189 @@
+"""Normalization of the texts of the manuscripts.
+
+The tables and regular expressions are built once (at import, or on first use
+for the Unicode tables), and a normalizer keeps an LRU cache of the texts it
+has normalized. The normalizations are applied in the following order:
+control characters removal, Unicode composition (NFC, so that the nomina sacra
+match), punctuation removal, nomina sacra expansion, and finally conversion to
+the requested Unicode normal form.
+"""
+from collections import OrderedDict
+from functools import cache
+import re
+import sys
+import unicodedata
+
+
+# Nomina sacra and their expanded forms (a later entry overrides an earlier one)
+NOMINA_SACRA = {
+    # Nominative forms
+    'θς': 'θεος', 'κς': 'κυριος', 'ἰης': 'ιησους', 'δαυ': 'δαυιδ', 'ις': 'ιησους',
+    'πνα': 'πνευμα', 'ισρλ': 'ισραηλ', 'χσ': 'χριστος', 'ισαακ': 'ισαακ', 'ισλ': 'ισραηλ', 'ἰσ': 'ιησους',
+    "ιηλ": "ισραηλ",
+    # Genitive forms
+    'θυ': 'θεου', 'κυ': 'κυριου', 'ἰησ': 'ιησου', 'δαυ': 'δαυιδ',
+    'πνυ': 'πνευματος', 'ισρλ': 'ισραηλ', 'χυ': 'χριστου', 'ισαακ': 'ισαακ', 'ουνου': 'ουρανου',
+    'ιυ': 'ιησου',  # Additional form for Jesus
+    # Accusative forms
+    'θν': 'θεον', 'κν': 'κυριον', 'ἰησ': 'ιησους', 'δαυ': 'δαυιδ',
+    'πνα': 'πνευμα', 'ισρλ': 'ισραηλ', 'χν': 'χριστον', 'ισαακ': 'ισαακ',
+    # Dative forms
+    'θω': 'θεω', 'κω': 'κυριω', 'ἰης': 'ιησου', 'δαυ': 'δαυιδ',
+    'πνα': 'πνευματι', 'ισρλ': 'ισραηλ', 'χω': 'χριστω', 'ισαακ': 'ισαακ', 'ανων': 'ανδροπον',
+    'ιυ': 'ιησου',  # Additional form for Jesus
+    # Vocative forms
+    'κε': 'κυριε'
+}
+
+_NOMINA_SACRA_PATTERN = re.compile(r'\b(' + '|'.join(re.escape(ns) for ns in NOMINA_SACRA) + r')\b')
+
+UNICODE_FORMS = ("NFC", "NFD", "NFKC", "NFKD")
+
+
+def _replace_nomina_sacra(match: re.Match):
+    """Replace a nomen sacrum with its expanded form.
+    """
+    return NOMINA_SACRA[match[0]]
+
+
+@cache
+def _category_pattern(categories: str):
+    """Compile a character class of all the code points of the given Unicode categories
+    (first letters of the categories), built on first use.
+    """
+    ranges = []
+    start = None
+    for code_point in range(sys.maxunicode + 2):
+        inside = code_point <= sys.maxunicode and unicodedata.category(chr(code_point))[0] in categories
+        if inside and start is None:
+            start = code_point
+        elif not inside and start is not None:
+            ranges.append(f"{re.escape(chr(start))}-{re.escape(chr(code_point - 1))}")
+            start = None
+    return re.compile(f"[{''.join(ranges)}]+")
+
+
+def remove_control_characters(text: str):
+    """Remove the control characters (Unicode category C) from a text.
+    """
+    if text.isprintable():
+        return text
+    return _category_pattern("C").sub("", text)
+
+
+def remove_punctuation(text: str):
+    """Remove the punctuation (Unicode category P) from a text.
+    """
+    return _category_pattern("P").sub("", text)
+
+
+def expand_nomina_sacra(text: str):
+    """Expand the nomina sacra in the text.
+    """
+    return _NOMINA_SACRA_PATTERN.sub(_replace_nomina_sacra, text)
+
+
+class Normalizer:
+    """Pipeline of normalizations, with an LRU cache of the normalized texts.
+    """
+
+    def __init__(self,
+                 nomina_sacra: bool = True,
+                 control_characters: bool = False,
+                 punctuation: bool = False,
+                 unicode_form: str = None,
+                 cache_size: int = 16384):
+        """Select the normalizations applied.
+        `unicode_form` is the Unicode normal form of the output, left as is by default.
+        """
+        if unicode_form is not None and unicode_form not in UNICODE_FORMS:
+            raise ValueError(f"Unknown Unicode normal form {unicode_form}")
+        self.nomina_sacra = nomina_sacra
+        self.control_characters = control_characters
+        self.punctuation = punctuation
+        self.unicode_form = unicode_form
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _prepare(self, text: str):
+        """Apply the normalizations preceding the nomina sacra expansion.
+        """
+        if self.control_characters:
+            text = remove_control_characters(text)
+        if self.unicode_form is not None:
+            text = unicodedata.normalize("NFC", text)
+        if self.punctuation:
+            text = remove_punctuation(text)
+        return text
+
+    def _finish(self, text: str):
+        """Convert the text to the requested normal form.
+        """
+        if self.unicode_form not in (None, "NFC"):
+            text = unicodedata.normalize(self.unicode_form, text)
+        return text
+
+    def _normalize(self, text: str):
+        """Normalize a single text.
+        """
+        text = self._prepare(text)
+        if self.nomina_sacra:
+            text = expand_nomina_sacra(text)
+        return self._finish(text)
+
+    def _store(self, text: str, normalized: str):
+        """Store a normalized text in the cache, evicting the least recently used.
+        """
+        self._cache[text] = normalized
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _lookup(self, text: str):
+        """Return the cached normalization of a text, None if absent.
+        """
+        normalized = self._cache.get(text)
+        if normalized is not None:
+            try:
+                self._cache.move_to_end(text)
+            except KeyError:
+                # Evicted meanwhile by another thread
+                pass
+        return normalized
+
+    def __call__(self, text: str):
+        """Normalize a text, through the cache.
+        """
+        normalized = self._lookup(text)
+        if normalized is None:
+            normalized = self._normalize(text)
+            self._store(text, normalized)
+        return normalized
+
+    def normalize_many(self, texts: list[str]):
+        """Normalize many texts at once, through the cache.
+        Each distinct text is normalized once, and the cache is updated in bulk.
+        """
+        texts = list(texts)
+        normalized = dict.fromkeys(texts)
+        missing = []
+        for text in normalized:
+            result = self._lookup(text)
+            if result is None:
+                missing.append(text)
+            else:
+                normalized[text] = result
+        for text in missing:
+            normalized[text] = self._normalize(text)
+        self._cache.update((text, normalized[text]) for text in missing)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return [normalized[text] for text in texts]
+
+    def cache_clear(self):
+        """Empty the cache.
+        """
+        self._cache.clear()
+
+
+# Normalization of the content of the manuscripts: nomina sacra expansion only
+VERSE_NORMALIZER = Normalizer()
@@ -0,0 +1,100 @@
+"""Columnar in-memory representation of the Wisse profiles.
+
+The profiles of the corpus are stored as a single dense int8
+(manuscripts x readings) matrix, indexed by the manuscript ids and the reading
+keys. Subsets of manuscripts share the matrix of the corpus and only keep the
+indexes of their rows.
+"""
+import numpy as np
+import pandas as pd
+from manuscript_clusterer.engine.distances import hamming_distance_block, pack_profiles, profiles_to_array
+
+
+class ProfileMatrix:
+    """Dense int8 matrix of the profiles of a set of manuscripts.
+    """
+
+    def __init__(self,
+                 manuscript_ids: list[str],
+                 reading_keys: list[str],
+                 values: np.ndarray,
+                 rows: np.ndarray = None):
+        """Initialize the matrix.
+        `rows` selects the rows of `values` belonging to the matrix, all of them by default.
+        """
+        self._values = values
+        self._rows = rows
+        self._packed = None
+        self.manuscript_ids = list(manuscript_ids)
+        self.reading_keys = list(reading_keys)
+        self.index = {manuscript_id: i for i, manuscript_id in enumerate(self.manuscript_ids)}
+
+    @classmethod
+    def from_profiles(cls, profiles: dict[str, dict[str, int]]):
+        """Build the matrix from the profile dictionaries.
+        A reading absent from a profile is stored as missing (-1).
+        """
+        manuscript_ids, reading_keys, values = profiles_to_array(profiles, strict_keys=False)
+        return cls(manuscript_ids, reading_keys, values)
+
+    def __len__(self):
+        return len(self.manuscript_ids)
+
+    @property
+    def rows(self):
+        """Indexes of the rows of the matrix within the shared values.
+        """
+        if self._rows is None:
+            return np.arange(len(self._values))
+        return self._rows
+
+    @property
+    def values(self):
+        """The (manuscripts x readings) int8 values.
+        Only a subset materializes its own rows.
+        """
+        if self._rows is None:
+            return self._values
+        return self._values[self._rows]
+
+    @property
+    def packed(self):
+        """The profiles of the shared values packed as bitplanes, computed once.
+        """
+        if self._packed is None:
+            self._packed = pack_profiles(self._values)
+        return self._packed
+
+    def subset(self, manuscript_ids: list[str]):
+        """Select a subset of manuscripts, ignoring the unknown ones.
+        The subset shares the values (and packed bitplanes) of this matrix.
+        """
+        manuscript_ids = [manuscript_id for manuscript_id in manuscript_ids if manuscript_id in self.index]
+        subset = ProfileMatrix(manuscript_ids,
+                               self.reading_keys,
+                               self._values,
+                               rows=self.rows[[self.index[manuscript_id] for manuscript_id in manuscript_ids]])
+        subset._packed = self._packed
+        return subset
+
+    def chapter(self, chapter: str):
+        """Select the readings of a chapter.
+        """
+        columns = [i for i, key in enumerate(self.reading_keys) if key.split(":")[0] == chapter]
+        return ProfileMatrix(self.manuscript_ids,
+                             [self.reading_keys[i] for i in columns],
+                             self.values[:, columns])
+
+    def distance_matrix(self, missing: str = "strict"):
+        """Compute the Hamming distance matrix between the manuscripts.
+        """
+        if self._packed is None and self._rows is not None:
+            packed, rows = pack_profiles(self.values), np.arange(len(self))
+        else:
+            packed, rows = self.packed, self.rows
+        return hamming_distance_block(packed, rows, rows, missing=missing)
+
+    def to_dataframe(self):
+        """Return the matrix as a DataFrame indexed by the manuscript ids.
+        """
+        return pd.DataFrame(self.values, index=self.manuscript_ids, columns=self.reading_keys)
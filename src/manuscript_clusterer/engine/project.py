@@ -1,30 +1,330 @@
 """Various functions to perform the clustering of the functions.
+
+The projections are computed by interchangeable backends: UMAP (non-linear,
+slower) for both sources, and the linear MCA and PCA for the binary profiles,
+and classical MDS for the textual distance matrices (both fast, by randomized
+SVD). Every backend can place new data onto its fitted projection.
+
+The fitted backends of the incremental projections are stored in files, and
+only their path is exchanged with the engine: the models (and the UMAP they
+import) stay in the processes of the engine, which read each file once.
 """
+from collections import OrderedDict
+import os
+import warnings
+import joblib
+import numpy as np
 import pandas as pd
-from umap import UMAP
 from manuscript_clusterer.engine.cluster import compute_distance_matrix_text
+from manuscript_clusterer.engine.distances import encode_verses, jaccard_distance_block
+from manuscript_clusterer.engine.knn import compute_knn_graph, knn_distance_graph
+
+
+# Parameters of the projections, part of the key of the cached projections
+PROJECTION_PARAMS = {"n_components": 3, "random_state": 42}
+
+
+class UMAPProjection:
+    """UMAP projection of the profiles, or of a precomputed distance matrix.
+    """
+    sources = ("profiles", "content")
+
+    def __init__(self, source: str):
+        """Initialize the backend for a source ("profiles" or "content").
+        UMAP is imported on use, as its import compiles (numba) for seconds.
+        """
+        from umap import UMAP
+        self.model = UMAP(**PROJECTION_PARAMS, metric="precomputed" if source == "content" else "euclidean")
+
+    def fit_transform(self, data: pd.DataFrame | np.ndarray):
+        """Fit the projection and return the coordinates of the data.
+        """
+        return self.model.fit_transform(data)
+
+    def transform(self, data: pd.DataFrame | np.ndarray):
+        """Place new data onto the fitted projection.
+        For the content, the data are the distances from the new manuscripts to the fitted ones.
+        """
+        with warnings.catch_warnings():
+            # The distances are the distances from the new manuscripts to the fitted ones, as assumed
+            warnings.filterwarnings("ignore", message="Transforming new data with precomputed metric")
+            return self.model.transform(data)
 
 
-def perform_projection_profiles(profile: list[dict[str, any]]):
+class MCAProjection:
+    """Multiple correspondence analysis of the binary profiles.
+    """
+    sources = ("profiles",)
+
+    def __init__(self, source: str):
+        import prince
+        self.model = prince.MCA(**PROJECTION_PARAMS, one_hot=False, check_input=False, engine="sklearn")
+        self.active_columns = None
+
+    def _indicator(self, profile_df: pd.DataFrame):
+        """Build the indicator matrix of the readings (absent and present) as a single float block.
+        The readings absent from all the fitted profiles are dropped.
+        """
+        values = profile_df.to_numpy()
+        indicator = np.concatenate([values == 0, values == 1], axis=1)
+        if self.active_columns is None:
+            self.active_columns = indicator.any(axis=0)
+        return pd.DataFrame(indicator[:, self.active_columns].astype(np.float64), index=profile_df.index)
+
+    def fit_transform(self, profile_df: pd.DataFrame):
+        """Fit the projection and return the coordinates of the profiles.
+        """
+        indicator = self._indicator(profile_df)
+        return self.model.fit(indicator).row_coordinates(indicator).to_numpy()
+
+    def transform(self, profile_df: pd.DataFrame):
+        """Place new profiles onto the fitted projection.
+        """
+        return self.model.row_coordinates(self._indicator(profile_df)).to_numpy()
+
+
+class PCAProjection:
+    """Principal component analysis of the binary profiles.
+    """
+    sources = ("profiles",)
+
+    def __init__(self, source: str):
+        import prince
+        self.model = prince.PCA(**PROJECTION_PARAMS, rescale_with_std=False, engine="sklearn")
+
+    def fit_transform(self, profile_df: pd.DataFrame):
+        """Fit the projection and return the coordinates of the profiles.
+        """
+        return self.model.fit(profile_df.astype(np.float64)).transform(profile_df.astype(np.float64)).to_numpy()
+
+    def transform(self, profile_df: pd.DataFrame):
+        """Place new profiles onto the fitted projection.
+        """
+        return self.model.transform(profile_df.astype(np.float64)).to_numpy()
+
+
+class MDSProjection:
+    """Classical (Torgerson) multidimensional scaling of a distance matrix.
+    The leading eigenvectors of the double-centered squared distances are found by randomized SVD.
+    """
+    sources = ("content",)
+
+    def __init__(self, source: str):
+        self.means = None
+        self.grand_mean = None
+        self.scaled_vectors = None
+
+    def _center(self, squared: np.ndarray):
+        """Double-center squared distances with the means of the fitted distances.
+        """
+        return -0.5 * (squared - squared.mean(axis=1, keepdims=True) - self.means + self.grand_mean)
+
+    def fit_transform(self, distances: np.ndarray):
+        """Fit the projection and return the coordinates of the points of the distance matrix.
+        """
+        from sklearn.utils.extmath import randomized_svd
+        squared = np.asarray(distances, dtype=np.float64) ** 2
+        self.means = squared.mean(axis=0)
+        self.grand_mean = self.means.mean()
+        centered = self._center(squared)
+        n_components = min(PROJECTION_PARAMS["n_components"], len(centered))
+        vectors, _, _ = randomized_svd(centered, n_components, random_state=PROJECTION_PARAMS["random_state"])
+        # The singular values are the absolute eigenvalues, the negative ones are discarded
+        eigenvalues = np.einsum("ij,ij->j", vectors, centered @ vectors)
+        scales = np.sqrt(np.clip(eigenvalues, 0, None))
+        self.scaled_vectors = vectors * np.divide(1, scales, out=np.zeros_like(scales), where=scales > 0)
+        return vectors * scales
+
+    def transform(self, distances: np.ndarray):
+        """Place new points from their distances to the fitted points (Gower's formula).
+        """
+        return self._center(np.asarray(distances, dtype=np.float64) ** 2) @ self.scaled_vectors
+
+
+# Backends of the projection methods, new methods are registered here
+PROJECTION_BACKENDS = {
+    "umap": UMAPProjection,
+    "mca": MCAProjection,
+    "pca": PCAProjection,
+    "mds": MDSProjection,
+}
+
+
+def check_projection(method: str, source: str, mode: str = "dense"):
+    """Check that a projection method is available for a source ("profiles" or "content"),
+    and for the mode of the content ("dense" or "knn").
+    """
+    if method not in PROJECTION_BACKENDS or source not in PROJECTION_BACKENDS[method].sources:
+        raise ValueError(f"Unknown projection method {method} for the {source}")
+    if source == "content" and mode == "knn" and method != "umap":
+        raise ValueError("The knn mode is only projected by UMAP")
+
+
+def make_projection(method: str, source: str):
+    """Instantiate the backend of a projection method for a source ("profiles" or "content").
+    """
+    check_projection(method, source)
+    return PROJECTION_BACKENDS[method](source)
+
+
+def perform_projection_profiles(profile: list[dict[str, any]] | pd.DataFrame,
+                                method: str = "umap"):
     """Perform a projection given profiles, i.e. binary values for a given manuscript.
+    The profiles are either a dictionary or a DataFrame indexed by the manuscripts.
 
     #TODO: think about -1 data!!!
     """
-    profile_df = pd.DataFrame(profile).T
-    # Remove -1 data
-    profile_df = profile_df[~(profile_df == -1).any(axis=1)]
-    transformer = UMAP(n_components=3,
-                       random_state=42)
+    profile_df = _complete_profiles(profile)
+    _, embedding = fit_projection_profiles(profile_df, method=method)
+    return profile_df.to_dict(orient="index"), embedding
+
+
+def _complete_profiles(profile: list[dict[str, any]] | pd.DataFrame):
+    """Build the DataFrame of the profiles, without the profiles with missing (-1) data.
+    """
+    profile_df = profile if isinstance(profile, pd.DataFrame) else pd.DataFrame(profile).T
+    return profile_df[~(profile_df == -1).any(axis=1)]
+
+
+def _embedding(transformed: np.ndarray, manuscript_keys: list[str]):
+    """Index the coordinates of a projection by the manuscripts.
+    """
+    return pd.DataFrame(transformed, index=manuscript_keys).to_dict(orient="index")
+
+
+def fit_projection_profiles(profile: list[dict[str, any]] | pd.DataFrame,
+                            method: str = "umap"):
+    """Fit the projection of the profiles.
+    Returns the fitted backend and the coordinates of the manuscripts.
+    """
+    profile_df = _complete_profiles(profile)
+    transformer = make_projection(method, "profiles")
     transformed = transformer.fit_transform(profile_df)
-    return profile_df.to_dict(orient="index"), pd.DataFrame(transformed, index=profile_df.index).to_dict(orient="index")
+    return transformer, _embedding(transformed, list(profile_df.index))
+
 
+def transform_projection_profiles(transformer, profile: list[dict[str, any]] | pd.DataFrame):
+    """Place new profiles onto a fitted projection, without moving the fitted manuscripts.
+    The profiles must have the readings (columns) the model was fitted on.
+    """
+    profile_df = _complete_profiles(profile)
+    if profile_df.empty:
+        return {}
+    return _embedding(transformer.transform(profile_df), list(profile_df.index))
 
-def perform_projection_content(content: list[dict[str, any]]):
+
+def perform_projection_content(content: list[dict[str, any]],
+                               method: str = "umap"):
     """Perform a projection using textual distances between textual content.
     """
+    _, distance_matrix, embedding = fit_projection_content(content, method=method)
+    return distance_matrix, embedding
+
+
+def fit_projection_content(content: dict[str, dict[str, str]],
+                           method: str = "umap"):
+    """Fit the projection of the textual distances between the manuscripts.
+    Returns the fitted backend, the distance matrix and the coordinates of the manuscripts.
+    """
     manuscript_keys, distance_matrix = compute_distance_matrix_text(content)
-    transformer = UMAP(n_components=3,
-                       random_state=42,
-                       metric="precomputed")
+    transformer = make_projection(method, "content")
     transformed = transformer.fit_transform(distance_matrix)
-    return distance_matrix, pd.DataFrame(transformed, index=manuscript_keys).to_dict(orient="index")
+    return transformer, distance_matrix, _embedding(transformed, manuscript_keys)
+
+
+def transform_projection_content(transformer,
+                                 fitted_content: dict[str, dict[str, str]],
+                                 content: dict[str, dict[str, str]]):
+    """Place new manuscripts onto a fitted projection of the textual distances.
+    `fitted_content` holds the content of the manuscripts the model was fitted on, in the order of the fit.
+    Only the distances from the new manuscripts to the fitted ones are computed.
+    """
+    if not content:
+        return {}
+    manuscript_keys, encoded = encode_verses({**{("fitted", key): value for key, value in fitted_content.items()},
+                                              **{("new", key): value for key, value in content.items()}})
+    n_fitted = len(fitted_content)
+    distances = jaccard_distance_block(encoded,
+                                       np.arange(n_fitted, len(manuscript_keys)),
+                                       np.arange(n_fitted))
+    return _embedding(transformer.transform(distances), list(content))
+
+
+# Fitted backends read by this process, by path of their file
+_FITTED_BACKENDS = OrderedDict()
+_FITTED_BACKENDS_SIZE = 8
+
+
+def _remember_backend(path: str, fitted: tuple):
+    """Keep a fitted backend of this process, dropping the least recently used ones.
+    """
+    _FITTED_BACKENDS[path] = fitted
+    _FITTED_BACKENDS.move_to_end(path)
+    while len(_FITTED_BACKENDS) > _FITTED_BACKENDS_SIZE:
+        _FITTED_BACKENDS.popitem(last=False)
+
+
+def fit_projection_file(path: str,
+                        source: str,
+                        data: pd.DataFrame | dict[str, dict[str, str]],
+                        method: str = "umap"):
+    """Fit the projection of the profiles or the content of the manuscripts, and store the fitted
+    backend (and the fitted content) in a file, atomically.
+    Returns the coordinates of the manuscripts.
+    """
+    if source == "profiles":
+        transformer, embedding = fit_projection_profiles(data, method=method)
+        fitted = (transformer, None)
+    else:
+        transformer, _, embedding = fit_projection_content(data, method=method)
+        fitted = (transformer, data)
+    temporary = f"{path}.tmp"
+    joblib.dump(fitted, temporary)
+    os.replace(temporary, path)
+    _remember_backend(path, fitted)
+    return embedding
+
+
+def transform_projection_file(path: str, data: pd.DataFrame | dict[str, dict[str, str]]):
+    """Place new profiles or content onto the fitted projection stored in a file.
+    """
+    fitted = _FITTED_BACKENDS.get(path)
+    if fitted is None:
+        fitted = joblib.load(path)
+    _remember_backend(path, fitted)
+    transformer, fitted_content = fitted
+    if fitted_content is None:
+        return transform_projection_profiles(transformer, data)
+    return transform_projection_content(transformer, fitted_content, data)
+
+
+def perform_projection_content_knn(content: list[dict[str, any]],
+                                   n_neighbors: int = 15):
+    """Perform a projection using the sparse k-nearest-neighbours graph of the textual content.
+    The neighbours are given to UMAP directly, the full distance matrix is never built.
+    """
+    manuscript_keys, knn_indices, knn_distances = compute_knn_graph(content, n_neighbors=n_neighbors)
+    distance_graph = knn_distance_graph(knn_indices, knn_distances)
+    from umap import UMAP
+    transformer = UMAP(**PROJECTION_PARAMS,
+                       n_neighbors=knn_indices.shape[1],
+                       metric="precomputed",
+                       precomputed_knn=(knn_indices, knn_distances))
+    with warnings.catch_warnings():
+        # No search index is given, so that the projection cannot transform new data
+        warnings.filterwarnings("ignore", message="precomputed_knn\\[2\\]")
+        transformed = transformer.fit_transform(distance_graph)
+    return distance_graph, _embedding(transformed, manuscript_keys)
+
+
+def warm_up_projections():
+    """Import UMAP and compile its fit and transform (numba) on a small random corpus,
+    for both the profiles and the distance matrices.
+    """
+    rng = np.random.default_rng(0)
+    profiles = pd.DataFrame(rng.integers(0, 2, size=(64, 16)))
+    distances = np.abs(profiles.to_numpy()[:, None, :] - profiles.to_numpy()[None, :, :]).sum(axis=2)
+    for source, data in (("profiles", profiles), ("content", distances)):
+        backend = make_projection("umap", source)
+        backend.fit_transform(data)
+        backend.transform(data[:2] if source == "content" else data.iloc[:2])
@@ -0,0 +1,150 @@
+"""Compiled set of the rules of the Wisse profile.
+
+The rules are read once from `profile_rules.csv`: their readings are expanded
+(nomina sacra) and compiled into regular expressions, and they are grouped by
+(chapter, verse) for direct lookup. The order of the CSV is kept, as a later
+rule overrides an earlier rule with the same key.
+"""
+from hashlib import sha1
+from pathlib import Path
+import re
+import pandas as pd
+from manuscript_clusterer.engine.automaton import AhoCorasick
+from manuscript_clusterer.engine.normalize import expand_nomina_sacra
+
+
+PROFILE_RULES_PATH = Path(__file__).absolute().parent / "data" / "profile_rules.csv"
+
+# Version of the evaluation of the rules, part of the fingerprint of a rule set
+RULESET_VERSION = 1
+
+# Number of patterns of a verse above which a single scan of the automaton
+# is faster than searching each pattern (measured on verses of ~120 characters)
+AUTOMATON_MIN_PATTERNS = 96
+
+_REGEX_SPECIAL = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+class Rule:
+    """A single compiled rule of the profile.
+    """
+    __slots__ = ("chapter", "verse", "reading_id", "reading", "alternative_reading",
+                 "reading_pattern", "alternative_pattern", "omit", "reading_first",
+                 "profile_key", "readings_key", "fingerprint")
+
+    def __init__(self, chapter, verse, reading_id, reading: str, alternative_reading: str):
+        """Expand and compile the readings of the rule.
+        """
+        self.chapter = chapter
+        self.verse = str(verse)
+        self.reading_id = reading_id
+        self.reading = expand_nomina_sacra(str(reading))
+        self.alternative_reading = expand_nomina_sacra(str(alternative_reading))
+        self.reading_pattern = re.compile(self.reading)
+        self.alternative_pattern = re.compile(self.alternative_reading)
+        self.omit = "omit" in self.reading
+        # The longer of the two readings is searched first
+        self.reading_first = len(self.reading) >= len(self.alternative_reading)
+        self.profile_key = f"{chapter}:{self.verse}:{reading_id}"
+        self.readings_key = f"{chapter}:{reading_id}"
+        canonical = f"{RULESET_VERSION}\t{self.profile_key}\t{self.reading}\t{self.alternative_reading}"
+        self.fingerprint = sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class VerseMatcher:
+    """Search the readings of the rules of a verse.
+
+    When the verse has enough patterns, all literal, they are found by a
+    single scan of an Aho-Corasick automaton, otherwise each pattern is
+    searched on demand.
+    """
+
+    def __init__(self, rules: list[Rule], automaton_min_patterns: int = AUTOMATON_MIN_PATTERNS):
+        """Build the automaton of the verse if worthwhile.
+        """
+        patterns = list(dict.fromkeys(pattern for rule in rules
+                                      for pattern in (rule.reading, rule.alternative_reading)))
+        self.automaton = None
+        if len(patterns) >= automaton_min_patterns and \
+                all(pattern and not _REGEX_SPECIAL.search(pattern) for pattern in patterns):
+            self.automaton = AhoCorasick(patterns)
+
+    def searcher(self, content: str):
+        """Return a function giving the span of the leftmost match of a pattern in the content,
+        None if absent.
+        """
+        if self.automaton is not None:
+            matches = self.automaton.first_matches(content)
+            return lambda pattern: matches.get(pattern.pattern)
+
+        def search(pattern: re.Pattern):
+            match = pattern.search(content)
+            return match.span() if match else None
+        return search
+
+
+class RuleSet:
+    """Rules of the profile, compiled once.
+    """
+
+    def __init__(self,
+                 rules: pd.DataFrame | list[Rule],
+                 automaton_min_patterns: int = AUTOMATON_MIN_PATTERNS):
+        """Compile the rules of a DataFrame with the columns of `profile_rules.csv`,
+        or gather already compiled rules.
+        """
+        if isinstance(rules, pd.DataFrame):
+            rules = [Rule(row.chapter, row.verse, row.reading_id, row.reading, row.alternative_reading)
+                     for row in rules[["chapter", "verse", "reading_id", "reading", "alternative_reading"]]
+                     .itertuples(index=False)]
+        self.rules = list(rules)
+        self.groups = {}
+        for rule in self.rules:
+            self.groups.setdefault((str(rule.chapter), rule.verse), []).append(rule)
+        self.matchers = {key: VerseMatcher(rules, automaton_min_patterns) for key, rules in self.groups.items()}
+        self._by_chapters = {}
+        canonical = "\n".join(rule.fingerprint for rule in self.rules)
+        self.fingerprint = f"v{RULESET_VERSION}-{sha1(canonical.encode('utf-8')).hexdigest()[:16]}"
+
+    @classmethod
+    def from_csv(cls, path: str | Path = PROFILE_RULES_PATH):
+        """Compile the rules of a CSV file.
+        """
+        return cls(pd.read_csv(path))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def for_chapters(self, chapters: list[int]):
+        """Return the rules of the given chapters, in the order of the CSV.
+        """
+        key = tuple(chapters)
+        if key not in self._by_chapters:
+            chapters = set(chapters)
+            self._by_chapters[key] = [rule for rule in self.rules if rule.chapter in chapters]
+        return self._by_chapters[key]
+
+    def for_verse(self, chapter: str, verse: str):
+        """Return the rules of a verse.
+        """
+        return self.groups.get((str(chapter), str(verse)), [])
+
+    def key_fingerprints(self, chapters: list[int] = None):
+        """Fingerprint each profile key (of the given chapters) by the rule setting its value,
+        the last rule with the key.
+        """
+        rules = self.rules if chapters is None else self.for_chapters(chapters)
+        return {rule.profile_key: rule.fingerprint for rule in rules}
+
+    def subset(self, profile_keys: set[str]):
+        """Select the rules of some profile keys.
+        """
+        return RuleSet([rule for rule in self.rules if rule.profile_key in profile_keys])
+
+    def matcher(self, chapter: str, verse: str):
+        """Return the matcher of the readings of a verse.
+        """
+        return self.matchers[str(chapter), str(verse)]
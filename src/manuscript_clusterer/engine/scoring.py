@@ -0,0 +1,100 @@
+"""Silhouette scoring of clusterings, exact or approximate.
+
+The approximate score draws a stratified sample of the manuscripts (every
+cluster keeps its share of the sample) and computes the simplified, medoid
+based, silhouette on it: each sampled manuscript is compared to the medoid of
+its own cluster and to the closest medoid of another cluster.
+"""
+import numpy as np
+
+
+# Above this number of manuscripts, the "auto" mode uses the approximate silhouette
+APPROXIMATE_SILHOUETTE_THRESHOLD = 500
+
+
+def stratified_sample(labels: np.ndarray,
+                      sample_size: int,
+                      random_state: int = 0):
+    """Sample indexes so that each cluster keeps its share of the sample.
+    Each cluster keeps at least one (two when possible) element.
+    """
+    rng = np.random.default_rng(random_state)
+    labels = np.asarray(labels)
+    clusters, counts = np.unique(labels, return_counts=True)
+    sample = []
+    for cluster, count in zip(clusters, counts):
+        members = np.flatnonzero(labels == cluster)
+        cluster_size = max(min(count, 2), round(sample_size * count / len(labels)))
+        sample.append(rng.choice(members, size=min(cluster_size, count), replace=False))
+    return np.sort(np.concatenate(sample))
+
+
+def medoid_silhouette_samples(distance_matrix: np.ndarray, labels: np.ndarray):
+    """Compute the simplified silhouette of each element against the cluster medoids.
+    The elements of singleton clusters score 0, as in `sklearn.metrics.silhouette_samples`.
+    """
+    labels = np.asarray(labels)
+    clusters, counts = np.unique(labels, return_counts=True)
+    medoids = []
+    for cluster in clusters:
+        members = np.flatnonzero(labels == cluster)
+        within = distance_matrix[np.ix_(members, members)].sum(axis=1)
+        medoids.append(members[np.argmin(within)])
+    to_medoids = distance_matrix[:, medoids]
+    own = np.searchsorted(clusters, labels)
+    intra = to_medoids[np.arange(len(labels)), own]
+    to_medoids[np.arange(len(labels)), own] = np.inf
+    inter = to_medoids.min(axis=1)
+    denominator = np.maximum(intra, inter)
+    return np.divide(inter - intra, denominator,
+                     out=np.zeros_like(intra, dtype=np.float64),
+                     where=(denominator > 0) & (counts[own] > 1))
+
+
+def approximate_silhouette_score(X,
+                                 labels: np.ndarray,
+                                 metric: str = "euclidean",
+                                 sample_size: int = 300,
+                                 confidence: float = 0.95,
+                                 random_state: int = 0):
+    """Estimate the silhouette score on a stratified sample.
+
+    Returns the estimated score and its confidence interval.
+    """
+    from scipy.stats import norm
+    from sklearn.metrics import pairwise_distances
+    labels = np.asarray(labels)
+    sample = stratified_sample(labels, sample_size, random_state=random_state)
+    if metric == "precomputed":
+        distance_matrix = np.asarray(X)[np.ix_(sample, sample)]
+    else:
+        distance_matrix = pairwise_distances(np.asarray(X)[sample], metric=metric)
+    values = medoid_silhouette_samples(np.array(distance_matrix, dtype=np.float64), labels[sample])
+    score = values.mean()
+    # Normal approximation with the finite population correction
+    correction = np.sqrt((len(labels) - len(sample)) / max(len(labels) - 1, 1))
+    half_width = norm.ppf(0.5 + confidence / 2) * values.std(ddof=1) / np.sqrt(len(sample)) * correction \
+        if len(sample) > 1 else 0.0
+    return score, (score - half_width, score + half_width)
+
+
+def score_clustering(X,
+                     labels: np.ndarray,
+                     metric: str = "euclidean",
+                     silhouette: str = "auto",
+                     sample_size: int = 300):
+    """Score a clustering by its silhouette.
+
+    `silhouette` is either "exact", "approximate", or "auto" which selects the
+    approximate score above `APPROXIMATE_SILHOUETTE_THRESHOLD` manuscripts.
+    Returns the score and its confidence interval (a single point for the exact score).
+    """
+    if silhouette == "auto":
+        silhouette = "approximate" if len(labels) > APPROXIMATE_SILHOUETTE_THRESHOLD else "exact"
+    if silhouette == "approximate":
+        return approximate_silhouette_score(X, labels, metric=metric, sample_size=sample_size)
+    if silhouette != "exact":
+        raise ValueError(f"Unknown silhouette mode {silhouette}")
+    from sklearn.metrics import silhouette_score
+    score = silhouette_score(X, labels, metric=metric)
+    return score, (score, score)
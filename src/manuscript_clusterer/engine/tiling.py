@@ -0,0 +1,167 @@
+"""Tiled, multi-process computation of the all-pairs distance matrices.
+
+The upper triangle of the matrix is split into square tiles which are
+dispatched to a process pool. Each worker writes its tile (and the mirrored
+tile) straight into a shared `numpy.memmap` file, so no distance is ever
+pickled back to the parent process. Completed tiles are flagged in a sidecar
+file so that an interrupted computation can be resumed. Once a matrix is
+complete, the matrices of the same kind left by earlier inputs are deleted.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha1
+import json
+import multiprocessing
+from pathlib import Path
+import shutil
+import tempfile
+import time
+import numpy as np
+from manuscript_clusterer.engine.distances import (compute_hamming_distance_matrix, compute_jaccard_distance_matrix,
+                                                   encode_verses, hamming_distance_block, jaccard_distance_block,
+                                                   pack_profiles, profiles_to_array)
+
+
+_WORKER_STATE = {}
+
+
+def _init_worker(kind: str, payload, output_path: str, size: int, tile_size: int):
+    """Open the shared output and load the encoded data in the worker.
+    """
+    n_tiles = -(-size // tile_size)
+    _WORKER_STATE.update({
+        "kind": kind,
+        "payload": payload,
+        "tile_size": tile_size,
+        "output": np.memmap(output_path, dtype=np.float64, mode="r+", shape=(size, size)),
+        "flags": np.memmap(output_path + ".tiles", dtype=np.uint8, mode="r+", shape=(n_tiles, n_tiles)),
+    })
+
+
+def _compute_tile(tile_row: int, tile_col: int):
+    """Compute a tile of the distance matrix and write it to the shared output.
+    """
+    tile_size = _WORKER_STATE["tile_size"]
+    output = _WORKER_STATE["output"]
+    size = output.shape[0]
+    rows = np.arange(tile_row * tile_size, min((tile_row + 1) * tile_size, size))
+    cols = np.arange(tile_col * tile_size, min((tile_col + 1) * tile_size, size))
+    if _WORKER_STATE["kind"] == "text":
+        block = jaccard_distance_block(_WORKER_STATE["payload"], rows, cols)
+    else:
+        block = hamming_distance_block(_WORKER_STATE["payload"], rows, cols)
+    if tile_row == tile_col:
+        np.fill_diagonal(block, 0)
+    output[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1] = block
+    output[cols[0]:cols[-1] + 1, rows[0]:rows[-1] + 1] = block.T
+    output.flush()
+    # Only flag the tile once its values are on disk
+    _WORKER_STATE["flags"][tile_row, tile_col] = 1
+    _WORKER_STATE["flags"].flush()
+
+
+def _fingerprint(kind: str, data: dict[str, dict[str, any]]):
+    """Fingerprint the input of a distance computation.
+    """
+    return sha1(json.dumps([kind, data], sort_keys=True).encode()).hexdigest()
+
+
+def _remove_stale_matrices(working_dir: Path, kind: str, output_path: str, started: float):
+    """Delete the matrices of a kind other than the output, and their sidecars.
+    A matrix whose tiles were flagged since `started` is still being computed, and is kept.
+    """
+    for tiles_path in working_dir.glob(f"{kind}-*.dat.tiles"):
+        matrix_path = Path(str(tiles_path)[:-len(".tiles")])
+        if str(matrix_path) == output_path or tiles_path.stat().st_mtime >= started:
+            continue
+        matrix_path.unlink(missing_ok=True)
+        tiles_path.unlink(missing_ok=True)
+
+
+def compute_distance_matrix_tiled(data: dict[str, dict[str, any]],
+                                  kind: str = "text",
+                                  n_workers: int = 1,
+                                  tile_size: int = 256,
+                                  output_dir: str = None,
+                                  start_method: str = "spawn"):
+    """Compute the distance matrix between manuscripts tile by tile.
+
+    `kind` is either "text", for the summed Jaccard distance between the verses
+    of `data`, or "profiles", for the Hamming distance between packed profiles.
+    When `output_dir` is given the matrix is kept there as a memmap named after
+    the input fingerprint, and tiles already computed by a previous
+    (possibly interrupted) call are skipped. Otherwise the matrix is computed
+    in a temporary directory and returned as an in-memory array.
+    Once the matrix is complete, only it is kept in `output_dir` for its kind:
+    the matrices of earlier inputs are deleted, but for those still being computed.
+    The workers are started by `start_method`: forking a multi-threaded process (such as
+    the API) may deadlock its children.
+    """
+    if kind == "text":
+        manuscript_keys, payload = encode_verses(data)
+    elif kind == "profiles":
+        manuscript_keys, _, values = profiles_to_array(data, strict_keys=False)
+        payload = pack_profiles(values)
+    else:
+        raise ValueError(f"Unknown distance kind {kind}")
+    size = len(manuscript_keys)
+    if not size:
+        return manuscript_keys, np.zeros((0, 0))
+    n_tiles = -(-size // tile_size)
+
+    started = time.time()
+    working_dir = Path(output_dir) if output_dir else Path(tempfile.mkdtemp())
+    working_dir.mkdir(parents=True, exist_ok=True)
+    fingerprint = _fingerprint(kind, data)
+    output_path = str(working_dir / f"{kind}-{fingerprint}-{tile_size}.dat")
+    if not (Path(output_path).exists() and Path(output_path + ".tiles").exists()):
+        np.memmap(output_path, dtype=np.float64, mode="w+", shape=(size, size)).flush()
+        np.memmap(output_path + ".tiles", dtype=np.uint8, mode="w+", shape=(n_tiles, n_tiles)).flush()
+    flags = np.memmap(output_path + ".tiles", dtype=np.uint8, mode="r", shape=(n_tiles, n_tiles))
+    pending = [(tile_row, tile_col) for tile_row in range(n_tiles)
+               for tile_col in range(tile_row, n_tiles) if not flags[tile_row, tile_col]]
+    del flags
+
+    init_args = (kind, payload, output_path, size, tile_size)
+    if n_workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                 mp_context=multiprocessing.get_context(start_method),
+                                 initializer=_init_worker,
+                                 initargs=init_args) as executor:
+            for future in [executor.submit(_compute_tile, *tile) for tile in pending]:
+                future.result()
+    else:
+        _init_worker(*init_args)
+        for tile in pending:
+            _compute_tile(*tile)
+        _WORKER_STATE.clear()
+
+    distance_matrix = np.memmap(output_path, dtype=np.float64, mode="r", shape=(size, size))
+    if not output_dir:
+        distance_matrix = np.array(distance_matrix)
+        shutil.rmtree(working_dir)
+    else:
+        _remove_stale_matrices(working_dir, kind, output_path, started)
+    return manuscript_keys, distance_matrix
+
+
+def compute_distance_matrix(data: dict[str, dict[str, any]],
+                            kind: str = "text",
+                            n_workers: int = 1,
+                            tile_size: int = 256,
+                            output_dir: str = None,
+                            start_method: str = "spawn"):
+    """Compute the distance matrix between manuscripts, of the kind of `compute_distance_matrix_tiled`.
+    The matrix is computed tile by tile with several workers or an output directory, at once otherwise.
+    """
+    if n_workers > 1 or output_dir is not None:
+        return compute_distance_matrix_tiled(data,
+                                             kind=kind,
+                                             n_workers=n_workers,
+                                             tile_size=tile_size,
+                                             output_dir=output_dir,
+                                             start_method=start_method)
+    if kind == "text":
+        return compute_jaccard_distance_matrix(data)
+    if kind == "profiles":
+        return compute_hamming_distance_matrix(data)
+    raise ValueError(f"Unknown distance kind {kind}")
@@ -0,0 +1,136 @@
+"""In-memory stand-in for the asynchronous Mongo client, to test the asynchronous database without a server.
+
+Only the operations used by `AsyncMongoDB` are supported, with equality and `$in` filters.
+"""
+from collections import defaultdict
+from copy import deepcopy
+from types import SimpleNamespace
+
+
+def _matches(document: dict, query: dict):
+    """Check whether a document matches a query of equalities and `$in`.
+    """
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict) and "$in" in condition:
+            if value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _include(projected: dict, document: dict, path: list[str]):
+    """Copy a (dotted) field of a document into the projected document, keeping its nesting.
+    """
+    if not isinstance(document, dict) or path[0] not in document:
+        return
+    if len(path) == 1:
+        projected[path[0]] = deepcopy(document[path[0]])
+    else:
+        _include(projected.setdefault(path[0], {}), document[path[0]], path[1:])
+
+
+def _project(document: dict, projection: dict | None):
+    """Apply an inclusion projection (and the exclusion of `_id`) to a document.
+    """
+    if not projection:
+        return deepcopy(document)
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        projected = {}
+        for field in included:
+            _include(projected, document, field.split("."))
+        if projection.get("_id", 1) and "_id" in document:
+            projected["_id"] = document["_id"]
+        return projected
+    return {field: deepcopy(value) for field, value in document.items()
+            if projection.get(field, 1)}
+
+
+class AsyncCursor:
+    """Cursor over the documents found.
+    """
+
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+
+    async def to_list(self, length: int = None):
+        """Return the documents found.
+        """
+        return self.documents[:length]
+
+
+class AsyncCollection:
+    """Collection of documents kept in memory.
+    """
+
+    def __init__(self):
+        self.documents = []
+
+    async def find_one(self, query: dict, projection: dict = None):
+        """Return the first document matching the query, None if absent.
+        """
+        for document in self.documents:
+            if _matches(document, query):
+                return _project(document, projection)
+        return None
+
+    def find(self, query: dict, projection: dict = None):
+        """Return a cursor over the documents matching the query.
+        """
+        return AsyncCursor([_project(document, projection)
+                            for document in self.documents if _matches(document, query)])
+
+    async def insert_one(self, document: dict):
+        """Insert a document.
+        """
+        document.setdefault("_id", len(self.documents))
+        self.documents.append(deepcopy(document))
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def update_one(self, query: dict, update: dict):
+        """Set fields of the first document matching the query.
+        """
+        for document in self.documents:
+            if _matches(document, query):
+                document.update(deepcopy(update["$set"]))
+                return SimpleNamespace(modified_count=1)
+        return SimpleNamespace(modified_count=0)
+
+    async def delete_one(self, query: dict):
+        """Delete the first document matching the query.
+        """
+        for index, document in enumerate(self.documents):
+            if _matches(document, query):
+                del self.documents[index]
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+
+class AsyncAdmin:
+    """Administration commands of the server.
+    """
+
+    async def command(self, name: str):
+        """Answer the ping.
+        """
+        return {"ok": 1.0}
+
+
+class AsyncMongoClientStub:
+    """Stand-in for `AsyncMongoClient`, holding the databases in memory.
+    """
+
+    def __init__(self):
+        self.databases = defaultdict(lambda: defaultdict(AsyncCollection))
+        self.admin = AsyncAdmin()
+        self.closed = False
+
+    def __getitem__(self, db_name: str):
+        return self.databases[db_name]
+
+    async def close(self):
+        """Close the client.
+        """
+        self.closed = True
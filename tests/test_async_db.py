@@ -0,0 +1,180 @@
+"""Tests that the asynchronous database behaves as expected.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import unittest
+from async_mongo_stub import AsyncMongoClientStub
+from manuscript_clusterer.api.database.async_db_manipulator import AsyncManuscriptDB
+
+
+# Offloads concurrently computations importing prince and sklearn, in a fresh interpreter
+CONCURRENT_IMPORTS = """
+import asyncio
+import numpy as np
+import pandas as pd
+from async_mongo_stub import AsyncMongoClientStub
+from manuscript_clusterer.api.database.async_db_manipulator import AsyncManuscriptDB
+from manuscript_clusterer.engine.cluster import cluster_profiles
+from manuscript_clusterer.engine.executor import EngineExecutor
+from manuscript_clusterer.engine.project import fit_projection_profiles
+
+
+class EngineDB:
+    def __init__(self):
+        self.engine = EngineExecutor()
+        self.engine.start()
+
+    def get_projection(self, profiles, method):
+        return self.engine.run(fit_projection_profiles, profiles, method=method)[1]
+
+    def get_profile_clustered(self, profiles):
+        self.engine.load_modules()
+        from sklearn.cluster import AgglomerativeClustering
+        return self.engine.run(cluster_profiles, profiles, clusterer_class=AgglomerativeClustering)
+
+
+async def main():
+    profiles = pd.DataFrame(np.random.default_rng(0).integers(0, 2, (20, 12)), index=[f"m{i}" for i in range(20)])
+    db = AsyncManuscriptDB(EngineDB(), client=AsyncMongoClientStub(), compute_threads=3)
+    results = await asyncio.gather(db.get_projection(profiles, "mca"),
+                                   db.get_profile_clustered(profiles),
+                                   db.get_projection(profiles, "pca"))
+    print(len(results[1]))
+    await db.close()
+
+asyncio.run(main())
+"""
+
+
+# Runs the startup of the API, with a stand-in for the synchronous database, in a fresh interpreter
+STARTUP = """
+import asyncio
+import sys
+from unittest import mock
+from manuscript_clusterer.api.database import db_manipulator
+from manuscript_clusterer.api.app import app, lifespan
+
+
+async def main():
+    with mock.patch.object(db_manipulator, "ManuscriptDB"):
+        async with lifespan(app):
+            print([module for module in ("umap", "sklearn", "prince", "collatex") if module in sys.modules])
+
+
+asyncio.run(main())
+"""
+
+
+class SynchronousDB:
+    """Stand-in for the synchronous database, recording the writes to the manuscripts.
+    """
+
+    def __init__(self):
+        self.inserted = []
+
+    def insert_document(self, collection_name, document):
+        self.inserted.append((collection_name, document))
+        return document["id"]
+
+    def get_profile_matrix(self, manuscripts_list=None):
+        time.sleep(0.2)
+        return manuscripts_list
+
+
+class TestAsyncDB(unittest.IsolatedAsyncioTestCase):
+    """Tests that the asynchronous database behaves as expected.
+    """
+
+    async def asyncSetUp(self):
+        self.client = AsyncMongoClientStub()
+        self.manuscripts = self.client["manuscriptsDB"]["manuscripts"]
+        for manuscript_id in ("20001", "20002"):
+            await self.manuscripts.insert_one({"id": manuscript_id,
+                                               "content": {"10": {"1": f"text {manuscript_id}", "2": "kai"},
+                                                           "11": {"1": "other"}},
+                                               "profile": {"10:1:1": 1},
+                                               "fullname": f"GA {manuscript_id}"})
+        self.synchronous_db = SynchronousDB()
+        self.db = AsyncManuscriptDB(self.synchronous_db, client=self.client, compute_threads=2)
+
+    async def asyncTearDown(self):
+        await self.db.close()
+
+    async def test_reads(self):
+        """Tests that the documents are read through the asynchronous client.
+        """
+        self.assertTrue(await self.db.check_connection())
+        self.assertEqual(await self.db.get_manuscripts(), [{"id": "20001"}, {"id": "20002"}])
+        self.assertEqual(await self.db.get_manuscript_verses("20002", "10", "1"), "text 20002")
+        profiles = await self.db.get_manuscripts_profiles(["20001", "20003"])
+        self.assertEqual(profiles, [{"id": "20001", "profile": {"10:1:1": 1}}])
+        self.assertEqual(await self.db.get_manuscript_info("20001"), [{"fullname": "GA 20001"}])
+        self.assertEqual(await self.db.get_manuscripts_info(["20001", "20002", "20003"]),
+                         {"20001": {"fullname": "GA 20001"}, "20002": {"fullname": "GA 20002"}})
+        self.assertIsNone(await self.db.get_manuscript("20003"))
+
+    async def test_content_projection(self):
+        """Tests that only the requested chapter or verse of the content is read.
+        """
+        self.assertEqual(await self.db.get_manuscript_content("20001", "10", "2"),
+                         {"content": {"10": {"2": "kai"}}})
+        content = await self.db.get_manuscripts_content(["20001", "20002"], chapter="11")
+        self.assertEqual(content, [{"id": "20001", "content": {"11": {"1": "other"}}},
+                                   {"id": "20002", "content": {"11": {"1": "other"}}}])
+        self.assertEqual(len((await self.db.get_all_manuscripts_content())[0]["content"]), 2)
+
+    async def test_writes(self):
+        """Tests that the manuscripts are written by the synchronous database, other documents directly.
+        """
+        await self.db.insert_document("manuscripts", {"id": "20003"})
+        self.assertEqual(self.synchronous_db.inserted, [("manuscripts", {"id": "20003"})])
+        await self.db.insert_document("metadata", {"_id": "note", "value": 1})
+        self.assertEqual(await self.db.update_document("metadata", {"_id": "note"}, {"value": 2}), 1)
+        self.assertEqual(await self.db.find_document("metadata", {"_id": "note"}, {"_id": 0}), {"value": 2})
+        self.assertEqual(await self.db.delete_document("metadata", {"_id": "note"}), 1)
+
+    async def test_offloaded(self):
+        """Tests that the computations run in worker threads, without blocking the event loop.
+        """
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        results = await asyncio.gather(self.db.get_profile_matrix(manuscripts_list=["20001"]),
+                                       self.db.get_profile_matrix(manuscripts_list=["20002"]))
+        ticker.cancel()
+        self.assertEqual(results, [["20001"], ["20002"]])
+        self.assertGreater(ticks, 5)
+        with self.assertRaises(AttributeError):
+            self.db.compute_profile  # pylint: disable=pointless-statement
+
+    def test_concurrent_imports(self):
+        """Tests that the first computations of a fresh process can be offloaded concurrently.
+        """
+        environment = {**os.environ,
+                       "PYTHONPATH": os.pathsep.join(filter(None, [os.path.dirname(__file__),
+                                                                   os.environ.get("PYTHONPATH")]))}
+        completed = subprocess.run([sys.executable, "-c", CONCURRENT_IMPORTS], env=environment,
+                                   capture_output=True, text=True, timeout=300, check=False)
+        self.assertEqual(completed.returncode, 0, completed.stderr[-2000:])
+        self.assertEqual(completed.stdout.strip().splitlines()[-1], "20")
+
+    def test_lazy_startup(self):
+        """Tests that the startup of the API does not import the heavy modules.
+        """
+        completed = subprocess.run([sys.executable, "-c", STARTUP], capture_output=True, text=True, timeout=300,
+                                   check=False)
+        self.assertEqual(completed.returncode, 0, completed.stderr[-2000:])
+        self.assertEqual(completed.stdout.strip().splitlines()[-1], "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,10 @@
 """Tests that performing clustering behaves as expected.
 """
 import unittest
-from sklearn.cluster import KMeans, DBSCAN
+from sklearn.cluster import KMeans, DBSCAN, AgglomerativeClustering
+from sklearn.metrics import silhouette_score
 import numpy as np
-from manuscript_clusterer.engine.cluster import cluster_profiles, compute_distance_matrix_text, cluster_texts
+from manuscript_clusterer.engine.cluster import cluster_profiles, compute_distance_matrix_text, cluster_texts, find_best_n_clusters
 
 
 class TestClustering(unittest.TestCase):
@@ -149,6 +150,38 @@ class TestClustering(unittest.TestCase):
             {'20001': '-1',
              '20002': '-1'})
 
+    def test_tree_sweep(self):
+        """Tests that the tree sweep matches refitting the clustering for each k.
+        """
+        rng = np.random.default_rng(0)
+        features = np.concatenate([rng.normal(center, 0.3, size=(6, 2))
+                                   for center in [(0, 0), (4, 0), (0, 4), (4, 4)]])
+        distance_matrix = np.linalg.norm(features[:, None] - features[None, :], axis=-1)
+        expected_scores = {
+            n_clusters: silhouette_score(
+                distance_matrix,
+                AgglomerativeClustering(n_clusters=n_clusters,
+                                        metric="precomputed",
+                                        linkage="complete").fit_predict(distance_matrix),
+                metric="precomputed")
+            for n_clusters in range(2, 10)
+        }
+        self.assertEqual(find_best_n_clusters(AgglomerativeClustering,
+                                              distance_matrix,
+                                              max_clusters=10,
+                                              metric="precomputed",
+                                              linkage="complete"),
+                         max(expected_scores, key=expected_scores.get))
+        self.assertEqual(find_best_n_clusters(AgglomerativeClustering, features), 4)
+
+        n_clusters, (score, (low, high)) = find_best_n_clusters(AgglomerativeClustering, features,
+                                                                return_score=True)
+        self.assertEqual(n_clusters, 4)
+        self.assertAlmostEqual(score, silhouette_score(
+            features, AgglomerativeClustering(n_clusters=4).fit_predict(features)))
+        self.assertLessEqual(low, score)
+        self.assertLessEqual(score, high)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,8 +1,75 @@
 """Test the engine for the classification of manuscripts.
 """
 
+import random
+import re
 import unittest
-from manuscript_clusterer.engine.get_profiles import evaluate_manuscript_profile
+from manuscript_clusterer.engine.get_profiles import (PROFILE_RULES, PROFILE_RULESET, evaluate_corpus_profiles,
+                                                      evaluate_manuscript, evaluate_manuscript_profile,
+                                                      evaluate_manuscript_readings)
+from manuscript_clusterer.engine.automaton import AhoCorasick
+from manuscript_clusterer.engine.rules import RuleSet
+
+
+# Frozen copy of the first evaluators of the profiles, on the rules DataFrame
+NOMINA_SACRA = {
+    'θς': 'θεος', 'κς': 'κυριος', 'ἰης': 'ιησους', 'δαυ': 'δαυιδ', 'ις': 'ιησους',
+    'πνα': 'πνευμα', 'ισρλ': 'ισραηλ', 'χσ': 'χριστος', 'ισαακ': 'ισαακ', 'ισλ': 'ισραηλ', 'ἰσ': 'ιησους',
+    "ιηλ": "ισραηλ",
+    'θυ': 'θεου', 'κυ': 'κυριου', 'ἰησ': 'ιησου',
+    'πνυ': 'πνευματος', 'χυ': 'χριστου', 'ουνου': 'ουρανου',
+    'ιυ': 'ιησου',
+    'θν': 'θεον', 'κν': 'κυριον', 'χν': 'χριστον',
+    'θω': 'θεω', 'κω': 'κυριω', 'ανων': 'ανδροπον', 'χω': 'χριστω',
+    'κε': 'κυριε'
+}
+# The later duplicate keys of the first table won
+NOMINA_SACRA.update({'ἰης': 'ιησου', 'ἰησ': 'ιησους', 'πνα': 'πνευματι'})
+
+
+def baseline_expand_nomina_sacra(text):
+    """Expand the nomina sacra with the first implementation.
+    """
+    pattern = r'\b(' + '|'.join(re.escape(ns) for ns in NOMINA_SACRA.keys()) + r')\b'
+    return re.sub(pattern, lambda match: NOMINA_SACRA[match.group(0)], text)
+
+
+def baseline_evaluate(manuscript, chapters, readings_only=False):
+    """Evaluate the profile (or the readings) of a manuscript, rule by rule with `re.search`.
+    """
+    values = {}
+    for _, rule in PROFILE_RULES[PROFILE_RULES.chapter.isin(chapters)].iterrows():
+        if readings_only:
+            key = f'{rule["chapter"]}:{rule["reading_id"]}'
+        else:
+            key = f'{rule["chapter"]}:{rule["verse"]}:{rule["reading_id"]}'
+        try:
+            content = baseline_expand_nomina_sacra(manuscript[str(rule["chapter"])][str(rule["verse"])])
+        except KeyError:
+            values[key] = -1
+            continue
+        reading = baseline_expand_nomina_sacra(str(rule["reading"]))
+        alternative_reading = baseline_expand_nomina_sacra(str(rule["alternative_reading"]))
+        if len(reading) >= len(alternative_reading):
+            if re.search(reading, content):
+                profile, text = 1, reading
+            elif ("omit" in reading) and (not re.search(alternative_reading, content)):
+                profile, text = 1, ""
+            elif re.search(alternative_reading, content):
+                profile, text = 0, alternative_reading
+            else:
+                profile, text = 0, content
+        else:
+            if re.search(alternative_reading, content):
+                profile, text = 0, alternative_reading
+            elif "omit" in reading:
+                profile, text = 1, ""
+            elif re.search(reading, content):
+                profile, text = 1, reading
+            else:
+                profile, text = 0, content
+        values[key] = text if readings_only else profile
+    return values
 
 
 class TestComputeProfile(unittest.TestCase):
@@ -37,5 +104,82 @@ class TestComputeProfile(unittest.TestCase):
                          expected_profile)
 
 
+class TestRuleSet(unittest.TestCase):
+    """Tests that the compiled rules behave as the rules DataFrame.
+    """
+
+    def setUp(self):
+        self.manuscript = {"1": {"2": "καθως παρεδοσαν ημιν ",
+                                 "7": "και ουκ ην αυτοις τεκνον καθοτι η ελισαβετ ην στειρα "}}
+
+    def test_equivalent_to_dataframe(self):
+        """Tests that the evaluators give the results of the first evaluators, rule by rule.
+        The manuscripts mix the readings and alternative readings of the rules, with missing verses.
+        """
+        generator = random.Random(0)
+        manuscripts = [self.manuscript]
+        for _ in range(6):
+            manuscript = {}
+            for _, rule in PROFILE_RULES.iterrows():
+                if generator.random() < 0.1:
+                    continue
+                text = generator.choice([str(rule["reading"]).replace("omit", ""), str(rule["alternative_reading"]),
+                                         "θυ κυριος"])
+                verses = manuscript.setdefault(str(rule["chapter"]), {})
+                verses[str(rule["verse"])] = f'{verses.get(str(rule["verse"]), "")} {text} '
+            manuscripts.append(manuscript)
+        for manuscript in manuscripts:
+            for rules in (PROFILE_RULES, PROFILE_RULESET):
+                self.assertEqual(evaluate_manuscript_profile(manuscript, [1, 10, 20], rules),
+                                 baseline_evaluate(manuscript, [1, 10, 20]))
+                self.assertEqual(evaluate_manuscript_readings(manuscript, [1, 10, 20], rules),
+                                 baseline_evaluate(manuscript, [1, 10, 20], readings_only=True))
+        self.assertEqual(len(PROFILE_RULESET.for_verse("1", "7")), 3)
+
+    def test_single_pass(self):
+        """Tests that the single pass evaluation returns the profile, readings and match positions.
+        """
+        profile, readings, positions = evaluate_manuscript(self.manuscript, [1])
+        self.assertEqual(profile, evaluate_manuscript_profile(self.manuscript, [1]))
+        self.assertEqual(readings, evaluate_manuscript_readings(self.manuscript, [1]))
+        self.assertEqual((profile["1:2:1"], readings["1:1"]), (0, "παρεδοσαν"))
+        start, end = positions["1:2:1"]
+        self.assertEqual(self.manuscript["1"]["2"][start:end], "παρεδοσαν")
+        self.assertIsNone(positions["1:8:4"])
+
+    def test_corpus_profiles(self):
+        """Tests that the batch evaluation matches the evaluation of each manuscript.
+        """
+        manuscripts = {"20001": self.manuscript,
+                       "20002": {"1": {"2": "καθως παρεδωκαν ημιν "}, "2": {"1": "εγενετο δε εν ταις ημεραις εκειναις "}},
+                       "20003": {}}
+        profiles = evaluate_corpus_profiles(manuscripts, [1, 2])
+        self.assertEqual(profiles.shape[0], 3)
+        for manuscript_id, manuscript in manuscripts.items():
+            self.assertEqual(profiles.loc[manuscript_id].to_dict(),
+                             evaluate_manuscript_profile(manuscript, [1, 2]))
+
+    def test_automaton(self):
+        """Tests that the automaton finds the leftmost match of every pattern in a single scan.
+        """
+        text = "ην η ελισαβετ ην η ελισαβετ"
+        patterns = ["ην η ελισαβετ", "η ελισαβετ ην", "η", "ελισαβεθ"]
+        matches = AhoCorasick(patterns).first_matches(text)
+        self.assertEqual(matches, {pattern: (text.find(pattern), text.find(pattern) + len(pattern))
+                                   for pattern in patterns if pattern in text})
+        automaton_rules = RuleSet(PROFILE_RULES, automaton_min_patterns=1)
+        self.assertIsNotNone(automaton_rules.matcher("1", "7").automaton)
+        self.assertEqual(evaluate_manuscript(self.manuscript, [1], automaton_rules),
+                         evaluate_manuscript(self.manuscript, [1], PROFILE_RULESET))
+
+    def test_fingerprint(self):
+        """Tests that the fingerprint only changes with the rules.
+        """
+        self.assertEqual(RuleSet.from_csv().fingerprint, PROFILE_RULESET.fingerprint)
+        rules = PROFILE_RULES.copy()
+        rules.loc[0, "reading"] = "παρεδοσαν"
+        self.assertNotEqual(RuleSet(rules).fingerprint, PROFILE_RULESET.fingerprint)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,292 @@
+"""Tests that the vectorized distance engines behave as expected.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import tempfile
+import time
+import unittest
+from unittest import mock
+import numpy as np
+from pymongo import ReplaceOne
+from textdistance import jaccard
+from manuscript_clusterer.api.database.distance_store import DistanceStore
+from manuscript_clusterer.engine.cluster import compute_distance_matrix_text, compute_distance_matrix_profiles
+from manuscript_clusterer.engine.distances import (ProfileRows, VerseCounts, compute_hamming_distance_matrix,
+                                                   compute_jaccard_distance_matrix, compute_verse_distance_tensor)
+from manuscript_clusterer.engine.executor import EngineExecutor
+from manuscript_clusterer.engine.tiling import compute_distance_matrix_tiled
+
+
+class TestJaccardDistance(unittest.TestCase):
+    """Tests that the sparse Jaccard engine matches the pairwise computation.
+    """
+
+    def setUp(self):
+        self.content = {
+            "20001": {"1": "καθως παρεδοσαν ημιν", "2": "ινα επιγνως", "3": "η"},
+            "20002": {"1": "καθως παρεδωσαν ημειν", "2": "ινα επιγνως"},
+            "20003": {"1": "παρεδοσαν", "2": "", "4": "εγενετο εν ταις ημεραις"},
+            "20004": {}
+        }
+
+    def test_equivalent_to_pairwise(self):
+        """Tests that the sparse engine returns the same matrix as the loop.
+        """
+        keys, distance_matrix = compute_jaccard_distance_matrix(self.content)
+        loop_keys, loop_matrix = compute_distance_matrix_text(
+            self.content,
+            distance_function=lambda text1, text2: jaccard(text1, text2))
+        self.assertEqual(keys, loop_keys)
+        self.assertTrue(np.allclose(distance_matrix, loop_matrix))
+
+    def test_default_uses_sparse_engine(self):
+        """Tests that the default distance goes through the sparse engine.
+        """
+        keys, distance_matrix = compute_distance_matrix_text(self.content)
+        self.assertEqual(keys, ["20001", "20002", "20003", "20004"])
+        self.assertTrue(np.allclose(distance_matrix, distance_matrix.T))
+        self.assertTrue(np.all(np.diag(distance_matrix) == 0))
+
+    def test_verse_distance_tensor(self):
+        """Tests that the verse distances match the pairwise computation verse by verse.
+        """
+        keys, verses, distances = compute_verse_distance_tensor(self.content)
+        self.assertEqual(verses, ["1", "2", "3", "4"])
+        for i, key1 in enumerate(keys):
+            for j, key2 in enumerate(keys):
+                for k, verse in enumerate(verses):
+                    self.assertAlmostEqual(distances[i, j, k],
+                                           1 - jaccard(self.content[key1].get(verse, ""),
+                                                       self.content[key2].get(verse, "")))
+        keys, verses, to_reference = compute_verse_distance_tensor(self.content, reference="20002")
+        self.assertTrue(np.allclose(to_reference, distances[:, 1]))
+
+
+class TestHammingDistance(unittest.TestCase):
+    """Tests that the bit-packed Hamming engine behaves as expected.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.values = rng.integers(-1, 2, size=(9, 21))
+        self.profiles = {f"ms{i}": {f"10:{key}": int(value) for key, value in enumerate(row)}
+                         for i, row in enumerate(self.values)}
+
+    def test_policies(self):
+        """Tests the packed distances against the comparison of the raw values.
+        """
+        present = self.values != -1
+        both_present = present[:, None] & present[None, :]
+        differ = self.values[:, None] != self.values[None, :]
+        expected = {
+            "strict": differ.sum(-1),
+            "ignore": (differ & both_present).sum(-1),
+            "mismatch": (differ | ~both_present).sum(-1)
+        }
+        for missing, expected_distances in expected.items():
+            keys, distances = compute_hamming_distance_matrix(self.profiles, missing=missing)
+            self.assertEqual(keys, list(self.profiles.keys()))
+            self.assertTrue(np.array_equal(distances, expected_distances), missing)
+
+    def test_profiles_distance_matrix(self):
+        """Tests that the profile distances keep their dictionary format.
+        """
+        distances = compute_distance_matrix_profiles(self.profiles)
+        self.assertEqual(distances["ms0"]["ms1"],
+                         sum(self.profiles["ms0"][key] != self.profiles["ms1"][key]
+                             for key in self.profiles["ms0"]))
+        self.profiles["ms0"].pop("10:0")
+        with self.assertRaises(ValueError):
+            compute_distance_matrix_profiles(self.profiles)
+
+
+class TestTiledDistance(unittest.TestCase):
+    """Tests that the tiled scheduler behaves as expected.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        alphabet = list("αβγδεζηθικλμνξοπρστυφχψω ")
+        self.content = {
+            f"ms{i}": {str(verse): "".join(rng.choice(alphabet, size=rng.integers(0, 12)))
+                       for verse in range(1, 5)}
+            for i in range(7)
+        }
+        self.profiles = {
+            f"ms{i}": {f"10:{key}": int(rng.integers(-1, 2)) for key in range(6)}
+            for i in range(7)
+        }
+
+    def test_text_tiles(self):
+        """Tests that the tiled text distances match the full computation.
+        """
+        keys, expected = compute_jaccard_distance_matrix(self.content)
+        tiled_keys, distances = compute_distance_matrix_tiled(self.content,
+                                                              kind="text",
+                                                              n_workers=2,
+                                                              tile_size=3)
+        self.assertEqual(keys, tiled_keys)
+        self.assertTrue(np.allclose(distances, expected))
+
+    def test_profile_tiles(self):
+        """Tests that the tiled profile distances match the full computation.
+        """
+        expected = compute_distance_matrix_profiles(self.profiles)
+        keys, distances = compute_distance_matrix_tiled(self.profiles,
+                                                        kind="profiles",
+                                                        tile_size=2)
+        self.assertEqual(
+            {id1: {id2: int(distances[i, j]) for j, id2 in enumerate(keys)}
+             for i, id1 in enumerate(keys)},
+            expected)
+
+    def test_resume(self):
+        """Tests that a computation resumes from the completed tiles.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            keys, expected = compute_distance_matrix_tiled(self.content,
+                                                           tile_size=3,
+                                                           output_dir=output_dir)
+            tiles_path = next(Path(output_dir).glob("*.tiles"))
+            flags = np.memmap(tiles_path, dtype=np.uint8, mode="r+", shape=(3, 3))
+            self.assertEqual(int(flags.sum()), 6)
+            # Forget a tile and tamper a completed one: only the first is recomputed
+            output = np.memmap(str(tiles_path)[:-len(".tiles")], dtype=np.float64, mode="r+", shape=(7, 7))
+            output[0, 6] = output[0, 1] = -1
+            output.flush()
+            flags[0, 2] = 0
+            flags.flush()
+            _, distances = compute_distance_matrix_tiled(self.content,
+                                                         tile_size=3,
+                                                         output_dir=output_dir)
+            self.assertEqual(distances[0, 1], -1)
+            self.assertAlmostEqual(distances[0, 6], expected[0, 6])
+            self.assertEqual(int(flags.sum()), 6)
+
+    def test_stale_matrices(self):
+        """Tests that only the matrix of the latest input is kept for a kind.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            compute_distance_matrix_tiled(self.content, tile_size=3, output_dir=output_dir)
+            compute_distance_matrix_tiled(self.profiles, kind="profiles", tile_size=3, output_dir=output_dir)
+            # A matrix still being computed (its tiles flagged during the computation) is kept
+            in_progress = Path(output_dir) / "text-0-3.dat"
+            in_progress.touch()
+            Path(str(in_progress) + ".tiles").touch()
+            os.utime(str(in_progress) + ".tiles", (time.time() + 60, time.time() + 60))
+            self.content["ms0"]["1"] = "αβγ"
+            _, distances = compute_distance_matrix_tiled(self.content, tile_size=3, output_dir=output_dir)
+            self.assertEqual(len(list(Path(output_dir).glob("text-*.dat"))), 2)
+            self.assertEqual(len(list(Path(output_dir).glob("text-*.dat.tiles"))), 2)
+            self.assertEqual(len(list(Path(output_dir).glob("profiles-*.dat"))), 1)
+            self.assertTrue(in_progress.exists())
+            self.assertTrue(np.allclose(distances, compute_jaccard_distance_matrix(self.content)[1]))
+
+
+
+class TestIncrementalDistance(unittest.TestCase):
+    """Tests that the distances of one manuscript match the full computation.
+    """
+
+    def setUp(self):
+        self.content = {
+            "20001": {"1": "καθως παρεδοσαν ημιν", "2": "ινα επιγνως", "3": "η"},
+            "20002": {"1": "καθως παρεδωσαν ημειν", "2": "ινα επιγνως"},
+            "20003": {"1": "παρεδοσαν", "2": "", "4": "εγενετο εν ταις ημεραις"},
+            "20004": {}
+        }
+        self.profiles = {
+            "20001": {"1:2": 1, "1:7": 0, "2:1": 1},
+            "20002": {"1:2": 0, "1:7": 0, "2:1": 1},
+            "20003": {"1:2": 1, "1:7": -1},
+            "20004": {"1:2": 1, "1:7": 1, "2:1": 0, "2:4": 1}
+        }
+
+    def assert_rows(self, encoding, keys, expected):
+        """Check the distances of every manuscript of an encoding against a full matrix.
+        """
+        self.assertEqual(encoding.manuscript_keys, keys)
+        for i, manuscript_id in enumerate(keys):
+            self.assertTrue(np.allclose(encoding.distances(manuscript_id), expected[i]), manuscript_id)
+
+    def test_verse_counts(self):
+        """Tests that adding, replacing and removing manuscripts keeps the Jaccard distances.
+        """
+        counts = VerseCounts({key: self.content[key] for key in ("20002", "20003")})
+        counts.add("20001", {"1": "παρεδοσαν"})
+        counts.add("20004", self.content["20004"])
+        counts.add("20001", self.content["20001"])
+        self.assert_rows(counts, *compute_jaccard_distance_matrix(
+            {key: self.content[key] for key in counts.manuscript_keys}))
+        counts.remove("20003")
+        self.assert_rows(counts, *compute_jaccard_distance_matrix(
+            {key: self.content[key] for key in counts.manuscript_keys}))
+
+    def test_profile_rows(self):
+        """Tests that adding, replacing and removing profiles keeps the Hamming distances.
+        """
+        rows = ProfileRows({key: self.profiles[key] for key in ("20002", "20003")})
+        rows.add("20004", self.profiles["20004"])
+        rows.add("20001", self.profiles["20001"])
+        self.assert_rows(rows, *compute_hamming_distance_matrix(
+            {key: self.profiles[key] for key in rows.manuscript_keys}))
+        rows.remove("20004")
+        rows.add("20002", {"1:2": 1})
+        self.profiles["20002"] = {"1:2": 1}
+        self.assert_rows(rows, *compute_hamming_distance_matrix(
+            {key: self.profiles[key] for key in rows.manuscript_keys}))
+
+    def test_whole_profile(self):
+        """Tests that the stored Wisse distances are computed on the whole profiles.
+        """
+        store = DistanceStore({"distances": None}, engine=EngineExecutor(warm_modules=()))
+        document = {"id": "20004", "profile": self.profiles["20004"]}
+        self.assertEqual(store._extract(document, "1", "wisse"), self.profiles["20004"])
+        self.assertEqual(store._extract(document, "3", "wisse"), self.profiles["20004"])
+        keys, distances = store._compute_matrix(self.profiles, "wisse")
+        self.assertEqual(keys, list(self.profiles))
+        self.assertTrue(np.array_equal(distances, compute_hamming_distance_matrix(self.profiles)[1]))
+        # With the same readings, the distances are the ones of the whole profiles
+        profiles = {key: self.profiles[key] for key in ("20001", "20002")}
+        self.assertEqual(store._compute_matrix(profiles, "wisse")[1][0, 1],
+                         compute_distance_matrix_profiles(profiles)["20001"]["20002"])
+
+    def test_single_build(self):
+        """Tests that concurrent first reads of a store build it once, with upserted rows.
+        """
+        store = DistanceStore({"distances": mock.MagicMock()}, engine=EngineExecutor(warm_modules=()))
+        store.collection.index_information.return_value = {}
+        store.ensure_indexes()
+        store.collection.create_index.assert_any_call(
+            [("chapter", 1), ("scheme", 1), ("id", 1)], unique=True)
+
+        builds = []
+
+        def compute_matrix(data, scheme):
+            time.sleep(0.1)
+            builds.append(scheme)
+            return compute_hamming_distance_matrix(data)
+
+        store.collection.find_one.side_effect = lambda *args: {"_id": 0} if builds else None
+        store.collection.find.return_value = [{"id": "20001", "distances": {"20001": 0.0}}]
+        with mock.patch.object(store, "_load_data", return_value=self.profiles), \
+                mock.patch.object(store, "_compute_matrix", side_effect=compute_matrix):
+            with ThreadPoolExecutor(4) as pool:
+                results = list(pool.map(lambda _: store.get("1", "wisse"), range(4)))
+        self.assertEqual(builds, ["wisse"])
+        self.assertEqual(store._build_locks, {})
+        self.assertEqual([keys for keys, _ in results], [["20001"]] * 4)
+
+        keys, distances = compute_hamming_distance_matrix(self.profiles)
+        self.assertEqual(store.collection.bulk_write.call_args.args[0], [
+            ReplaceOne({"chapter": "*", "scheme": "wisse", "id": manuscript_id},
+                       {"chapter": "*", "scheme": "wisse", "id": manuscript_id,
+                        "distances": dict(zip(keys, distances[i].tolist()))},
+                       upsert=True)
+            for i, manuscript_id in enumerate(keys)
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
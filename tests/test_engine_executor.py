@@ -0,0 +1,76 @@
+"""Tests that the process pool of the engine behaves as expected.
+"""
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+import math
+import os
+from threading import Timer
+import time
+import unittest
+from manuscript_clusterer.engine.executor import CallScope, EngineExecutor, EngineTimeoutError, run_in_scope
+
+
+class TestEngineExecutor(unittest.TestCase):
+    """Tests that the process pool of the engine behaves as expected.
+    """
+
+    def setUp(self):
+        self.executor = EngineExecutor(workers=1, timeout=30, warm_modules=("math",), host_modules=())
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_inline(self):
+        """Tests that the functions run in the calling process without workers.
+        """
+        self.assertEqual(EngineExecutor(warm_modules=("math",)).run(os.getpid), os.getpid())
+
+    def test_run(self):
+        """Tests that the functions run in a worker process.
+        """
+        self.assertEqual(self.executor.run(int, "ff", base=16), 255)
+        self.assertNotEqual(self.executor.run(os.getpid), os.getpid())
+
+    def test_timeout(self):
+        """Tests that a call exceeding its timeout raises, and that the queued calls still run.
+        """
+        with self.assertRaises(EngineTimeoutError):
+            self.executor.run(time.sleep, 1, timeout=0.1)
+        self.assertEqual(self.executor.run(math.factorial, 5), 120)
+
+    def test_timeout_stops_worker(self):
+        """Tests that a running call exceeding its timeout only stops its own worker,
+        and that the calls queued or running on the other workers complete.
+        """
+        executor = EngineExecutor(workers=2, timeout=30, warm_modules=("math",), host_modules=())
+        try:
+            executor.start()
+            processes = [worker.process for worker in executor._workers]
+            with ThreadPoolExecutor(max_workers=2) as threads:
+                slow = threads.submit(executor.run, time.sleep, 60, timeout=2)
+                running = threads.submit(executor.run, time.sleep, 3)
+                time.sleep(0.2)
+                # Queued until the slow call times out
+                self.assertEqual(executor.run(math.factorial, 6), 720)
+                with self.assertRaises(EngineTimeoutError):
+                    slow.result()
+                self.assertIsNone(running.result())
+            self.assertEqual(sum(process.is_alive() for process in processes), 1)
+            self.assertEqual(len(executor._workers), 2)
+        finally:
+            executor.shutdown()
+
+    def test_cancel(self):
+        """Tests that the calls of a cancelled scope stop waiting, and are not run once cancelled.
+        """
+        scope = CallScope()
+        Timer(0.2, scope.cancel).start()
+        start = time.perf_counter()
+        with self.assertRaises(CancelledError):
+            run_in_scope(scope, self.executor.run, time.sleep, 2)
+        self.assertLess(time.perf_counter() - start, 1.5)
+        with self.assertRaises(CancelledError):
+            run_in_scope(scope, self.executor.run, math.factorial, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
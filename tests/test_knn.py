@@ -0,0 +1,50 @@
+"""Tests that the sparse kNN graph pipeline behaves as expected.
+"""
+import unittest
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+from manuscript_clusterer.engine.cluster import cluster_texts_knn
+from manuscript_clusterer.engine.distances import compute_jaccard_distance_matrix
+from manuscript_clusterer.engine.knn import compute_knn_graph
+
+
+class TestKnnGraph(unittest.TestCase):
+    """Tests that the sparse kNN graph pipeline behaves as expected.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        alphabet = list("αβγδεζηθικλμν ")
+        families = [{str(verse): "".join(rng.choice(alphabet, size=40)) for verse in range(1, 6)}
+                    for _ in range(3)]
+        self.content = {}
+        for i in range(60):
+            verses = dict(families[i % 3])
+            verse = str(rng.integers(1, 6))
+            text = list(verses[verse])
+            text[rng.integers(0, 40)] = "ω"
+            verses[verse] = "".join(text)
+            self.content[f"ms{i}"] = verses
+
+    def test_exact_neighbors(self):
+        """Tests that the blockwise search finds the exact nearest neighbours.
+        """
+        keys, knn_indices, knn_distances = compute_knn_graph(self.content, n_neighbors=8, block_size=7)
+        _, distance_matrix = compute_jaccard_distance_matrix(self.content)
+        self.assertEqual(keys, list(self.content.keys()))
+        self.assertEqual(knn_indices.shape, (60, 8))
+        self.assertTrue(np.array_equal(knn_indices[:, 0], np.arange(60)))
+        self.assertTrue(np.allclose(knn_distances, np.sort(distance_matrix, axis=1)[:, :8]))
+        self.assertTrue(np.allclose(knn_distances,
+                                    np.take_along_axis(distance_matrix, knn_indices, axis=1)))
+
+    def test_graph_clustering(self):
+        """Tests that the graph clustering recovers the families of manuscripts.
+        """
+        clusters = cluster_texts_knn(self.content, n_neighbors=8)
+        self.assertEqual(adjusted_rand_score([i % 3 for i in range(60)],
+                                             [clusters[f"ms{i}"] for i in range(60)]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Tests that the loader of a request reads the manuscripts once.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import time
+import unittest
+from manuscript_clusterer.api.database.loader import ManuscriptLoader
+
+
+class CountingDB:
+    """Stand-in for the database, counting the reads.
+    """
+
+    def __init__(self):
+        self.reads = []
+
+    def get_all_manuscripts_content(self, chapter=None):
+        self.reads.append(("content", chapter))
+        time.sleep(0.05)
+        return [{"id": "20001", "content": {chapter: {"1": "text"}}}]
+
+    def get_manuscripts_info(self, manuscripts_list):
+        self.reads.append(("info", tuple(manuscripts_list)))
+        return {manuscript_id: {"wisse": "A"} for manuscript_id in manuscripts_list}
+
+
+class TestLoader(unittest.TestCase):
+    """Tests that the loader of a request reads the manuscripts once.
+    """
+
+    def test_single_read(self):
+        """Tests that concurrent computations share a single read per field and manuscripts.
+        """
+        db = CountingDB()
+        loader = ManuscriptLoader(db)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: loader.get_all_manuscripts_content("10"), range(4)))
+        self.assertTrue(all(result is results[0] for result in results))
+        loader.get_all_manuscripts_content("11")
+        self.assertEqual(loader.get_manuscripts_info(["20001", "20002"]),
+                         {"20001": {"wisse": "A"}, "20002": {"wisse": "A"}})
+        loader.get_manuscripts_info(["20001", "20002"])
+        self.assertEqual(db.reads, [("content", "10"), ("content", "11"), ("info", ("20001", "20002"))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Tests that the MinHash LSH index behaves as expected.
+"""
+import unittest
+import numpy as np
+from manuscript_clusterer.engine.minhash import (MinHashLSH, compute_minhash_signatures, estimate_similarity,
+                                                 minhash_signature, verse_shingles)
+
+
+class TestMinHash(unittest.TestCase):
+    """Tests that the MinHash LSH index behaves as expected.
+    """
+
+    def setUp(self):
+        base = {"1": "καθως παρεδοσαν ημιν οι απ αρχης αυτοπται και υπηρεται γενομενοι του λογου",
+                "2": "εδοξε καμοι παρηκολουθηκοτι ανωθεν πασιν ακριβως καθεξης σοι γραψαι"}
+        self.content = {
+            "20001": {"10": base},
+            "20002": {"10": {**base, "2": "εδοξε καμοι παρηκολουθηκοτι ανωθεν πασιν ακριβως καθεξης σοι γραψαι κρατιστε"}},
+            "20003": {"10": {"1": "εγενετο εν ταις ημεραις ηρωδου του βασιλεως της ιουδαιας ιερευς τις ονοματι ζαχαριας",
+                             "2": "και ουκ ην αυτοις τεκνον καθοτι ην η ελισαβετ στειρα"}}
+        }
+
+    def test_estimated_similarity(self):
+        """Tests that the signatures estimate the Jaccard similarity of the shingles.
+        """
+        shingles_1 = verse_shingles(self.content["20001"]["10"])
+        shingles_2 = verse_shingles(self.content["20002"]["10"])
+        exact = len(np.intersect1d(shingles_1, shingles_2)) / len(np.union1d(shingles_1, shingles_2))
+        estimated = estimate_similarity(minhash_signature(shingles_1), minhash_signature(shingles_2))
+        self.assertAlmostEqual(estimated, exact, delta=0.1)
+
+    def test_index(self):
+        """Tests that the index only returns the candidates sharing a band.
+        """
+        index = MinHashLSH()
+        for manuscript_id, content in self.content.items():
+            index.insert(manuscript_id, compute_minhash_signatures(content)["10"])
+        self.assertEqual([neighbor for neighbor, _ in index.query("20001")], ["20002"])
+        self.assertEqual(index.query("20003"), [])
+        index.remove("20002")
+        self.assertEqual(index.query("20001"), [])
+        self.assertEqual(len(index), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
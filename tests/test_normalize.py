@@ -0,0 +1,45 @@
+"""Tests that the normalization of the texts behaves as expected.
+"""
+import unittest
+import unicodedata
+from manuscript_clusterer.engine.normalize import (Normalizer, expand_nomina_sacra, remove_control_characters,
+                                                   remove_punctuation)
+
+
+class TestNormalize(unittest.TestCase):
+    """Tests that the normalization of the texts behaves as expected.
+    """
+
+    def test_expand_nomina_sacra(self):
+        """Tests that the nomina sacra are expanded, a later form overriding an earlier one.
+        """
+        self.assertEqual(expand_nomina_sacra("ο θς και ἰης"), "ο θεος και ιησου")
+        self.assertEqual(expand_nomina_sacra("πνα αγιον"), "πνευματι αγιον")
+        # Only whole words are expanded
+        self.assertEqual(expand_nomina_sacra("θυμος"), "θυμος")
+
+    def test_normalize_many(self):
+        """Tests that the bulk normalization matches the normalization of each text.
+        """
+        texts = ["ο θς εν", "κς ο θς", "ο θς εν", "", "ουνου και γης"]
+        normalizer = Normalizer(cache_size=2)
+        self.assertEqual(normalizer.normalize_many(texts), [expand_nomina_sacra(text) for text in texts])
+        self.assertEqual(normalizer.normalize_many(texts), [normalizer(text) for text in texts])
+        self.assertLessEqual(len(normalizer._cache), 2)
+
+    def test_remove_characters(self):
+        """Tests that the control characters and the punctuation are removed.
+        """
+        text = "εν\x00 αρχη​, ην\t ο λογος·"
+        expected = "".join(char for char in text if unicodedata.category(char)[0] != "C")
+        self.assertEqual(remove_control_characters(text), expected)
+        self.assertEqual(remove_punctuation("εν αρχη, ην ο λογος·"), "εν αρχη ην ο λογος")
+
+    def test_unicode_form(self):
+        """Tests that the nomina sacra are expanded whatever the normal form of the input and output.
+        """
+        normalizer = Normalizer(punctuation=True, unicode_form="NFD")
+        text = unicodedata.normalize("NFD", "ἰης.")
+        self.assertEqual(normalizer(text), unicodedata.normalize("NFD", "ιησου"))
+        with self.assertRaises(ValueError):
+            Normalizer(unicode_form="NFX")
@@ -0,0 +1,49 @@
+"""Tests that the columnar profile matrix behaves as expected.
+"""
+import unittest
+import numpy as np
+from manuscript_clusterer.engine.cluster import compute_distance_matrix_profiles
+from manuscript_clusterer.engine.profile_matrix import ProfileMatrix
+
+
+class TestProfileMatrix(unittest.TestCase):
+    """Tests that the columnar profile matrix behaves as expected.
+    """
+
+    def setUp(self):
+        self.profiles = {
+            "20001": {"1:2:1": 1, "1:7:2": 0, "10:1:1": 1},
+            "20002": {"1:2:1": 0, "1:7:2": 0, "10:1:1": -1},
+            "20003": {"1:2:1": 1, "1:7:2": 1, "10:1:1": 0}
+        }
+        self.profile_matrix = ProfileMatrix.from_profiles(self.profiles)
+
+    def test_build(self):
+        """Tests that the matrix stacks the profiles.
+        """
+        self.assertEqual(self.profile_matrix.values.dtype, np.int8)
+        self.assertEqual(self.profile_matrix.values.tolist(), [[1, 0, 1], [0, 0, -1], [1, 1, 0]])
+        self.assertEqual(self.profile_matrix.to_dataframe().loc["20002", "10:1:1"], -1)
+
+    def test_subset(self):
+        """Tests that a subset shares the values of the matrix.
+        """
+        subset = self.profile_matrix.subset(["20003", "20001", "unknown"])
+        self.assertEqual(subset.manuscript_ids, ["20003", "20001"])
+        self.assertIs(subset._values, self.profile_matrix.values)
+        self.assertEqual(subset.values.tolist(), [[1, 1, 0], [1, 0, 1]])
+        expected = compute_distance_matrix_profiles({key: self.profiles[key] for key in ["20003", "20001"]})
+        self.assertEqual(subset.distance_matrix().tolist(),
+                         [[expected["20003"]["20003"], expected["20003"]["20001"]],
+                          [expected["20001"]["20003"], expected["20001"]["20001"]]])
+
+    def test_chapter(self):
+        """Tests that selecting a chapter keeps its readings only.
+        """
+        chapter = self.profile_matrix.chapter("1")
+        self.assertEqual(chapter.reading_keys, ["1:2:1", "1:7:2"])
+        self.assertEqual(chapter.distance_matrix().tolist(), [[0, 1, 1], [1, 0, 2], [1, 2, 0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
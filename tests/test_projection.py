@@ -0,0 +1,70 @@
+"""Tests that the projection backends behave as expected.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import pdist, squareform
+from manuscript_clusterer.engine import project
+from manuscript_clusterer.engine.project import (check_projection, fit_projection_file, fit_projection_profiles,
+                                                 make_projection, transform_projection_file,
+                                                 transform_projection_profiles)
+
+
+class TestProjection(unittest.TestCase):
+    """Tests that the projection backends behave as expected.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.profiles = pd.DataFrame(rng.integers(0, 2, size=(40, 12)),
+                                     index=[f"200{i:02d}" for i in range(40)],
+                                     columns=[f"10:{i}:1" for i in range(12)])
+        # A reading absent from every profile
+        self.profiles["10:12:1"] = 0
+
+    def test_mds(self):
+        """Tests that classical MDS recovers the configuration of Euclidean distances, and places the fitted points.
+        """
+        points = np.random.default_rng(1).normal(size=(30, 3))
+        distances = squareform(pdist(points))
+        backend = make_projection("mds", "content")
+        coordinates = backend.fit_transform(distances)
+        np.testing.assert_allclose(squareform(pdist(coordinates)), distances, atol=1e-8)
+        np.testing.assert_allclose(backend.transform(distances[:3]), coordinates[:3], atol=1e-8)
+
+    def test_linear_transform(self):
+        """Tests that the linear backends place the fitted profiles at their fitted coordinates.
+        """
+        for method in ("mca", "pca"):
+            backend, embedding = fit_projection_profiles(self.profiles, method=method)
+            placed = transform_projection_profiles(backend, self.profiles.iloc[:5])
+            for manuscript_id, coordinates in placed.items():
+                np.testing.assert_allclose(list(coordinates.values()), list(embedding[manuscript_id].values()),
+                                           atol=1e-8)
+
+    def test_file(self):
+        """Tests that a projection fitted into a file places new data, once read back by another process.
+        """
+        with tempfile.TemporaryDirectory() as model_dir:
+            path = os.path.join(model_dir, "profiles.model.joblib")
+            embedding = fit_projection_file(path, "profiles", self.profiles, method="pca")
+            project._FITTED_BACKENDS.clear()
+            placed = transform_projection_file(path, self.profiles.iloc[:2])
+            for manuscript_id, coordinates in placed.items():
+                np.testing.assert_allclose(list(coordinates.values()), list(embedding[manuscript_id].values()),
+                                           atol=1e-8)
+            self.assertIn(path, project._FITTED_BACKENDS)
+
+    def test_unknown_method(self):
+        """Tests that a method is only available for its sources.
+        """
+        with self.assertRaises(ValueError):
+            make_projection("mds", "profiles")
+        with self.assertRaises(ValueError):
+            make_projection("tsne", "content")
+        with self.assertRaises(ValueError):
+            check_projection("mds", "content", mode="knn")
+        check_projection("umap", "content", mode="knn")
+        check_projection("mca", "profiles", mode="knn")
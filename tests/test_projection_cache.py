@@ -0,0 +1,79 @@
+"""Tests that the cache of the projections behaves as expected.
+"""
+import unittest
+from unittest import mock
+from manuscript_clusterer.api.database.db_manipulator import ManuscriptDB
+from manuscript_clusterer.api.database.projection_cache import ProjectionCache, projection_key
+
+
+class TestProjectionCache(unittest.TestCase):
+    """Tests that the cache of the projections behaves as expected.
+    """
+
+    def setUp(self):
+        self.params = {"n_components": 3, "random_state": 42}
+        self.calls = []
+
+    def compute(self, value):
+        """Build a projection function recording its calls.
+        """
+        def function():
+            self.calls.append(value)
+            return {"20001": {0: value, 1: 0.0, 2: 0.0}}
+        return function
+
+    def test_projection_key(self):
+        """Tests that the key depends on every input of the projection.
+        """
+        key = projection_key("profiles", ["20001", "20002"], 1, "umap", self.params)
+        self.assertEqual(key, projection_key("profiles", ["20001", "20002"], 1, "umap", dict(self.params)))
+        self.assertNotEqual(key, projection_key("content", ["20001", "20002"], 1, "umap", self.params))
+        self.assertNotEqual(key, projection_key("profiles", ["20001"], 1, "umap", self.params))
+        self.assertNotEqual(key, projection_key("profiles", None, 1, "umap", self.params))
+        self.assertNotEqual(key, projection_key("profiles", ["20001", "20002"], 2, "umap", self.params))
+        self.assertNotEqual(key, projection_key("profiles", ["20001", "20002"], 1, "umap",
+                                                {**self.params, "n_components": 2}))
+
+    def test_get_or_compute(self):
+        """Tests that a projection is computed once, and that the least recently used one is evicted.
+        """
+        cache = ProjectionCache(memory_size=2)
+        self.assertEqual(cache.get_or_compute("a", self.compute(1.0)), {"20001": {0: 1.0, 1: 0.0, 2: 0.0}})
+        cache.get_or_compute("a", self.compute(2.0))
+        cache.get_or_compute("b", self.compute(3.0))
+        cache.get_or_compute("c", self.compute(4.0))
+        self.assertEqual(self.calls, [1.0, 3.0, 4.0])
+        self.assertIsNone(cache.get("a"))
+        cache.drop_stale(1)
+        self.assertIsNone(cache.get("c"))
+
+    def test_failed_computation(self):
+        """Tests that a failed computation releases its lock, and is computed again on the next request.
+        """
+        cache = ProjectionCache()
+
+        def fail():
+            raise ValueError("Not enough manuscripts")
+
+        with self.assertRaises(ValueError):
+            cache.get_or_compute("a", fail)
+        self.assertEqual(cache._key_locks, {})
+        cache.get_or_compute("a", self.compute(1.0))
+        self.assertEqual(self.calls, [1.0])
+
+    def test_manuscripts_order(self):
+        """Tests that the projection of the same manuscripts in another order is served from the cache.
+        """
+        db = mock.MagicMock(projection_cache=ProjectionCache())
+        db.data_version.return_value = 1
+        db.get_manuscripts_projected.return_value = (None, {"20001": {0: 1.0, 1: 0.0, 2: 0.0}})
+        ManuscriptDB.get_projection(db, "profiles", manuscripts_list=["20002", "20001"], method="pca")
+        ManuscriptDB.get_projection(db, "profiles", manuscripts_list=["20001", "20002"], method="pca")
+        db.get_manuscripts_projected.assert_called_once()
+
+    def test_document_round_trip(self):
+        """Tests that an embedding is persisted and read back unchanged.
+        """
+        embedding = {"20001": {0: 1.5, 1: -2.0, 2: 0.25}, "20002": {0: 0.0, 1: 1.0, 2: 2.0}}
+        document = ProjectionCache._to_document(embedding)
+        self.assertEqual(ProjectionCache._from_document(document), embedding)
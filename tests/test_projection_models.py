@@ -0,0 +1,62 @@
+"""Tests that the store of the fitted projection models behaves as expected.
+"""
+import os
+import tempfile
+import unittest
+from manuscript_clusterer.api.database.projection_models import ProjectionModelStore, hash_rows
+
+
+class TestProjectionModels(unittest.TestCase):
+    """Tests that the store of the fitted projection models behaves as expected.
+    """
+
+    def setUp(self):
+        self.data = {f"2000{i}": {"1": f"text {i}"} for i in range(10)}
+        hashes = hash_rows(self.data)
+        self.record = {"model_file": "profiles-0.model.joblib",
+                       "features": ["10:1:1"],
+                       "fit_hashes": hashes,
+                       "hashes": hashes,
+                       "embedding": {key: {0: 0.0, 1: 0.0, 2: 0.0} for key in self.data}}
+
+    def test_plan(self):
+        """Tests that the new, changed and removed manuscripts are placed or dropped, up to the drift.
+        """
+        store = ProjectionModelStore(drift_threshold=0.3)
+        self.assertEqual(store.plan(self.record, hash_rows(self.data), ["10:1:1"]), ([], []))
+        data = {**self.data, "20001": {"1": "changed"}, "20010": {"1": "new"}}
+        del data["20002"]
+        self.assertEqual(store.plan(self.record, hash_rows(data), ["10:1:1"]), (["20001", "20010"], ["20002"]))
+        # Four manuscripts out of ten differ from the fit
+        data["20003"] = {"1": "changed"}
+        self.assertIsNone(store.plan(self.record, hash_rows(data), ["10:1:1"]))
+        # Other readings cannot be placed onto the model
+        self.assertIsNone(store.plan(self.record, hash_rows(self.data), ["10:1:2"]))
+        self.assertIsNone(store.plan(None, hash_rows(self.data), ["10:1:1"]))
+
+    def test_persistence(self):
+        """Tests that a saved model is read back by another store.
+        """
+        with tempfile.TemporaryDirectory() as model_dir:
+            ProjectionModelStore(model_dir).save("profiles", self.record)
+            store = ProjectionModelStore(model_dir)
+            self.assertEqual(store.load("profiles"), self.record)
+            store.drop("profiles")
+            self.assertIsNone(ProjectionModelStore(model_dir).load("profiles"))
+
+    def test_model_files(self):
+        """Tests that the file of a fitted backend is deleted once its record is replaced.
+        """
+        store = ProjectionModelStore()
+        records = []
+        for _ in range(2):
+            model_file = store.new_model_file("profiles")
+            with open(store.model_path(model_file), "wb") as file:
+                file.write(b"model")
+            records.append({**self.record, "model_file": model_file})
+            store.save("profiles", records[-1])
+        self.assertNotEqual(records[0]["model_file"], records[1]["model_file"])
+        self.assertFalse(os.path.exists(store.model_path(records[0]["model_file"])))
+        self.assertTrue(os.path.exists(store.model_path(records[1]["model_file"])))
+        self.assertIsNone(store.plan({key: value for key, value in self.record.items() if key != "model_file"},
+                                     hash_rows(self.data), ["10:1:1"]))
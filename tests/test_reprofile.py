@@ -0,0 +1,82 @@
+"""Tests that re-profiling the manuscripts after a rule edit behaves as expected.
+"""
+import unittest
+import pandas as pd
+from manuscript_clusterer.api.database.reprofile import reprofile_manuscript
+from manuscript_clusterer.engine.get_profiles import PROFILE_RULES, PROFILE_RULESET, evaluate_manuscript
+from manuscript_clusterer.engine.rules import RuleSet
+
+
+def apply_update(document, update):
+    """Apply a $set/$unset update on nested fields to a document.
+    """
+    for path, value in update.get("$set", {}).items():
+        *parents, field = path.split(".")
+        target = document
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[field] = value
+    for path in update.get("$unset", {}):
+        *parents, field = path.split(".")
+        target = document
+        for parent in parents:
+            target = target[parent]
+        target.pop(field, None)
+    return document
+
+
+class TestReprofile(unittest.TestCase):
+    """Tests that re-profiling the manuscripts after a rule edit behaves as expected.
+    """
+
+    def setUp(self):
+        content = {"1": {"2": "καθως παρεδοσαν ημιν ",
+                         "7": "και ουκ ην αυτοις τεκνον καθοτι η ελισαβετ ην στειρα ",
+                         "8": "εναντι του θεου "}}
+        profile, readings, positions = evaluate_manuscript(content, [1])
+        self.document = {"id": "20001",
+                         "content": content,
+                         "profile": profile,
+                         "readings": readings,
+                         "reading_positions": positions,
+                         "rule_fingerprints": PROFILE_RULESET.key_fingerprints([1]),
+                         "rules_fingerprint": PROFILE_RULESET.fingerprint}
+        rules = PROFILE_RULES.copy()
+        # Swap the readings of the first rule, drop the rule of 1:8 and add a rule
+        rules.loc[0, ["reading", "alternative_reading"]] = ["παρεδοσαν", "παρεδωκαν"]
+        rules = rules[~((rules.chapter == 1) & (rules.verse == 8))]
+        rules = pd.concat([rules, pd.DataFrame([{"chapter": 1, "verse": 2, "reading_id": 999,
+                                                 "reading": "ημιν", "alternative_reading": "ημειν"}])])
+        self.ruleset = RuleSet(rules)
+
+    def test_up_to_date(self):
+        """Tests that nothing is updated without a rule edit.
+        """
+        update, added, changed, removed = reprofile_manuscript(self.document)
+        self.assertIsNone(update)
+
+    def test_only_affected_keys(self):
+        """Tests that only the edited keys are updated, to the values of a full evaluation.
+        """
+        update, added, changed, removed = reprofile_manuscript(self.document, self.ruleset)
+        self.assertEqual((added, changed, removed), ({"1:2:999"}, {"1:2:1"}, {"1:8:4"}))
+        self.assertEqual(len(update["$set"]), 4 * 2 + 1)
+        profile, readings, positions = evaluate_manuscript(self.document["content"], [1], self.ruleset)
+        document = apply_update(self.document, update)
+        self.assertEqual(document["profile"], profile)
+        self.assertEqual(document["readings"], readings)
+        self.assertEqual(document["reading_positions"], positions)
+        self.assertEqual(document["rule_fingerprints"], self.ruleset.key_fingerprints([1]))
+
+    def test_without_fingerprints(self):
+        """Tests that a manuscript without fingerprints is fully re-evaluated.
+        """
+        self.document.pop("rule_fingerprints")
+        update, added, changed, removed = reprofile_manuscript(self.document, self.ruleset)
+        document = apply_update(self.document, update)
+        self.assertEqual(document["profile"], evaluate_manuscript(self.document["content"], [1], self.ruleset)[0])
+        self.assertEqual(removed, {"1:8:4"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Tests that scoring the clusterings behaves as expected.
+"""
+import unittest
+import numpy as np
+from sklearn.metrics import silhouette_samples, silhouette_score
+from manuscript_clusterer.engine.scoring import (approximate_silhouette_score, medoid_silhouette_samples,
+                                                 score_clustering, stratified_sample)
+
+
+class TestScoring(unittest.TestCase):
+    """Tests that scoring the clusterings behaves as expected.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.features = np.concatenate([rng.normal(center, 0.5, size=(size, 2))
+                                        for center, size in [((0, 0), 400), ((5, 0), 200), ((0, 5), 100)]])
+        self.labels = np.repeat([0, 1, 2], [400, 200, 100])
+
+    def test_stratified_sample(self):
+        """Tests that each cluster keeps its share of the sample.
+        """
+        sample = stratified_sample(self.labels, 70)
+        self.assertEqual(np.bincount(self.labels[sample]).tolist(), [40, 20, 10])
+        self.assertEqual(len(np.unique(sample)), len(sample))
+
+    def test_approximate_silhouette(self):
+        """Tests that the approximate silhouette is close to the exact one.
+        """
+        exact = silhouette_score(self.features, self.labels)
+        score, (low, high) = approximate_silhouette_score(self.features, self.labels, sample_size=200)
+        self.assertLess(low, score)
+        self.assertLess(score, high)
+        self.assertAlmostEqual(score, exact, delta=0.1)
+
+    def test_singleton_cluster(self):
+        """Tests that the elements of singleton clusters have a silhouette of 0.
+        """
+        features = np.array([[0.0], [0.1], [0.2], [5.0], [5.1], [10.0]])
+        labels = np.array([0, 0, 0, 1, 1, 2])
+        distance_matrix = np.abs(features - features.T)
+        samples = medoid_silhouette_samples(distance_matrix, labels)
+        self.assertEqual(samples[-1], 0)
+        self.assertEqual(samples[-1], silhouette_samples(features, labels)[-1])
+        self.assertTrue(np.all(samples[:-1] > 0))
+
+    def test_auto_mode(self):
+        """Tests that the auto mode is approximate above the threshold only.
+        """
+        score, interval = score_clustering(self.features[::3], self.labels[::3])
+        self.assertEqual(interval, (score, score))
+        score, interval = score_clustering(self.features, self.labels)
+        self.assertNotEqual(interval, (score, score))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Tests that the verse-granular storage of the manuscripts behaves as expected.
+"""
+from types import SimpleNamespace
+import unittest
+from async_mongo_stub import AsyncMongoClientStub
+from manuscript_clusterer.api.database.async_db_manipulator import AsyncManuscriptDB
+from manuscript_clusterer.api.database.verse_store import assemble_content, verse_documents, verse_query
+
+
+CONTENT = {"incipit": {"0": "αρχη"},
+           "10": {"1": "και", "2": "ελεγεν", "10": "αυτοις"},
+           "2": {"1": "εγενετο"}}
+
+
+class TestVerseStore(unittest.TestCase):
+    """Tests that the content of the manuscripts is split into verses and assembled back.
+    """
+
+    def test_round_trip(self):
+        """Tests that the content is assembled back in the order of its chapters and verses.
+        """
+        documents = verse_documents("20001", CONTENT)
+        self.assertEqual(len(documents), 5)
+        self.assertEqual(documents[3], {"id": "20001", "chapter": "10", "verse": "10", "position": 3,
+                                        "text": "αυτοις"})
+        content = assemble_content(reversed(documents + verse_documents("20002", {"2": {"1": "και"}})))
+        self.assertEqual(content["20001"], CONTENT)
+        self.assertEqual(list(content["20001"]), ["incipit", "10", "2"])
+        self.assertEqual(list(content["20001"]["10"]), ["1", "2", "10"])
+        self.assertEqual(content["20002"], {"2": {"1": "και"}})
+
+    def test_query(self):
+        """Tests the queries of the verses of manuscripts, chapters and verses.
+        """
+        self.assertEqual(verse_query(), {})
+        self.assertEqual(verse_query(["20001"], "10", "2"), {"id": "20001", "chapter": "10", "verse": "2"})
+        self.assertEqual(verse_query(["20001", "20002"], "10"), {"id": {"$in": ["20001", "20002"]}, "chapter": "10"})
+        with self.assertRaises(ValueError):
+            verse_query(["20001"], verse="2")
+
+
+class TestAsyncVerses(unittest.IsolatedAsyncioTestCase):
+    """Tests that the asynchronous database reads the content from the verses.
+    """
+
+    async def asyncSetUp(self):
+        client = AsyncMongoClientStub()
+        for manuscript_id in ("20001", "20002"):
+            await client["manuscriptsDB"]["manuscripts"].insert_one({"id": manuscript_id})
+            for document in verse_documents(manuscript_id, CONTENT):
+                await client["manuscriptsDB"]["verses"].insert_one(document)
+        await client["manuscriptsDB"]["manuscripts"].insert_one({"id": "20003"})
+        manuscript_db = SimpleNamespace(verse_store=SimpleNamespace(collection=SimpleNamespace(name="verses")))
+        self.db = AsyncManuscriptDB(manuscript_db, client=client, compute_threads=1)
+
+    async def asyncTearDown(self):
+        await self.db.close()
+
+    async def test_reads(self):
+        """Tests that the reads keep the nested shape of the content.
+        """
+        self.assertEqual(await self.db.get_manuscript_verses("20001", "10", "10"), "αυτοις")
+        self.assertEqual((await self.db.get_manuscript("20002"))["content"], CONTENT)
+        self.assertEqual(await self.db.get_manuscript_content("20003", "10"), {"content": {}})
+        self.assertIsNone(await self.db.get_manuscript_content("20004"))
+        self.assertEqual(await self.db.get_manuscripts_content(["20001", "20003"], chapter="2"),
+                         [{"id": "20001", "content": {"2": {"1": "εγενετο"}}}])
+        self.assertEqual(len(await self.db.get_all_manuscripts_content("incipit")), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()